@@ -1,9 +1,15 @@
 # PromptGenie 3.0 — Профессиональный конструктор промптов
+import difflib
+import time
+from collections import Counter
+
+# Отсчёт времени запуска (до первой отрисовки окна)
+PROCESS_START = time.perf_counter()
+
 import sys
 import json
 import os
 import logging
-import shutil
 from pathlib import Path
 from typing import Dict, List, Optional, Any, Union
 
@@ -18,30 +24,55 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-from PyQt6.QtCore import Qt, QSize, QThread, pyqtSignal, QTimer, QSettings
+from PyQt6.QtCore import (Qt, QSize, QThread, pyqtSignal, QTimer, QSettings, QObject,
+                          QRunnable, QThreadPool)
 
 # Constants
+# Категории крупнее этого порога показываются виртуализированным списком
+KEYWORD_LIST_THRESHOLD = 200
 THEMES_FILE = Path(__file__).parent / "theme_prompts.json"
+KEYWORDS_FILE = Path(__file__).parent / "keyword_library.json"
 from PyQt6.QtGui import QAction, QIcon, QPixmap, QFont, QTextCursor, QPainter, QLinearGradient, QColor, QPen
-from PyQt6.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QLabel, 
-                           QPushButton, QListWidget, QListWidgetItem, QTextEdit, 
+from PyQt6.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QLabel, QStackedWidget, 
+                           QPushButton, QListWidget, QListWidgetItem, QListView, QTextEdit, 
                            QComboBox, QWidget, QFileDialog, QMessageBox, QSplitter,
                            QInputDialog, QLineEdit, QScrollArea, QFrame, QCheckBox,
                            QProgressBar, QStatusBar, QMenu, QSystemTrayIcon, QStyle,
                            QDialog, QDialogButtonBox, QFormLayout, QTabWidget, QTabBar,
-                           QToolButton, QGroupBox, QSpinBox, QSlider)
+                           QToolButton, QGroupBox, QSpinBox, QSlider, QProgressDialog)
 
 # Local imports
 from ui_theme import Ui_MainWindow
 import version
 from utils import resource_path, load_json_schema, validate_json_schema, safe_json_load
 from theme_editor import show_theme_editor
+from theme_index import ID_FIELD, new_theme_id, theme_key
+from theme_model import CategoryListModel, ThemeListModel, ThemeFilterProxyModel
+from template_search import TemplateSearchIndex
+from search_scheduler import SearchScheduler, VisibilityBitmap
+from ui_components import (TooltipCheckBox, CheckBoxPool, StyledTabWidget, GradientButton,
+                           SearchBox, StatusLabel, TemplateDescriptionEdit, TemplatePreviewEdit,
+                           DebugOverlay, KeywordTooltips)
+from style_registry import StyleRegistry
+from animation_manager import AnimationManager, low_power_session
+from thumbnail_service import ThumbnailService
+from engine import PromptComposer, split_prompt
+from image_client import ImageGenerationClient, ImageGenerationError, StableDiffusionWebUI
+from image_queue import ImageJobQueue
+from result_cache import ResultCache
+from library_io import LibraryImporter, export_themes
+from library_watcher import LibraryWatcher, content_digest
+from image_store import ImageStore
+from theme_storage import ThemeStore
+from sqlite_store import SQLiteStore
+from shared_store import SharedThemeStore, ThemeConflict
 
 # API Integration
 class APIIntegrationDialog(QDialog):
     """Dialog for API integration settings"""
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, settings: Optional[dict] = None):
         super().__init__(parent)
+        settings = settings or {}
         self.setWindowTitle("Настройки API")
         self.setMinimumWidth(400)
         
@@ -58,6 +89,20 @@ class APIIntegrationDialog(QDialog):
         self.api_combo = QComboBox()
         self.api_combo.addItems(["Stable Diffusion API", "OpenAI DALL-E", "Midjourney (если доступно)"])
         form.addRow("Сервис:", self.api_combo)
+
+        self.url_edit = QLineEdit()
+        self.url_edit.setPlaceholderText(StableDiffusionWebUI.default_url)
+        form.addRow("Адрес API:", self.url_edit)
+
+        # Параллельные запросы и ограничение частоты (0 — без ограничения)
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, 8)
+        form.addRow("Параллельно:", self.concurrency_spin)
+
+        self.rate_spin = QSpinBox()
+        self.rate_spin.setRange(0, 600)
+        self.rate_spin.setSuffix(" / мин")
+        form.addRow("Лимит запросов:", self.rate_spin)
         
         # Settings group
         settings_group = QGroupBox("Настройки генерации")
@@ -90,294 +135,112 @@ class APIIntegrationDialog(QDialog):
         layout.addLayout(form)
         layout.addWidget(settings_group)
         layout.addWidget(buttons)
+
+        self.api_key_edit.setText(settings.get("api_key", ""))
+        if settings.get("service"):
+            self.api_combo.setCurrentText(settings["service"])
+        self.url_edit.setText(settings.get("base_url", ""))
+        self.concurrency_spin.setValue(int(settings.get("concurrency", 1)))
+        self.rate_spin.setValue(int(settings.get("rate_per_minute") or 0))
+        self.width_spin.setValue(int(settings.get("width", 512)))
+        self.height_spin.setValue(int(settings.get("height", 512)))
+        self.steps_slider.setValue(int(settings.get("steps", 30)))
         
     def get_settings(self) -> dict:
         """Get the API settings"""
         return {
             "api_key": self.api_key_edit.text().strip(),
             "service": self.api_combo.currentText(),
+            "base_url": self.url_edit.text().strip(),
+            "concurrency": self.concurrency_spin.value(),
+            "rate_per_minute": self.rate_spin.value() or None,
             "width": self.width_spin.value(),
             "height": self.height_spin.value(),
             "steps": self.steps_slider.value()
         }
 
-class TemplatePreviewEdit(QTextEdit):
-    """A custom text edit for template previews with syntax highlighting and line numbers."""
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setPlaceholderText("Предпросмотр шаблона...")
-        self.setStyleSheet("""
-            QTextEdit {
-                background-color: #1e1e1e;
-                color: #d4d4d4;
-                border: 1px solid #3e3e3e;
-                border-radius: 4px;
-                padding: 8px;
-                font-family: 'Consolas', 'Courier New', monospace;
-                font-size: 13px;
-                min-height: 200px;
-            }
-            QTextEdit:focus {
-                border: 1px solid #4a9cff;
-            }
-        """)
-        self.setLineWrapMode(QTextEdit.LineWrapMode.NoWrap)
-        self.setAcceptRichText(False)
-        
-        # Set up the document with a monospace font
-        font = QFont('Consolas', 10)
-        self.setFont(font)
+class ThemeLoaderThread(QThread):
+    """Loads themes and builds the search index off the GUI thread.
 
+    An empty SQLite database is filled from THEMES_FILE and KEYWORDS_FILE first.
+    """
+    loaded = pyqtSignal(list)
+    failed = pyqtSignal(str)
 
-class TemplateDescriptionEdit(QTextEdit):
-    """A custom text edit for template descriptions with placeholder text and styling."""
-    def __init__(self, parent=None):
+    def __init__(self, store, search_index, image_store, parent=None):
         super().__init__(parent)
-        self.setPlaceholderText("Введите описание шаблона...")
-        self.setStyleSheet("""
-            QTextEdit {
-                background-color: #2d2d2d;
-                color: #e0e0e0;
-                border: 1px solid #3e3e3e;
-                border-radius: 4px;
-                padding: 8px;
-                font-size: 14px;
-                min-height: 100px;
-            }
-            QTextEdit:focus {
-                border: 1px solid #4a9cff;
-            }
-        """)
-        self.setAcceptRichText(False)
-
-
-class GradientButton(QPushButton):
-    """A button with a gradient background."""
-    def __init__(self, text, color, parent=None):
-        super().__init__(text, parent)
-        self.color = color
-        self.setMinimumHeight(32)
-        self.setStyleSheet("""
-            QPushButton {
-                border: none;
-                color: white;
-                padding: 8px 16px;
-                border-radius: 4px;
-                font-weight: bold;
-                text-align: center;
-            }
-            QPushButton:hover {
-                opacity: 0.9;
-            }
-            QPushButton:pressed {
-                padding-top: 9px;
-                padding-bottom: 7px;
-            }
-        """)
+        self.store = store
+        self.search_index = search_index
+        self.image_store = image_store
 
-    def paintEvent(self, event):
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        
-        # Create gradient
-        gradient = QLinearGradient(0, 0, 0, self.height())
-        gradient.setColorAt(0, QColor(self.color).lighter(120))
-        gradient.setColorAt(1, QColor(self.color).darker(120))
-        
-        # Draw button background with gradient
-        painter.setBrush(gradient)
-        painter.setPen(Qt.PenStyle.NoPen)
-        painter.drawRoundedRect(0, 0, self.width(), self.height(), 4, 4)
-        
-        # Draw text
-        painter.setPen(QPen(Qt.GlobalColor.white))
-        painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, self.text())
+    def run(self):
+        try:
+            if isinstance(self.store, SQLiteStore) and self.store.is_empty():
+                self.store.import_json(THEMES_FILE, KEYWORDS_FILE)
+            themes = self.store.load()
+            # Гарантируем наличие поля image_path у каждого шаблона
+            for theme in themes:
+                if "image_path" not in theme:
+                    theme["image_path"] = ""
+            # Индексируем развёрнутые промпты, в памяти остаются {{фрагменты}}
+            expand = self.store.fragments.expand_theme
+            self.search_index.build((theme_key(theme), expand(theme)) for theme in themes)
+            self.image_store.rebuild(themes)
+            self.loaded.emit(themes)
+        except Exception as e:
+            logger.error(f"Error loading themes: {e}", exc_info=True)
+            self.failed.emit(str(e))
 
 
-class SearchBox(QLineEdit):
-    """A custom search box with a clear button."""
-    def __init__(self, placeholder="", parent=None):
-        super().__init__(parent)
-        self.setPlaceholderText(placeholder)
-        self.setClearButtonEnabled(True)
-        self.setStyleSheet("""
-            QLineEdit {
-                padding: 5px 10px;
-                border: 1px solid #3e3e3e;
-                border-radius: 4px;
-                background: #2d2d2d;
-                color: #e0e0e0;
-                font-size: 14px;
-            }
-            QLineEdit:focus {
-                border: 1px solid #4a9cff;
-            }
-        """)
+class LibraryTransferThread(QThread):
+    """Imports or exports a theme pack off the GUI thread.
 
+    Import only reads the library: the resulting operations are applied to
+    the model by the main window.
+    """
+    progress = pyqtSignal(int, int)
+    done = pyqtSignal(object)
+    failed = pyqtSignal(str)
 
-class StatusLabel(QLabel):
-    """A custom status label that shows messages with different styles."""
-    def __init__(self, parent=None):
+    def __init__(self, task, parent=None):
         super().__init__(parent)
-        self.setStyleSheet("""
-            QLabel {
-                color: #e0e0e0;
-                padding: 2px 8px;
-                border-radius: 4px;
-                margin: 2px;
-            }
-        """)
-        self.setAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter)
-        self.setMinimumWidth(200)
-        
-    def set_message(self, message, message_type="info"):
-        """Set the status message with optional type styling.
-        
-        Args:
-            message (str): The message to display
-            message_type (str): Type of message (info, success, warning, error)
-        """
-        # Remove any existing style classes
-        self.setStyleSheet("""
-            QLabel {
-                color: #e0e0e0;
-                padding: 2px 8px;
-                border-radius: 4px;
-                margin: 2px;
-        """)
-        
-        # Add style based on message type
-        if message_type == "success":
-            self.setStyleSheet(self.styleSheet() + """
-                background-color: #2e7d32;
-                color: #e8f5e9;
-                border: 1px solid #1b5e20;
-            """)
-        elif message_type == "warning":
-            self.setStyleSheet(self.styleSheet() + """
-                background-color: #ff8f00;
-                color: #fff3e0;
-                border: 1px solid #e65100;
-            """)
-        elif message_type == "error":
-            self.setStyleSheet(self.styleSheet() + """
-                background-color: #c62828;
-                color: #ffebee;
-                border: 1px solid #b71c1c;
-            """)
-        else:  # info
-            self.setStyleSheet(self.styleSheet() + """
-                background-color: #1565c0;
-                color: #e3f2fd;
-                border: 1px solid #0d47a1;
-            """)
-            
-        self.setText(message)
+        self._task = task
+        self.cancelled = False
 
+    def run(self):
+        try:
+            result = self._task(self.progress.emit, lambda: self.cancelled)
+            self.done.emit(result)
+        except Exception as e:
+            logger.error(f"Ошибка обмена библиотекой: {e}", exc_info=True)
+            self.failed.emit(str(e))
 
-class TooltipCheckBox(QCheckBox):
-    """A custom QCheckBox that shows a tooltip with the full text when hovered.
-    
-    Args:
-        text (str): The text to display next to the checkbox
-        tooltip (str, optional): The tooltip text to show on hover
-        effect (str, optional): Additional effect information
-        word_type (str, optional): Type of word ('positive' or 'negative') to style accordingly
-        parent (QWidget, optional): Parent widget
-    """
-    def __init__(self, text, tooltip="", effect="", word_type="positive", parent=None):
-        super().__init__(text, parent)
-        # Combine tooltip and effect for the tooltip text
-        full_tooltip = tooltip
-        if effect:
-            full_tooltip = f"{tooltip}\n\nEffect: {effect}" if tooltip else f"Effect: {effect}"
-        self.setToolTip(full_tooltip)
-        
-        # Set styling based on word type
-        if word_type.lower() == "negative":
-            self.setStyleSheet("""
-                QCheckBox {
-                    color: #ff6b6b;
-                    padding: 4px 0;
-                    spacing: 8px;
-                }
-                QCheckBox::indicator:unchecked {
-                    border: 1px solid #ff6b6b;
-                    background: #2d2d2d;
-                    border-radius: 3px;
-                }
-                QCheckBox::indicator:checked {
-                    border: 1px solid #ff6b6b;
-                    background: #ff6b6b;
-                    border-radius: 3px;
-                }
-                QCheckBox:hover {
-                    color: #ff8e8e;
-                }
-            """)
-        else:
-            self.setStyleSheet("""
-                QCheckBox {
-                    color: #e0e0e0;
-                    padding: 4px 0;
-                    spacing: 8px;
-                }
-                QCheckBox::indicator {
-                    width: 16px;
-                    height: 16px;
-                }
-                QCheckBox::indicator:unchecked {
-                    border: 1px solid #4a4a4a;
-                    background: #2d2d2d;
-                    border-radius: 3px;
-                }
-                QCheckBox::indicator:checked {
-                    border: 1px solid #4a9cff;
-                    background: #4a9cff;
-                    border-radius: 3px;
-                }
-                QCheckBox:hover {
-                    color: #ffffff;
-                }
-            """)
-
-
-class StyledTabWidget(QTabWidget):
-    """A custom tab widget with styled tabs."""
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setStyleSheet("""
-            QTabWidget::pane {
-                border: 1px solid #3e3e3e;
-                background: #2d2d2d;
-                border-radius: 4px;
-                margin: 1px;
-            }
-            QTabBar::tab {
-                background: #3e3e3e;
-                color: #e0e0e0;
-                padding: 8px 16px;
-                margin-right: 2px;
-                border: 1px solid #3e3e3e;
-                border-bottom: none;
-                border-top-left-radius: 4px;
-                border-top-right-radius: 4px;
-            }
-            QTabBar::tab:selected {
-                background: #2d2d2d;
-                border-bottom: 1px solid #2d2d2d;
-                margin-bottom: -1px;
-            }
-            QTabBar::tab:!selected {
-                margin-top: 2px;
-            }
-            QTabBar::tab:hover {
-                background: #4a4a4a;
-            }
-        """)
+
+class _ImageAddSignals(QObject):
+    done = pyqtSignal(str, str)  # имя в хранилище, текст ошибки
+
+
+class ImageAddTask(QRunnable):
+    """Hashes and copies a chosen image into the ImageStore off the GUI thread."""
+
+    def __init__(self, image_store, source: Path):
+        super().__init__()
+        self.signals = _ImageAddSignals()
+        self._image_store = image_store
+        self._source = source
+
+    def run(self):
+        try:
+            self.signals.done.emit(self._image_store.add_file(self._source), "")
+        except Exception as e:
+            logger.error(f"Error copying image file: {e}")
+            self.signals.done.emit("", str(e))
 
 
 class PromptGenie(QMainWindow):
+    # Время от старта процесса до первой отрисовки окна, мс
+    first_painted = pyqtSignal(float)
+
     def get_data_dir(self) -> Path:
         """Get the application data directory."""
         # Use local directory for now
@@ -417,14 +280,33 @@ class PromptGenie(QMainWindow):
             logger.error(f"Error saving config: {e}")
             return False
 
-    def save_themes(self) -> bool:
-        """Сохраняет текущие шаблоны в файл THEMES_FILE."""
+    def save_themes(self, op: Optional[str] = None, row: int = -1,
+                    theme: Optional[dict] = None) -> bool:
+        """Сохраняет изменения шаблонов.
+
+        Одиночное изменение ("add", "update" или "delete" строки row) дописывается
+        в журнал ThemeStore, а файл THEMES_FILE сжимается в фоне по мере роста
+        журнала. Без op выполняется полная атомарная перезапись THEMES_FILE.
+        Для "delete" theme — удалённый шаблон (общая библиотека ищет его по ETag).
+        """
         try:
-            data = {"themes": self.themes}
-            with open(THEMES_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            logger.info(f"Saved {len(self.themes)} themes to {THEMES_FILE}")
+            if op == "add":
+                self.theme_store.append(self.themes[row])
+            elif op == "update":
+                self.theme_store.update(row, self.themes[row])
+            elif op == "delete":
+                self.theme_store.remove(row, theme)
+            else:
+                self.theme_store.compact(self.themes, wait=True)
+                return True
+
+            if self.theme_store.needs_compaction():
+                self.theme_store.compact(self.themes)
             return True
+        except ThemeConflict as e:
+            logger.warning(f"Conflict saving themes: {e}")
+            self.resolve_theme_conflict(e)
+            return False
         except Exception as e:
             logger.error(f"Error saving themes: {e}")
             QMessageBox.critical(
@@ -434,6 +316,21 @@ class PromptGenie(QMainWindow):
             )
             return False
 
+    def closeEvent(self, event):
+        """Сворачивает журнал изменений в THEMES_FILE перед выходом."""
+        try:
+            # Пока шаблоны не загружены, self.themes пуст и сохранять его нельзя
+            self.theme_loader.wait()
+            if self.library_watcher is not None:
+                self.library_watcher.stop()
+            if self.image_queue is not None:
+                self.image_queue.shutdown()
+            if self.themes_loaded:
+                self.theme_store.close(self.themes)
+        except Exception as e:
+            logger.error(f"Error saving themes on exit: {e}", exc_info=True)
+        super().closeEvent(event)
+
     def validate_template_data(self, title: str, prompt: str) -> bool:
         """Проверяет корректность введенных данных шаблона."""
         if not title.strip():
@@ -452,21 +349,52 @@ class PromptGenie(QMainWindow):
             # Initialize variables
             self.themes = []
             self.kw_data = {}
-            self.selected_words = {}
+            self.composer = PromptComposer()
+            self.search_index = TemplateSearchIndex()
             self.data_dir = self.get_data_dir()
             self.config = self.load_config()
-            
-            # Load data
-            logger.debug("Loading data...")
-            self.load_data()
+            self.theme_store = self.create_theme_store()
+            self.image_store = ImageStore(self.images_dir)
+            self.thumbnails = ThumbnailService(
+                self.data_dir / "thumbnails",
+                max_bytes=int(self.config.get("thumbnail_cache_mb", 64)) * 1024 * 1024,
+                parent=self
+            )
+            self.thumbnails.thumbnail_ready.connect(self.on_thumbnail_ready)
+            self._pending_thumbnail = None
+            self.image_queue = None
+            self.library_watcher = None
+            # Общая библиотека: изменения других экземпляров читаются из журнала
+            self.shared_sync_timer = None
+            if isinstance(self.theme_store, SharedThemeStore):
+                self.shared_sync_timer = QTimer(self)
+                self.shared_sync_timer.setInterval(self.config.get("shared_poll_ms", 2000))
+                self.shared_sync_timer.timeout.connect(self.sync_shared_library)
+                self.shared_sync_timer.start()
+            self.startup_time_ms = None
+            self.themes_loaded = False
+            self.builder_built = False
             
             # Initialize UI
             self.setWindowTitle("PromptGenie 3.0")
             self.setMinimumSize(1280, 720)
-            self.setStyleSheet("background:#1e1e1e; color:#e0e0e0; font-family:Segoe UI;")
+            # Стили задаются один раз на приложение через StyleRegistry
+            if self.config.get("debug_stats"):
+                StyleRegistry.instance().track_style_changes(QApplication.instance())
+            AnimationManager.instance().set_enabled(
+                self.config.get("animations_enabled", True) and not low_power_session()
+            )
             
             # Initialize UI components
             self._init_ui_components()
+
+            # Шаблоны загружаются в фоне, окно показывается сразу
+            logger.debug("Loading themes in background...")
+            self.theme_loader = ThemeLoaderThread(self.theme_store, self.search_index,
+                                                  self.image_store, self)
+            self.theme_loader.loaded.connect(self.on_themes_loaded)
+            self.theme_loader.failed.connect(self.on_themes_failed)
+            self.theme_loader.start()
             
             logger.info("Приложение успешно инициализировано")
             
@@ -474,23 +402,70 @@ class PromptGenie(QMainWindow):
             logger.critical("Ошибка при инициализации приложения", exc_info=True)
             raise
             
-    def load_data(self):
-        """Load theme and keyword data."""
+    def create_theme_store(self):
+        """Creates the storage backend selected by config["storage_backend"].
+
+        "json" (default) keeps THEMES_FILE with a change journal; "sqlite" uses
+        data/promptgenie.db, ThemeLoaderThread imports the JSON files on first start.
+        With config["shared_library"] the JSON library (THEMES_FILE or
+        config["shared_library_path"]) may be edited by several PromptGenie
+        windows at once, see SharedThemeStore.
+        """
+        if self.config.get("storage_backend") == "sqlite":
+            return SQLiteStore(self.data_dir / "promptgenie.db")
+        if self.config.get("shared_library"):
+            path = Path(self.config.get("shared_library_path") or THEMES_FILE)
+            return SharedThemeStore(path, lock_timeout=self.config.get("shared_lock_timeout", 10.0))
+        return ThemeStore(THEMES_FILE)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.startup_time_ms is None:
+            self.startup_time_ms = (time.perf_counter() - PROCESS_START) * 1000.0
+            logger.info(f"Startup time (process start to first paint): {self.startup_time_ms:.0f} ms")
+            logger.debug(f"Style stats: {StyleRegistry.instance().stats()}")
+            self.first_painted.emit(self.startup_time_ms)
+
+    def on_themes_loaded(self, themes):
+        """Принимает шаблоны из фонового потока и показывает список."""
+        self.themes = themes
+        self.themes_loaded = True
+        logger.info(f"Loaded {len(self.themes)} themes from {self.theme_store.path} "
+                    f"({(time.perf_counter() - PROCESS_START) * 1000.0:.0f} ms after start)")
+        self.refresh_template_list()
+        self.template_stack.setCurrentWidget(self.template_list)
+        self.set_templates_editable(True)
+        self.start_library_watcher()
+
+    def on_themes_failed(self, message):
+        self.template_placeholder.setText("Не удалось загрузить шаблоны")
+        QMessageBox.critical(
+            self,
+            "Ошибка загрузки данных",
+            f"Не удалось загрузить шаблоны: {message}"
+        )
+
+    def on_tab_changed(self, index):
+        """Строит вкладку конструктора при первом открытии."""
+        if index != self.builder_tab_index or self.builder_built:
+            return
+        self.builder_built = True
+        try:
+            self.load_keywords()
+            self.builder_container.layout().addWidget(self.builder_tab())
+        except Exception as e:
+            logger.error(f"Ошибка при инициализации конструктора: {str(e)}", exc_info=True)
+
+    def load_keywords(self):
+        """Load the keyword library (first opening of the Builder tab)."""
         try:
-            # Load themes
-            if THEMES_FILE.exists():
-                with open(THEMES_FILE, 'r', encoding='utf-8') as f:
-                    themes_data = json.load(f)
-                    # Access the 'themes' key from the loaded data
-                    self.themes = themes_data.get('themes', [])
-
-                # Гарантируем наличие поля image_path у каждого шаблона
-                for theme in self.themes:
-                    if "image_path" not in theme:
-                        theme["image_path"] = ""
-                logger.info(f"Loaded {len(self.themes)} themes from {THEMES_FILE}")
-            keyword_file = Path(__file__).parent / "keyword_library.json"
-            if keyword_file.exists():
+            keyword_file = KEYWORDS_FILE
+            if isinstance(self.theme_store, SQLiteStore):
+                # При первом запуске ключевые слова импортирует ThemeLoaderThread
+                self.theme_loader.wait()
+                self.kw_data = self.theme_store.load_keywords()
+                logger.info(f"Loaded keyword library from {self.theme_store.path}")
+            elif keyword_file.exists():
                 with open(keyword_file, 'r', encoding='utf-8') as f:
                     keyword_data = json.load(f)
                     # Access the 'keywords' key from the loaded data
@@ -500,21 +475,20 @@ class PromptGenie(QMainWindow):
                 logger.warning(f"Keyword library not found: {keyword_file}")
                 self.kw_data = {}
                 
-            # Initialize selected words
-            for category in self.kw_data.keys():
-                self.selected_words[category] = []
-                
-            logger.info("Data loading completed successfully")
+            self.composer.set_keywords(self.kw_data)
+            # ID ключевых слов сменились — кэш подсказок недействителен
+            KeywordTooltips.instance().set_index(self.composer.index)
+            if self.library_watcher is not None:
+                self.library_watcher.set_keywords(self.kw_data)
             
         except Exception as e:
-            logger.error(f"Error loading data: {e}")
+            logger.error(f"Error loading keyword library: {e}")
             QMessageBox.critical(
                 self,
                 "Ошибка загрузки данных",
-                f"Не удалось загрузить данные: {str(e)}"
+                f"Не удалось загрузить библиотеку ключевых слов: {str(e)}"
             )
             raise
-            raise
     
     def _init_ui_components(self):
         """Инициализация компонентов пользовательского интерфейса."""
@@ -538,18 +512,28 @@ class PromptGenie(QMainWindow):
             # Create styled tab widget
             tabs = StyledTabWidget()
             
-            # Добавляем вкладки
+            # Добавляем вкладки; конструктор строится при первом открытии
             templates_tab = self.templates_tab()
-            builder_tab = self.builder_tab()
+            self.builder_container = QWidget()
+            builder_layout = QVBoxLayout(self.builder_container)
+            builder_layout.setContentsMargins(0, 0, 0, 0)
             
             tabs.addTab(templates_tab, "Шаблоны")
-            tabs.addTab(builder_tab, "Конструктор")
+            self.builder_tab_index = tabs.addTab(self.builder_container, "Конструктор")
+            tabs.currentChanged.connect(self.on_tab_changed)
             
             layout.addWidget(tabs)
             
             # Статус бар
             self.status_label = StatusLabel()
             self.statusBar().addWidget(self.status_label)
+            self.image_progress = QProgressBar()
+            self.image_progress.setMaximumWidth(200)
+            self.image_progress.setFormat("Изображения: %v/%m")
+            self.image_progress.hide()
+            self.statusBar().addPermanentWidget(self.image_progress)
+            if self.config.get("debug_stats"):
+                self.statusBar().addPermanentWidget(DebugOverlay())
             
             # Устанавливаем активную вкладку
             tabs.setCurrentIndex(0)
@@ -575,21 +559,47 @@ class PromptGenie(QMainWindow):
             left_layout = QVBoxLayout(left_panel)
             left_layout.setSpacing(10)
 
-            # Поле поиска
+            # Поле поиска (запросы выполняются в пуле потоков с задержкой ввода)
+            self.template_search = SearchScheduler(
+                self._run_template_query,
+                self.config.get("search_debounce_ms", 150),
+                parent=self
+            )
+            self.template_search.results_ready.connect(self.apply_template_search)
             self.search_edit = SearchBox("Поиск по названию или описанию...")
             self.search_edit.textChanged.connect(self.filter_templates)
             left_layout.addWidget(self.search_edit)
 
-            # Выбор категории
+            # Список шаблонов (model/view: строки создаются только для видимой области)
+            self.template_model = ThemeListModel(self.themes, self)
+            self.template_proxy = ThemeFilterProxyModel(self)
+            self.template_proxy.setSourceModel(self.template_model)
+
+            # Выбор категории: строки с числом шаблонов обновляются вместе с моделью
+            self.category_model = CategoryListModel(self.template_model, parent=self)
             self.category_combo = QComboBox()
-            self.category_combo.addItem("Все категории", "")
+            self.category_combo.setModel(self.category_model)
+            # Категория исчезает вместе с последним шаблоном, комбобокс сам сменит выбор
             self.category_combo.currentIndexChanged.connect(self.filter_templates)
             left_layout.addWidget(self.category_combo)
 
-            # Список шаблонов
-            self.template_list = QListWidget()
-            self.template_list.itemClicked.connect(self.show_temp)
-            left_layout.addWidget(self.template_list, 1)
+            self.template_list = QListView()
+            self.template_list.setModel(self.template_proxy)
+            self.template_list.setUniformItemSizes(True)
+            self.template_list.setLayoutMode(QListView.LayoutMode.Batched)
+            self.template_list.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+            # Несколько шаблонов можно выделить для пакетной генерации изображений
+            self.template_list.setSelectionMode(QListView.SelectionMode.ExtendedSelection)
+            self.template_list.clicked.connect(self.show_temp)
+
+            # Заглушка на время фоновой загрузки шаблонов
+            self.template_placeholder = QLabel("Загрузка шаблонов...")
+            self.template_placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            self.template_placeholder.setObjectName("placeholder")
+            self.template_stack = QStackedWidget()
+            self.template_stack.addWidget(self.template_placeholder)
+            self.template_stack.addWidget(self.template_list)
+            left_layout.addWidget(self.template_stack, 1)
 
             # Кнопки управления
             btn_frame = QFrame()
@@ -615,6 +625,18 @@ class PromptGenie(QMainWindow):
             btn_layout.addWidget(self.btn_delete)
             btn_layout.addWidget(self.btn_copy)
 
+            # Обмен наборами шаблонов (JSON, JSONL, CSV, ZIP с изображениями)
+            library_btn = QToolButton()
+            library_btn.setText("⋯")
+            library_btn.setToolTip("Импорт и экспорт шаблонов")
+            library_btn.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
+            library_menu = QMenu(library_btn)
+            self.import_action = library_menu.addAction("Импорт шаблонов...", self.import_library)
+            library_menu.addAction("Экспорт шаблонов...", self.export_library)
+            library_btn.setMenu(library_menu)
+            btn_layout.addWidget(library_btn)
+            self.set_templates_editable(self.themes_loaded)
+
             left_layout.addWidget(btn_frame)
 
             # Правая панель - предпросмотр шаблона
@@ -624,12 +646,12 @@ class PromptGenie(QMainWindow):
 
             # Категория шаблона
             self.temp_category = QLabel()
-            self.temp_category.setStyleSheet("font-size: 14px; color: #4fc3f7;")
+            self.temp_category.setObjectName("templateCategory")
             right_layout.addWidget(self.temp_category)
 
             # Заголовок шаблона
             self.temp_title = QLabel()
-            self.temp_title.setStyleSheet("font-size: 16px; font-weight: bold; margin-bottom: 10px;")
+            self.temp_title.setObjectName("templateTitle")
             right_layout.addWidget(self.temp_title)
 
             # Описание + промпт и картинка справа
@@ -645,31 +667,33 @@ class PromptGenie(QMainWindow):
 
             self.temp_preview = TemplatePreviewEdit(self)
             self.temp_preview.setReadOnly(True)
-            self.temp_preview.setStyleSheet("""
-                QTextEdit {
-                    background: #252526;
-                    border: 1px solid #444;
-                    border-radius: 4px;
-                    padding: 10px;
-                    font-family: 'Consolas', 'Courier New', monospace;
-                    font-size: 12px;
-                }
-            """)
             text_col.addWidget(self.temp_preview, 1)
 
             self.temp_image = QLabel()
             self.temp_image.setAlignment(Qt.AlignmentFlag.AlignCenter)
             self.temp_image.setMinimumSize(260, 220)
-            self.temp_image.setStyleSheet("background:#151515; border:1px solid #333; border-radius:4px;")
+            self.temp_image.setObjectName("templateImage")
 
             content_row.addLayout(text_col, 2)
             content_row.addWidget(self.temp_image, 1)
             right_layout.addLayout(content_row, 1)
 
-            # Кнопка копирования промпта
+            # Кнопка копирования промпта и генерация изображений
+            actions_row = QHBoxLayout()
             self.copy_btn = GradientButton("Копировать промпт", "#4caf50")
             self.copy_btn.clicked.connect(self.copy_template_prompt)
-            right_layout.addWidget(self.copy_btn)
+            actions_row.addWidget(self.copy_btn, 1)
+
+            self.generate_btn = GradientButton("Сгенерировать изображение", "#007acc")
+            self.generate_btn.clicked.connect(self.generate_images)
+            actions_row.addWidget(self.generate_btn, 1)
+
+            api_btn = QToolButton()
+            api_btn.setText("⚙")
+            api_btn.setToolTip("Настройки API генерации изображений")
+            api_btn.clicked.connect(self.open_api_settings)
+            actions_row.addWidget(api_btn)
+            right_layout.addLayout(actions_row)
 
             # Добавляем панели в основной макет
             layout = self.centralWidget().layout() if isinstance(self.centralWidget().layout(), QVBoxLayout) else None
@@ -678,8 +702,8 @@ class PromptGenie(QMainWindow):
             layout_tab.addWidget(left_panel, 1)
             layout_tab.addWidget(right_panel, 2)
 
-            # Загружаем список шаблонов после создания всех виджетов
-            self.refresh_template_list()
+            # Список заполняется в on_themes_loaded после фоновой загрузки
+            self.clear_template_preview()
 
             logger.debug("Вкладка шаблонов успешно инициализирована")
             return w
@@ -688,79 +712,81 @@ class PromptGenie(QMainWindow):
             raise
 
     def refresh_template_list(self):
-        """Обновляет список шаблонов и категорий."""
-        self.template_list.clear()
-        
-        # Собираем все категории
-        categories = set()
-        for theme in self.themes:
-            category = theme.get("category", "Без категории")
-            categories.add(category)
-            
-            item = QListWidgetItem(f"{category} - {theme['title_ru']}")
-            item.setData(Qt.ItemDataRole.UserRole, theme)
-            self.template_list.addItem(item)
-        
-        # Обновляем список категорий
-        current_category = self.category_combo.currentData()
-        self.category_combo.clear()
-        self.category_combo.addItem("Все категории", "")
-        for category in sorted(categories):
-            self.category_combo.addItem(category, category)
-            
-        # Восстанавливаем выбранную категорию, если она есть
-        if current_category:
-            index = self.category_combo.findData(current_category)
-            if index >= 0:
-                self.category_combo.setCurrentIndex(index)
+        """Полностью перезагружает модель шаблонов и список категорий.
+
+        Вызывается только при загрузке данных: добавление, изменение и удаление
+        шаблонов обновляют модель построчно.
+        """
+        self.template_model.set_themes(self.themes, self.theme_store.index)
         
         # Применяем фильтры
         self.filter_templates()
         
         # Сбрасываем превью при обновлении списка
-        if self.template_list.count() > 0:
-            self.template_list.setCurrentRow(0)
-            self.show_temp(self.template_list.currentItem())
+        if self.template_proxy.rowCount() > 0:
+            first = self.template_proxy.index(0, 0)
+            self.template_list.setCurrentIndex(first)
+            self.show_temp(first)
         else:
             self.clear_template_preview()
 
+    def set_templates_editable(self, enabled: bool):
+        """Включает добавление, изменение, удаление и импорт шаблонов.
+
+        Пока шаблоны загружаются, self.themes заменяется целиком и правки пропали бы.
+        """
+        self.btn_add.setEnabled(enabled)
+        self.import_action.setEnabled(enabled)
+        has_current = enabled and self.current_template_row() >= 0
+        self.btn_edit.setEnabled(has_current)
+        self.btn_delete.setEnabled(has_current)
+
+    def current_template_row(self) -> int:
+        """Возвращает строку выбранного шаблона в исходной модели или -1."""
+        index = self.template_list.currentIndex()
+        if not index.isValid():
+            return -1
+        return self.template_proxy.mapToSource(index).row()
+
     def filter_templates(self, text=None):
-        """Фильтрует список шаблонов по категории и введенному тексту."""
+        """Фильтрует список шаблонов по категории и введенному тексту.
+
+        Категория применяется сразу, текстовый поиск выполняется в фоне через
+        SearchScheduler и приходит в apply_template_search.
+
+        Args:
+            text: Текст поиска (ввод в поле), индекс категории (смена фильтра)
+                или None, чтобы немедленно повторить поиск после изменения данных
+        """
         try:
-            # Обработка текста для поиска
-            search_text = ""
-            if text is not None and not isinstance(text, int):
-                search_text = str(text).lower()
-            elif hasattr(self, 'search_edit'):
-                search_text = self.search_edit.text().lower()
-                
-            # Получаем выбранную категорию
-            selected_category = self.category_combo.currentData()
-            
-            for i in range(self.template_list.count()):
-                item = self.template_list.item(i)
-                if not item:
-                    continue
-                    
-                theme = item.data(Qt.ItemDataRole.UserRole)
-                if not theme:
-                    continue
-                
-                # Проверяем категорию
-                category_match = not selected_category or (theme.get("category") == selected_category)
-                
-                # Проверяем вхождение текста в название или описание, если текст задан
-                text_match = True
-                if search_text:
-                    title = str(theme.get("title_ru", "")).lower()
-                    desc = str(theme.get("description_ru", "")).lower()
-                    text_match = (search_text in title) or (search_text in desc)
-                
-                item.setHidden(not (category_match and text_match))
+            # Фильтрация выполняется прокси-моделью, виджеты строк не создаются
+            self.template_proxy.set_category(self.category_combo.currentData())
+
+            if isinstance(text, int):
+                return
+            if text is None:
+                self.template_search.flush(self.search_edit.text().strip())
+            else:
+                self.template_search.schedule(str(text).strip())
                 
         except Exception as e:
             logger.error(f"Ошибка при фильтрации шаблонов: {str(e)}", exc_info=True)
             
+    def _run_template_query(self, query, context, is_cancelled):
+        """Выполняется в пуле потоков: оценки шаблонов по ID.
+
+        Список шаблонов здесь не читается — его меняет GUI-поток. Прокси
+        показывает строки, чьи ID есть в результате, при своём проходе по
+        строкам, так что отдельного прохода по списку нет.
+        """
+        if not query:
+            return None
+        return self.search_index.match(query)
+
+    def apply_template_search(self, scores):
+        """Применяет результат фонового поиска к списку шаблонов."""
+        self.template_proxy.set_search_result(scores)
+
     def copy_template_prompt(self):
         """Копирует текст промпта выбранного шаблона в буфер обмена."""
         try:
@@ -785,22 +811,26 @@ class PromptGenie(QMainWindow):
             
     def edit_current_template(self):
         """Открывает диалог редактирования выбранного шаблона."""
-        current_item = self.template_list.currentItem()
-        if not current_item:
+        if not self.themes_loaded:
+            return
+        row = self.current_template_row()
+        theme_data = self.template_model.theme_at(row)
+        if theme_data is None:
             QMessageBox.information(self, "Информация", "Выберите шаблон для редактирования")
             return
             
-        theme_data = current_item.data(Qt.ItemDataRole.UserRole)
         self.open_template_dialog(edit_mode=True, theme=theme_data)
         
     def delete_current_template(self):
         """Удаляет выбранный шаблон."""
-        current_item = self.template_list.currentItem()
-        if not current_item:
+        if not self.themes_loaded:
+            return
+        row = self.current_template_row()
+        theme_data = self.template_model.theme_at(row)
+        if theme_data is None:
             QMessageBox.information(self, "Информация", "Выберите шаблон для удаления")
             return
             
-        theme_data = current_item.data(Qt.ItemDataRole.UserRole)
         theme_title = theme_data.get('title_ru', 'Неизвестный шаблон')
         
         # Подтверждение удаления
@@ -814,20 +844,16 @@ class PromptGenie(QMainWindow):
         
         if reply == QMessageBox.StandardButton.Yes:
             try:
-                # Удаляем шаблон из списка
-                for i, theme in enumerate(self.themes):
-                    if theme.get('title_ru') == theme_title:
-                        del self.themes[i]
-                        break
-                
-                # Обновляем список шаблонов
-                self.refresh_template_list()
+                # Удаляем именно выбранную строку (модель сообщает виду rowsRemoved)
+                self.search_index.remove(theme_key(theme_data))
+                self.template_model.remove_theme(row)
+                self.filter_templates()
                 self.clear_template_preview()
                 
-                # Сохраняем изменения
-                self.save_themes()
-                
-                QMessageBox.information(self, "Успех", "Шаблон успешно удален")
+                # Сохраняем изменения; изображение без других ссылок удаляется
+                if self.save_themes("delete", row, theme_data):
+                    self.image_store.release(theme_data.get("image_path"))
+                    QMessageBox.information(self, "Успех", "Шаблон успешно удален")
                 
             except Exception as e:
                 logger.error(f"Ошибка при удалении шаблона: {str(e)}", exc_info=True)
@@ -844,6 +870,8 @@ class PromptGenie(QMainWindow):
             edit_mode: Режим редактирования (True) или создания (False)
             theme: Словарь с данными шаблона для редактирования
         """
+        if not self.themes_loaded:
+            return
         dialog = QDialog(self)
         dialog.setWindowTitle("Редактирование шаблона" if edit_mode else "Новый шаблон")
         dialog.setMinimumWidth(500)
@@ -857,17 +885,11 @@ class PromptGenie(QMainWindow):
         category_edit.setEditable(True)
         category_edit.setInsertPolicy(QComboBox.InsertPolicy.InsertAtBottom)
         
-        # Добавляем существующие категории
-        categories = set()
-        for t in self.themes:
-            if "category" in t:
-                categories.add(t["category"])
-        
-        for category in sorted(categories):
-            category_edit.addItem(category)
+        # Добавляем существующие категории (из индекса, без обхода шаблонов)
+        category_edit.addItems(self.category_model.categories())
         
         # Если это новая категория, добавляем её в список
-        if theme and "category" in theme and theme["category"] not in categories:
+        if theme and "category" in theme and category_edit.findText(theme["category"]) < 0:
             category_edit.addItem(theme["category"])
         
         form.addRow("Категория:", category_edit)
@@ -887,6 +909,9 @@ class PromptGenie(QMainWindow):
         form.addRow("Промпт:", prompt_edit)
 
         image_path = ""
+        # Изображения, добавленные в хранилище за время работы диалога
+        added_images = []
+        dialog_closed = False
         image_path_edit = QLineEdit()
         image_path_edit.setReadOnly(True)
         btn_image_choose = QPushButton("Выбрать...")
@@ -902,13 +927,13 @@ class PromptGenie(QMainWindow):
             category_edit.setCurrentText(theme.get("category", ""))
             title_edit.setText(theme.get("title_ru", ""))
             desc_edit.setText(theme.get("description_ru", ""))
-            prompt_edit.setText(theme.get("prompt_combined_en", ""))
+            prompt_edit.setText(self.theme_store.fragments.expand(theme.get("prompt_combined_en", "")))
             image_path = theme.get("image_path", "") or ""
             if image_path:
                 image_path_edit.setText(image_path)
+        old_image = image_path if edit_mode else ""
 
         def choose_image():
-            nonlocal image_path
             file_path, _ = QFileDialog.getOpenFileName(
                 self,
                 "Выбрать изображение",
@@ -917,21 +942,29 @@ class PromptGenie(QMainWindow):
             )
             if not file_path:
                 return
-            try:
-                base_name = os.path.basename(file_path)
-                target_name = base_name
-                counter = 1
-                while (self.images_dir / target_name).exists():
-                    name, ext = os.path.splitext(base_name)
-                    target_name = f"{name}_{counter}{ext}"
-                    counter += 1
-                target_path = self.images_dir / target_name
-                shutil.copy(file_path, target_path)
-                image_path = target_name
+            # Хэширование и копирование — в пуле потоков, диалог не блокируется
+            image_path_edit.setText("Копирование...")
+            btn_image_choose.setEnabled(False)
+            btn_box.button(QDialogButtonBox.StandardButton.Ok).setEnabled(False)
+            task = ImageAddTask(self.image_store, Path(file_path))
+            task.signals.done.connect(image_added)
+            QThreadPool.globalInstance().start(task)
+
+        def image_added(name, error):
+            nonlocal image_path
+            if dialog_closed:
+                # Диалог закрыли во время копирования: файл никому не нужен
+                self.image_store.discard(name)
+                return
+            btn_image_choose.setEnabled(True)
+            btn_box.button(QDialogButtonBox.StandardButton.Ok).setEnabled(True)
+            if error:
                 image_path_edit.setText(image_path)
-            except Exception as e:
-                logger.error(f"Error copying image file: {e}")
-                QMessageBox.critical(self, "Ошибка", f"Не удалось скопировать изображение:\n{e}")
+                QMessageBox.critical(self, "Ошибка", f"Не удалось скопировать изображение:\n{error}")
+                return
+            added_images.append(name)
+            image_path = name
+            image_path_edit.setText(image_path)
 
         def clear_image():
             nonlocal image_path
@@ -948,8 +981,17 @@ class PromptGenie(QMainWindow):
         btn_box.accepted.connect(dialog.accept)
         btn_box.rejected.connect(dialog.reject)
         layout.addWidget(btn_box)
-        
-        if dialog.exec() == QDialog.DialogCode.Accepted:
+
+        def drop_unused_images():
+            # Добавленные, но не сохранённые в шаблоне изображения удаляются
+            for name in added_images:
+                self.image_store.discard(name)
+
+        accepted = dialog.exec() == QDialog.DialogCode.Accepted
+        dialog_closed = True
+        if not accepted:
+            drop_unused_images()
+        else:
             # Собираем данные
             new_theme = {
                 "category": category_edit.currentText().strip(),
@@ -961,60 +1003,521 @@ class PromptGenie(QMainWindow):
             
             # Валидация
             if not self.validate_template_data(new_theme["title_ru"], new_theme["prompt_combined_en"]):
+                drop_unused_images()
                 return
                 
-            # Обновляем или добавляем шаблон
-            if edit_mode and theme:
-                theme.update(new_theme)
+            new_theme["prompt_combined_en"] = self.theme_store.fragments.compress(new_theme["prompt_combined_en"])
+
+            # Обновляем или добавляем шаблон (построчные сигналы модели)
+            row = self.template_model.row_of(theme) if edit_mode and theme else -1
+            if row >= 0:
+                self.template_model.update_theme(row, new_theme)
+                op = "update"
             else:
-                self.themes.append(new_theme)
+                row = self.template_model.append_theme(new_theme)
+                op = "add"
+            saved_theme = self.template_model.theme_at(row)
+            self.search_index.update(theme_key(saved_theme), self.theme_store.fragments.expand_theme(saved_theme))
+            self.image_store.replace(old_image, image_path)
+            drop_unused_images()
                 
             # Сохраняем и обновляем интерфейс
-            if self.save_themes():
-                self.refresh_template_list()
-
-    def show_temp(self, item):
+            if self.save_themes(op, row):
+                self.filter_templates()
+                proxy_index = self.template_proxy.mapFromSource(self.template_model.index(row, 0))
+                if proxy_index.isValid():
+                    self.template_list.setCurrentIndex(proxy_index)
+                    self.template_list.scrollTo(proxy_index)
+                    self.show_temp(proxy_index)
+
+    def show_temp(self, index):
         """Показывает выбранный шаблон в интерфейсе.
         
         Args:
-            item: QListWidgetItem, содержащий данные шаблона
+            index: QModelIndex прокси-модели списка шаблонов
         """
-        if not item:
+        if index is None or not index.isValid():
             return
             
-        theme = item.data(Qt.ItemDataRole.UserRole)
+        theme = index.data(ThemeListModel.ThemeRole)
+        if not theme:
+            return
         self.temp_category.setText(theme.get("category", "Без категории"))
         self.temp_title.setText(theme["title_ru"])
         self.temp_desc.setText(theme["description_ru"])
-        self.temp_preview.setText(theme["prompt_combined_en"])
+        self.temp_preview.setText(self.theme_store.fragments.expand(theme["prompt_combined_en"]))
 
-        # Изображение шаблона
+        # Изображение шаблона (миниатюра готовится в фоне)
         if hasattr(self, "temp_image"):
             self.temp_image.clear()
+            self._pending_thumbnail = None
             image_name = theme.get("image_path") or ""
             if image_name:
+                size = QSize(
+                    self.temp_image.width() if self.temp_image.width() > 0 else 400,
+                    self.temp_image.height() if self.temp_image.height() > 0 else 250,
+                )
                 image_file = self.images_dir / image_name
-                if image_file.exists():
-                    pix = QPixmap(str(image_file))
-                    if not pix.isNull():
-                        scaled = pix.scaled(
-                            self.temp_image.width() if self.temp_image.width() > 0 else 400,
-                            self.temp_image.height() if self.temp_image.height() > 0 else 250,
-                            Qt.AspectRatioMode.KeepAspectRatio,
-                            Qt.TransformationMode.SmoothTransformation,
-                        )
-                        self.temp_image.setPixmap(scaled)
-        
-        # Активируем кнопки
-        if hasattr(self, 'btn_edit'):
-            self.btn_edit.setEnabled(True)
-            self.btn_delete.setEnabled(True)
-            self.btn_copy.setEnabled(True)
+                pix = self.thumbnails.request(image_file, size)
+                if pix is not None:
+                    self.temp_image.setPixmap(pix)
+                else:
+                    self._pending_thumbnail = (str(image_file), size)
+
+        # Активируем кнопки; пока библиотека перечитывается, шаблон можно только копировать
+        self.btn_edit.setEnabled(self.themes_loaded)
+        self.btn_delete.setEnabled(self.themes_loaded)
+        self.btn_copy.setEnabled(True)
+
+    def on_thumbnail_ready(self, path, size, pixmap):
+        """Показывает миниатюру, если шаблон всё ещё выбран."""
+        if self._pending_thumbnail == (path, size):
+            self._pending_thumbnail = None
+            self.temp_image.setPixmap(pixmap)
+
+    def open_api_settings(self) -> bool:
+        """Диалог настроек API; настройки хранятся в config["image_api"]."""
+        dialog = APIIntegrationDialog(self, self.config.get("image_api"))
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return False
+        settings = dialog.get_settings()
+        if not self.apply_api_settings(settings):
+            return False
+        self.config["image_api"] = settings
+        self.save_config(self.config)
+        return True
+
+    def apply_api_settings(self, settings: dict) -> bool:
+        """Создаёт очередь генерации или переключает её на новые настройки."""
+        try:
+            client = ImageGenerationClient.from_settings(settings)
+        except (ImageGenerationError, ValueError) as e:
+            QMessageBox.warning(self, "Настройки API", str(e))
+            return False
+        if self.image_queue is None:
+            cache = ResultCache(
+                self.data_dir / "results",
+                max_bytes=int(self.config.get("result_cache_mb", 512)) * 1024 * 1024
+            )
+            self.image_queue = ImageJobQueue(client, cache,
+                                             settings.get("concurrency", 1), parent=self)
+            self.image_queue.progress.connect(self.on_image_progress)
+            self.image_queue.job_finished.connect(self.on_image_finished)
+            self.image_queue.job_failed.connect(self.on_image_failed)
         else:
-            # Отключаем кнопки, если шаблон не выбран
-            self.btn_edit.setEnabled(False)
-            self.btn_delete.setEnabled(False)
-            self.btn_copy.setEnabled(False)
+            self.image_queue.set_client(client, settings.get("concurrency", 1))
+        return True
+
+    def generate_images(self):
+        """Ставит в очередь генерацию изображений для выделенных шаблонов."""
+        try:
+            if self.image_queue is None:
+                settings = self.config.get("image_api")
+                ready = self.apply_api_settings(settings) if settings else self.open_api_settings()
+                if not ready:
+                    return
+            settings = self.config["image_api"]
+            rows = sorted({self.template_proxy.mapToSource(index).row()
+                           for index in self.template_list.selectionModel().selectedIndexes()})
+            if not rows and self.current_template_row() >= 0:
+                rows = [self.current_template_row()]
+            jobs = []
+            for row in rows:
+                theme = self.template_model.theme_at(row)
+                if theme is None:
+                    continue
+                positive, negative = split_prompt(
+                    self.theme_store.fragments.expand(theme.get("prompt_combined_en", "")))
+                jobs.append(self.image_queue.make_job(
+                    positive, negative,
+                    width=settings.get("width", 512), height=settings.get("height", 512),
+                    steps=settings.get("steps", 30), title=theme.get("title_ru", ""), context=theme
+                ))
+            if not jobs:
+                QMessageBox.information(self, "Информация", "Выберите шаблоны для генерации")
+                return
+            self.image_queue.submit(jobs)
+            self.status_label.set_message(f"В очереди генерации: {len(jobs)}", "info")
+        except Exception as e:
+            logger.error(f"Ошибка при запуске генерации: {str(e)}", exc_info=True)
+            QMessageBox.critical(self, "Ошибка", f"Не удалось запустить генерацию:\n{str(e)}")
+
+    def on_image_progress(self, done, total):
+        self.image_progress.setVisible(done < total)
+        self.image_progress.setRange(0, max(total, 1))
+        self.image_progress.setValue(done)
+        if total and done == total:
+            failed = self.image_queue.failed
+            stats = self.image_queue.cache.stats()
+            logger.info(f"Кэш результатов: {stats}")
+            self.status_label.set_message(
+                f"Генерация завершена: {done - failed} из {total} "
+                f"(из кэша: {stats['hits']}, запросов: {stats['misses']})",
+                "warning" if failed else "success"
+            )
+
+    def on_image_finished(self, job, paths):
+        """Привязывает результат как превью шаблона, у которого его ещё нет."""
+        logger.info(f"Изображение для '{job.title}'{' (кэш)' if job.cached else ''}: "
+                    f"{', '.join(map(str, paths))}")
+        theme = job.context
+        if not paths or not theme or theme.get("image_path") \
+                or not self.config.get("link_generated_images", True):
+            return
+        if not self.themes_loaded:
+            # Список шаблонов перечитывается; изображение остаётся в кэше результатов
+            logger.info(f"Изображение для '{job.title}' не привязано: шаблоны перечитываются")
+            return
+        row = self.template_model.row_of(theme)
+        if row < 0:
+            return
+        try:
+            # Жёсткая ссылка: превью не пропадёт при вытеснении записи из кэша
+            name = self.image_store.add_file(paths[0], link=True)
+            self.template_model.update_theme(row, {"image_path": name})
+            self.image_store.acquire(name)
+            self.save_themes("update", row)
+            if self.current_template_row() == row:
+                self.show_temp(self.template_list.currentIndex())
+        except Exception as e:
+            logger.error(f"Ошибка привязки изображения к шаблону: {str(e)}", exc_info=True)
+
+    def on_image_failed(self, job, message):
+        self.status_label.set_message(f"Ошибка генерации '{job.title}': {message}", "error")
+
+    def _run_library_transfer(self, title, task, on_done):
+        """Запускает импорт/экспорт в фоне с окном прогресса."""
+        dialog = QProgressDialog(title, "Отмена", 0, 100, self)
+        dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        dialog.setMinimumDuration(300)
+        worker = LibraryTransferThread(task, self)
+        dialog.canceled.connect(lambda: setattr(worker, "cancelled", True))
+        worker.progress.connect(
+            lambda done, total: dialog.setValue(done * 100 // total if total else 0))
+
+        def finished(result):
+            dialog.reset()
+            on_done(result)
+
+        def failed(message):
+            dialog.reset()
+            QMessageBox.critical(self, "Ошибка", f"{title}\n{message}")
+
+        worker.done.connect(finished)
+        worker.failed.connect(failed)
+        worker.finished.connect(worker.deleteLater)
+        worker.start()
+
+    def start_library_watcher(self):
+        """Следит за THEMES_FILE и KEYWORDS_FILE и подхватывает внешние правки.
+
+        Отключается config["hot_reload"] = false; с базой SQLite файлы не используются.
+        Общая библиотека шаблонов синхронизируется через журнал (sync_shared_library),
+        поэтому для неё отслеживается только KEYWORDS_FILE.
+        """
+        if (self.library_watcher is not None or isinstance(self.theme_store, SQLiteStore)
+                or not self.config.get("hot_reload", True)):
+            return
+        try:
+            self.library_watcher = LibraryWatcher(
+                self.theme_store, KEYWORDS_FILE, lambda: list(self.themes),
+                self.config.get("hot_reload_delay_ms", 500), self,
+                watch_themes=not isinstance(self.theme_store, SharedThemeStore)
+            )
+            self.library_watcher.themes_changed.connect(self.apply_theme_diff)
+            self.library_watcher.keywords_changed.connect(self.apply_keyword_diff)
+            self.library_watcher.failed.connect(
+                lambda path, message: self.status_label.set_message(
+                    f"Не удалось перечитать {Path(path).name}: {message}", "error"))
+            if self.kw_data:
+                self.library_watcher.set_keywords(self.kw_data)
+            self.library_watcher.start()
+        except Exception as e:
+            logger.error(f"Не удалось запустить наблюдение за библиотекой: {e}", exc_info=True)
+
+    def _diff_row(self, diff, key):
+        """Строка шаблона с ключом key в модели или -1."""
+        row, theme = diff.local.get(key, (-1, None))
+        if theme is None:
+            return -1
+        if self.template_model.theme_at(row) is not theme:
+            # Список изменился, пока файл читался в фоне
+            row = self.template_model.row_of(theme)
+        return row
+
+    def apply_theme_diff(self, diff):
+        """Применяет внешние изменения THEMES_FILE построчно.
+
+        Шаблоны, изменённые здесь после последнего чтения файла, не
+        перезаписываются. Выделение и прокрутка списка сохраняются: модель
+        сообщает виду только об изменившихся строках.
+        """
+        try:
+            fragments = self.theme_store.fragments
+            digest = lambda theme: content_digest(fragments.expand_theme(theme))
+            current = self.template_model.theme_at(self.current_template_row())
+            kept = 0
+            missing_ids = any(not theme.get(ID_FIELD) for _, theme in diff.added) or \
+                any(not theme.get(ID_FIELD) for _, _, theme in diff.changed)
+
+            changed = 0
+            for key, old, theme in diff.changed:
+                row = self._diff_row(diff, key)
+                if row < 0:
+                    diff.added.append((key, theme))
+                    continue
+                local = digest(self.themes[row])
+                if local == diff.digests[key]:
+                    continue
+                if local != old:
+                    kept += 1
+                    continue
+                self.image_store.replace(self.themes[row].get("image_path"), theme.get("image_path"))
+                self.template_model.update_theme(row, theme)
+                saved = self.themes[row]
+                self.search_index.update(theme_key(saved), fragments.expand_theme(saved))
+                changed += 1
+
+            # Шаблон с таким ключом мог уже появиться здесь (например, записанный этим же окном)
+            added = []
+            for key, theme in diff.added:
+                row = self._diff_row(diff, key)
+                if row < 0:
+                    added.append(theme)
+                elif digest(self.themes[row]) != diff.digests[key]:
+                    kept += 1
+
+            removed_rows = []
+            for key, old in diff.removed:
+                row = self._diff_row(diff, key)
+                if row < 0:
+                    continue
+                if digest(self.themes[row]) != old:
+                    kept += 1
+                    continue
+                removed_rows.append(row)
+            for row in sorted(removed_rows, reverse=True):
+                theme = self.template_model.remove_theme(row)
+                self.search_index.remove(theme_key(theme))
+                self.image_store.release(theme.get("image_path"))
+
+            self.template_model.append_themes(added)
+            for theme in added:
+                self.search_index.update(theme_key(theme), fragments.expand_theme(theme))
+                self.image_store.acquire(theme.get("image_path"))
+
+            self.theme_store.adopt_snapshot(self.themes, diff.fragments, diff.seq, diff.signature)
+            if missing_ids:
+                # Шаблоны из файла получили идентификаторы только в памяти
+                self.theme_store.compact(self.themes)
+            if not (changed or added or removed_rows):
+                return
+            self.filter_templates()
+            row = self.current_template_row()
+            if row < 0 or self.template_model.theme_at(row) is not current:
+                self.clear_template_preview()
+            else:
+                self.show_temp(self.template_list.currentIndex())
+            message = (f"Библиотека шаблонов обновлена: +{len(added)} "
+                       f"−{len(removed_rows)} ~{changed}")
+            if kept:
+                message += f", локальные правки сохранены: {kept}"
+                logger.warning(f"Внешние изменения {kept} шаблонов пропущены: есть локальные правки")
+            self.status_label.set_message(message, "info")
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении библиотеки шаблонов: {str(e)}", exc_info=True)
+            self.status_label.set_message("Не удалось применить изменения библиотеки шаблонов",
+                                          "error")
+
+    def sync_shared_library(self):
+        """Применяет изменения общей библиотеки, записанные другими окнами.
+
+        Вызывается таймером (config["shared_poll_ms"]); пока журнал не менялся,
+        файл не открывается. Пока открыт модальный диалог, строки не сдвигаются.
+        Возвращает True, если список шаблонов изменился.
+        """
+        if (not isinstance(self.theme_store, SharedThemeStore) or not self.themes_loaded
+                or self.theme_loader.isRunning() or QApplication.activeModalWidget() is not None):
+            return False
+        try:
+            fragments = self.theme_store.fragments
+            current = self.template_model.theme_at(self.current_template_row())
+            counts = Counter()
+            for op, row, theme in self.theme_store.poll(self.themes):
+                if op == "reload":
+                    self.reload_shared_library()
+                    return True
+                if op == "add":
+                    theme.setdefault("image_path", "")
+                    self.template_model.append_theme(theme)
+                    self.search_index.update(theme_key(theme), fragments.expand_theme(theme))
+                    self.image_store.acquire(theme.get("image_path"))
+                elif op == "update":
+                    self.image_store.replace(self.themes[row].get("image_path"), theme.get("image_path"))
+                    self.template_model.update_theme(row, theme)
+                    saved = self.themes[row]
+                    self.search_index.update(theme_key(saved), fragments.expand_theme(saved))
+                elif op == "delete":
+                    removed = self.template_model.remove_theme(row)
+                    self.search_index.remove(theme_key(removed))
+                    self.image_store.release(removed.get("image_path"))
+                counts[op] += 1
+            if not counts:
+                return False
+            self.filter_templates()
+            row = self.current_template_row()
+            if row < 0 or self.template_model.theme_at(row) is not current:
+                self.clear_template_preview()
+            else:
+                self.show_temp(self.template_list.currentIndex())
+            self.status_label.set_message(
+                f"Общая библиотека обновлена: +{counts['add']} −{counts['delete']} "
+                f"~{counts['update']}", "info")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка синхронизации общей библиотеки: {str(e)}", exc_info=True)
+            self.status_label.set_message("Не удалось синхронизировать общую библиотеку", "error")
+            return False
+
+    def reload_shared_library(self):
+        """Перечитывает общую библиотеку целиком в фоне.
+
+        Нужно, когда журнал свернули раньше, чем это окно прочитало его записи.
+        """
+        if self.theme_loader.isRunning():
+            return
+        self.themes_loaded = False
+        self.set_templates_editable(False)
+        self.status_label.set_message("Общая библиотека перечитывается...", "info")
+        self.theme_loader.start()
+
+    def resolve_theme_conflict(self, conflict):
+        """Сохранение отклонено: шаблон уже изменил или удалил другой экземпляр.
+
+        Побеждает первая запись: сначала применяются чужие изменения, затем
+        несохранённая правка добавляется копией с пометкой «(конфликт)», чтобы
+        её можно было перенести вручную. Удаление не повторяется.
+        """
+        if conflict.op == "reload":
+            QMessageBox.warning(
+                self, "Общая библиотека",
+                "Библиотеку шаблонов изменили другие окна PromptGenie, пока это окно "
+                "её не читало. Последнее изменение не сохранено, библиотека будет перечитана."
+            )
+            self.reload_shared_library()
+            return
+        self.sync_shared_library()
+        theme = conflict.theme
+        if conflict.op == "delete" and theme is not None:
+            # Удалённая здесь копия больше не ссылается на изображение
+            self.image_store.release(theme.get("image_path"))
+        elif conflict.op == "update" and theme is not None:
+            copy = dict(theme, id=new_theme_id(), title_ru=f"{theme.get('title_ru', '')} (конфликт)")
+            row = self.template_model.append_theme(copy)
+            self.search_index.update(theme_key(copy), self.theme_store.fragments.expand_theme(copy))
+            self.image_store.acquire(copy.get("image_path"))
+            if self.save_themes("add", row):
+                self.filter_templates()
+        remote = "удалён" if (conflict.remote or {}).get("op") == "delete" else "изменён"
+        QMessageBox.warning(
+            self, "Конфликт изменений",
+            f"Шаблон «{(theme or {}).get('title_ru', '')}» {remote} в другом окне PromptGenie. "
+            + ("Ваша версия сохранена копией с пометкой «(конфликт)»."
+               if conflict.op == "update" else "Показана версия из общей библиотеки.")
+        )
+
+    def import_library(self):
+        """Импортирует набор шаблонов с дедупликацией и переименованием конфликтов."""
+        if not self.themes_loaded:
+            return
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Импорт шаблонов", "",
+            "Наборы шаблонов (*.zip *.jsonl *.csv *.json)"
+        )
+        if not path:
+            return
+        importer = None
+
+        def task(progress, is_cancelled):
+            nonlocal importer
+            importer = LibraryImporter(list(self.themes), self.image_store,
+                                       self.theme_store.fragments,
+                                       self.config.get("import_conflicts", "rename"))
+            return list(importer.run(Path(path), progress, is_cancelled))
+
+        def apply(ops):
+            if not self.themes_loaded:
+                # Библиотеку перечитали во время импорта: строки в ops уже неверны
+                self.status_label.set_message("Импорт отменён: библиотека шаблонов перечитывалась",
+                                              "warning")
+                return
+            try:
+                expand = self.theme_store.fragments.expand_theme
+                added = [theme for op, _, theme in ops if op == "add"]
+                first = self.template_model.append_themes(added)
+                for theme in added:
+                    self.search_index.update(theme_key(theme), expand(theme))
+                    self.image_store.acquire(theme.get("image_path"))
+                for op, row, theme in ops:
+                    if op == "replace":
+                        self.image_store.replace(self.themes[row].get("image_path"),
+                                                 theme.get("image_path"))
+                        self.template_model.update_theme(row, theme)
+                        saved = self.template_model.theme_at(row)
+                        self.search_index.update(theme_key(saved), expand(saved))
+                if ops:
+                    if isinstance(self.theme_store, (SQLiteStore, SharedThemeStore)):
+                        self.theme_store.extend(added)
+                        for op, row, theme in ops:
+                            if op == "replace":
+                                self.theme_store.update(row, self.themes[row])
+                    else:
+                        self.save_themes()
+                    self.filter_templates()
+                logger.info(f"Импортировано {len(added)} шаблонов начиная со строки {first}")
+                self.status_label.set_message(f"Импорт: {importer.report}", "success")
+            except ThemeConflict as e:
+                logger.warning(f"Конфликт при импорте шаблонов: {e}")
+                self.resolve_theme_conflict(e)
+            except Exception as e:
+                logger.error(f"Ошибка при импорте шаблонов: {str(e)}", exc_info=True)
+                QMessageBox.critical(self, "Ошибка", f"Не удалось импортировать шаблоны:\n{str(e)}")
+
+        self._run_library_transfer("Импорт шаблонов", task, apply)
+
+    def export_library(self):
+        """Экспортирует все шаблоны; формат определяется расширением файла."""
+        if not self.themes_loaded:
+            return
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Экспорт шаблонов", "templates.zip",
+            "ZIP с изображениями (*.zip);;JSONL (*.jsonl);;CSV (*.csv);;JSON (*.json)"
+        )
+        if not path:
+            return
+        themes = list(self.themes)
+
+        def task(progress, is_cancelled):
+            return export_themes(themes, Path(path), images_dir=self.images_dir,
+                                 fragments=self.theme_store.fragments, progress=progress)
+
+        self._run_library_transfer(
+            "Экспорт шаблонов", task,
+            lambda count: self.status_label.set_message(
+                f"Экспортировано шаблонов: {count}", "success")
+        )
+
+    def clear_template_preview(self):
+        """Очищает панель предпросмотра и отключает кнопки шаблона."""
+        self.temp_category.clear()
+        self.temp_title.clear()
+        self.temp_desc.clear()
+        self.temp_preview.clear()
+        self.temp_image.clear()
+        self._pending_thumbnail = None
+        self.btn_edit.setEnabled(False)
+        self.btn_delete.setEnabled(False)
+        self.btn_copy.setEnabled(False)
 
     def builder_tab(self):
         w = QWidget()
@@ -1024,7 +1527,7 @@ class PromptGenie(QMainWindow):
         # Проверка загруженных категорий
         if not self.kw_data:
             error_label = QLabel("Категории ключевых слов не загружены")
-            error_label.setStyleSheet("color: red; font-weight: bold;")
+            error_label.setObjectName("errorLabel")
             lay.addWidget(error_label)
             logger.warning("Категории ключевых слов не загружены при инициализации UI")
             return w
@@ -1034,25 +1537,45 @@ class PromptGenie(QMainWindow):
         cat_lay = QVBoxLayout(cat_box)
         self.cat_list = QListWidget()
         for cat in self.kw_data:
-            name = cat.split(".", 1)[1] if "." in cat else cat
-            self.cat_list.addItem(name)
+            self.cat_list.addItem(self._category_item(cat))
         self.cat_list.currentRowChanged.connect(self.load_cat)
         cat_lay.addWidget(self.cat_list)
 
         # Ключевые слова
         kw_box = QGroupBox("Ключевые слова")
         kw_lay = QVBoxLayout(kw_box)
+        self.kw_search = SearchScheduler(
+            self._run_keyword_query,
+            self.config.get("search_debounce_ms", 150),
+            parent=self
+        )
+        self.kw_search.results_ready.connect(self.apply_keyword_filter)
         self.search = QLineEdit()
         self.search.setPlaceholderText("Поиск...")
         self.search.textChanged.connect(self.filter_kw)
         kw_lay.addWidget(self.search)
 
-        scroll = QScrollArea()
+        scroll = self.kw_scroll = QScrollArea()
         scroll.setWidgetResizable(True)
         self.kw_widget = QWidget()
         self.kw_layout = QVBoxLayout(self.kw_widget)
         scroll.setWidget(self.kw_widget)
-        kw_lay.addWidget(scroll)
+        self.kw_pool = CheckBoxPool(
+            on_create=lambda cb: cb.stateChanged.connect(self.on_checkbox_changed)
+        )
+        self.kw_empty_label = QLabel("No keywords found in this category.")
+        self.kw_empty_label.setObjectName("placeholder")
+        self.kw_empty_label.hide()
+
+        # Large categories use a virtualized list instead of one widget per keyword
+        self.kw_list = QListWidget()
+        self.kw_list.setUniformItemSizes(True)
+        self.kw_list.itemChanged.connect(self.on_keyword_item_changed)
+
+        self.kw_stack = QStackedWidget()
+        self.kw_stack.addWidget(scroll)
+        self.kw_stack.addWidget(self.kw_list)
+        kw_lay.addWidget(self.kw_stack)
 
         # Превью
         prev_box = QGroupBox("Результат")
@@ -1079,106 +1602,187 @@ class PromptGenie(QMainWindow):
             self.cat_list.setCurrentRow(0)
         return w
 
+    def _category_item(self, cat):
+        name = cat.split(".", 1)[1] if "." in cat else cat
+        item = QListWidgetItem(name)
+        item.setData(Qt.ItemDataRole.UserRole, cat)
+        return item
+
+    def apply_keyword_diff(self, diff):
+        """Подхватывает изменённый KEYWORDS_FILE без перестройки конструктора.
+
+        Список категорий правится построчно, выбранные слова и прокрутка
+        текущей категории сохраняются.
+        """
+        try:
+            self.kw_data = diff.keywords
+            self.composer.set_keywords(self.kw_data)
+            KeywordTooltips.instance().set_index(self.composer.index)
+            if getattr(self, "cat_list", None) is None:
+                return
+
+            current = self.cat_list.currentItem()
+            current_key = current.data(Qt.ItemDataRole.UserRole) if current else None
+            old_keys = [self.cat_list.item(i).data(Qt.ItemDataRole.UserRole)
+                        for i in range(self.cat_list.count())]
+            new_keys = list(self.composer.categories)
+            self.cat_list.blockSignals(True)
+            # С конца, чтобы номера строк ещё не применённых правок не сдвигались
+            opcodes = difflib.SequenceMatcher(a=old_keys, b=new_keys, autojunk=False).get_opcodes()
+            for tag, i1, i2, j1, j2 in reversed(opcodes):
+                if tag == "equal":
+                    continue
+                for row in range(i2 - 1, i1 - 1, -1):
+                    self.cat_list.takeItem(row)
+                for offset, key in enumerate(new_keys[j1:j2]):
+                    self.cat_list.insertItem(i1 + offset, self._category_item(key))
+            row = new_keys.index(current_key) if current_key in new_keys else min(0, len(new_keys) - 1)
+            self.cat_list.setCurrentRow(row)
+            self.cat_list.blockSignals(False)
+
+            # ID ключевых слов у флажков устарели — перестраиваем текущую категорию
+            kw_scroll = self.kw_scroll.verticalScrollBar().value()
+            list_scroll = self.kw_list.verticalScrollBar().value()
+            self.load_cat(row)
+            self.kw_scroll.verticalScrollBar().setValue(kw_scroll)
+            self.kw_list.verticalScrollBar().setValue(list_scroll)
+            self.update_preview()
+            self.status_label.set_message(
+                f"Библиотека ключевых слов обновлена: +{len(diff.added)} "
+                f"−{len(diff.removed)} ~{len(diff.changed)} категорий", "info"
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении ключевых слов: {str(e)}", exc_info=True)
+            self.status_label.set_message("Не удалось применить изменения ключевых слов", "error")
+
     def load_cat(self, row):
         if row < 0: 
             return
             
         logger.debug(f"Loading category at row {row}")
-        cat_key = list(self.kw_data.keys())[row]
-        logger.debug(f"Category key: {cat_key}")
-        
-        # Get the list of keyword dictionaries for this category
-        keyword_items = self.kw_data[cat_key]
-        logger.debug(f"Number of items in category: {len(keyword_items) if keyword_items else 0}")
-        
-        # Clear existing items
-        for i in reversed(range(self.kw_layout.count())):
-            w = self.kw_layout.itemAt(i).widget()
-            if w: 
-                w.setParent(None)
+        index = self.composer.index
+        cat_key = index.categories[row]
+        keyword_ids = index.keywords_in(row)
+        logger.debug(f"Category {cat_key}: {len(keyword_ids)} keywords")
+        
+        # Results of a search over the previous category no longer apply
+        self.kw_search.cancel()
+
+        # Return the current checkboxes to the pool instead of destroying them
+        for cb in self._keyword_checkboxes():
+            self.kw_layout.removeWidget(cb)
+            self.kw_pool.release(cb)
+        self.kw_layout.removeWidget(self.kw_empty_label)
+        self.kw_empty_label.hide()
+        self.kw_list.blockSignals(True)
+        self.kw_list.clear()
+        self.kw_list.blockSignals(False)
         
         # If there are no items, show a message
-        if not keyword_items:
-            label = QLabel("No keywords found in this category.")
-            label.setStyleSheet("color: #888888; font-style: italic;")
-            self.kw_layout.addWidget(label)
+        if not keyword_ids:
+            self.kw_stack.setCurrentIndex(0)
+            self.kw_layout.addWidget(self.kw_empty_label)
+            self.kw_empty_label.show()
             return
             
-        # Add new items
-        for item in keyword_items:
-            if not isinstance(item, dict):
-                logger.warning(f"Skipping invalid item in category {cat_key}: {item}")
-                continue
-                
-            word = item.get("word", "")
-            if not word:
-                logger.warning(f"Skipping item with missing 'word' key: {item}")
-                continue
-                
-            logger.debug(f"Adding keyword: {word}")
-            
-            cb = TooltipCheckBox(
-                word,
-                item.get("translate", ""),
-                item.get("effect", ""),
-                "negative" if "негатив" in cat_key.lower() else "positive"
-            )
-            
-            cb.stateChanged.connect(self.on_checkbox_changed)
-            
-            # Check if this word is in the selected_words dictionary
-            if word in self.selected_words.get(cat_key, []):
-                cb.setChecked(True)
-                
-            self.kw_layout.addWidget(cb)
-
+        word_type = "negative" if index.is_negative(row) else "positive"
+        selected = set(self.composer.selected(cat_key))
+        if len(keyword_ids) > KEYWORD_LIST_THRESHOLD:
+            self.kw_stack.setCurrentIndex(1)
+            self.kw_list.blockSignals(True)
+            for i in keyword_ids:
+                word, trans, effect = index.words[i], index.translations[i], index.effects[i]
+                list_item = QListWidgetItem(word)
+                list_item.setFlags(list_item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+                list_item.setCheckState(
+                    Qt.CheckState.Checked if word in selected else Qt.CheckState.Unchecked
+                )
+                list_item.setToolTip(f"{trans}\n\nEffect: {effect}" if effect else trans)
+                list_item.setData(Qt.ItemDataRole.UserRole, trans)
+                if word_type == "negative":
+                    list_item.setForeground(QColor("#ff6b6b"))
+                self.kw_list.addItem(list_item)
+            self.kw_list.blockSignals(False)
+        else:
+            self.kw_stack.setCurrentIndex(0)
+            for i in keyword_ids:
+                word = index.words[i]
+                # Текст подсказки строится лениво по ID при наведении
+                cb = self.kw_pool.acquire(word, i, word_type)
+                if word in selected:
+                    cb.blockSignals(True)
+                    cb.setChecked(True)
+                    cb.blockSignals(False)
+                self.kw_layout.addWidget(cb)
+
+        if self.search.text():
+            self.filter_kw(self.search.text())
         self.update_preview()
 
     def on_checkbox_changed(self, state):
         cb = self.sender()
         if not cb:
             return
-            
+        self.set_word_selected(cb.text(), state == Qt.CheckState.Checked.value)
+
+    def on_keyword_item_changed(self, item):
+        self.set_word_selected(item.text(), item.checkState() == Qt.CheckState.Checked)
+
+    def set_word_selected(self, word, checked):
         # Get the current category
         current_row = self.cat_list.currentRow()
         if current_row < 0:
             return
             
-        cat_key = list(self.kw_data.keys())[current_row]
-        
-        # Initialize the category in selected_words if it doesn't exist
-        if cat_key not in self.selected_words:
-            self.selected_words[cat_key] = []
-            
-        # Get the word from the checkbox text
-        word = cb.text()
-        
-        # Update the selected words list for this category
-        if state == Qt.CheckState.Checked.value:
-            if word not in self.selected_words[cat_key]:
-                self.selected_words[cat_key].append(word)
-        else:
-            if word in self.selected_words[cat_key]:
-                self.selected_words[cat_key].remove(word)
-        
-        logger.debug(f"Updated selected words for {cat_key}: {self.selected_words[cat_key]}")
-        self.update_preview()
+        keyword_id = self.composer.index.keyword_id(current_row, word)
+        if keyword_id is not None and self.composer.select_id(current_row, keyword_id, checked):
+            self.update_preview()
 
-    def filter_kw(self, text):
-        text = text.lower()
+    def _keyword_checkboxes(self):
+        """Returns the keyword checkboxes of the current category in layout order."""
+        boxes = []
         for i in range(self.kw_layout.count()):
             cb = self.kw_layout.itemAt(i).widget()
             if isinstance(cb, QCheckBox):
-                visible = text in cb.text().lower() or text in cb.trans.lower()
-                cb.setVisible(visible or not text)
+                boxes.append(cb)
+        return boxes
+
+    def _keyword_list_active(self):
+        return self.kw_stack.currentWidget() is self.kw_list
+
+    def filter_kw(self, text):
+        # Snapshot the texts on the GUI thread; matching runs in the pool
+        if self._keyword_list_active():
+            items = [
+                (self.kw_list.item(i).text(), self.kw_list.item(i).data(Qt.ItemDataRole.UserRole) or "")
+                for i in range(self.kw_list.count())
+            ]
+        else:
+            translations = self.composer.index.translations
+            items = [(cb.text(), translations[cb.keyword_id]) for cb in self._keyword_checkboxes()]
+        self.kw_search.schedule(text.lower(), items)
+
+    def _run_keyword_query(self, query, items, is_cancelled):
+        """Runs in the thread pool: marks keywords matching the query."""
+        if not query:
+            return None
+        bitmap = VisibilityBitmap(len(items))
+        for row, (word, trans) in enumerate(items):
+            if query in word.lower() or query in trans.lower():
+                bitmap.set(row)
+        return bitmap
+
+    def apply_keyword_filter(self, bitmap):
+        if self._keyword_list_active():
+            for row in range(self.kw_list.count()):
+                self.kw_list.item(row).setHidden(not (bitmap is None or bitmap[row]))
+            return
+        for row, cb in enumerate(self._keyword_checkboxes()):
+            cb.setVisible(bitmap is None or bitmap[row])
 
     def update_preview(self):
-        pos = [w for w, c in self.selected_words.items() if c and self.is_positive(w)]
-        neg = [w for w, c in self.selected_words.items() if c and not self.is_positive(w)]
-        lines = []
-        if pos: lines += ["Позитивные:", ", ".join(pos), ""]
-        if neg: lines += ["Негативные:", ", ".join(neg)]
-        self.preview.setPlainText("\n".join(lines).strip() or "Выберите ключевые слова")
+        text = self.composer.preview_text()
+        self.preview.setPlainText(text or "Выберите ключевые слова")
 
     def is_positive(self, word):
         """Проверяет, является ли ключевое слово позитивным.
@@ -1189,33 +1793,22 @@ class PromptGenie(QMainWindow):
         Returns:
             bool: True, если слово позитивное, иначе False.
         """
-        category = self.word_to_category.get(word)
-        if category is not None:
-            return "негатив" not in category.lower()
-        return True  # По умолчанию считаем слово позитивным
+        return self.composer.is_positive(word)
 
     def copy_prompt(self):
         txt = self.preview.toPlainText()
         if "Выберите" not in txt:
-            pyperclip.copy(txt)
-            self.status_label.setText("Промпт скопирован в буфер обмена")
-            self.status_label.setStyleSheet("""
-                QLabel {
-                    background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                        stop:0 #00aa55, stop:1 #008844);
-                    color: white;
-                    padding: 12px 20px;
-                    border-radius: 0 0 16px 16px;
-                    font-weight: 600;
-                }
-            """)
+            QApplication.clipboard().setText(txt)
+            self.status_label.set_message("Промпт скопирован в буфер обмена", "success")
 
     def clear_all(self):
-        self.selected_words.clear()
-        for i in range(self.kw_layout.count()):
-            cb = self.kw_layout.itemAt(i).widget()
-            if isinstance(cb, QCheckBox):
-                cb.setChecked(False)
+        self.composer.clear()
+        for cb in self._keyword_checkboxes():
+            cb.setChecked(False)
+        self.kw_list.blockSignals(True)
+        for row in range(self.kw_list.count()):
+            self.kw_list.item(row).setCheckState(Qt.CheckState.Unchecked)
+        self.kw_list.blockSignals(False)
         self.update_preview()
 
 
@@ -1263,6 +1856,7 @@ def main():
             QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
         
         app = QApplication(sys.argv)
+        StyleRegistry.instance().apply(app)
         
         # Set application information
         app.setApplicationName("PromptGenie")
@@ -0,0 +1,175 @@
+"""
+Animation manager for PromptGenie
+Runs decorative animations on demand from one shared timer
+"""
+
+import logging
+import os
+import sys
+from typing import Dict
+
+from PyQt6 import sip
+from PyQt6.QtCore import QEasingCurve, QEvent, QObject, QPropertyAnimation, Qt, QTimer
+from PyQt6.QtWidgets import QApplication, QGraphicsOpacityEffect
+
+logger = logging.getLogger(__name__)
+
+PULSE_INTERVAL_MS = 3000
+PULSE_DURATION_MS = 2000
+
+
+def low_power_session() -> bool:
+    """True when animations should be off: PROMPTGENIE_NO_ANIMATIONS or an RDP session."""
+    if os.environ.get("PROMPTGENIE_NO_ANIMATIONS"):
+        return True
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            SM_REMOTESESSION = 0x1000
+            return bool(ctypes.windll.user32.GetSystemMetrics(SM_REMOTESESSION))
+        except Exception:
+            return False
+    return False
+
+
+class _Pulse:
+    """Opacity effect and animation of one widget, created on first use and reused."""
+    __slots__ = ("effect", "animation")
+
+    def __init__(self, widget, end_opacity: float):
+        self.effect = QGraphicsOpacityEffect(widget)
+        self.effect.setEnabled(False)
+        widget.setGraphicsEffect(self.effect)
+        self.animation = QPropertyAnimation(self.effect, b"opacity", widget)
+        self.animation.setDuration(PULSE_DURATION_MS)
+        self.animation.setStartValue(1.0)
+        self.animation.setKeyValueAt(0.5, end_opacity)
+        self.animation.setEndValue(1.0)
+        self.animation.setEasingCurve(QEasingCurve.Type.InOutQuad)
+        # Эффект выключен в простое, чтобы не рисовать виджет через буфер
+        self.animation.finished.connect(lambda: self.effect.setEnabled(False))
+
+    def start(self):
+        if self.animation.state() != QPropertyAnimation.State.Running:
+            self.effect.setEnabled(True)
+            self.animation.start()
+
+    def stop(self):
+        self.animation.stop()
+        self.effect.setOpacity(1.0)
+        self.effect.setEnabled(False)
+
+
+class AnimationManager(QObject):
+    """Drives pulse animations of registered widgets from one shared timer.
+
+    The timer runs only while animations are enabled, the application is
+    active and at least one registered widget is visible; a tick starts the
+    pulse of each visible widget whose window has focus. Animation objects
+    are created once per widget and restarted on later ticks.
+    """
+    _instance = None
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.enabled = True
+        self.wakeups = 0
+        self.started = 0
+        self._widgets: Dict[int, object] = {}
+        self._end_opacity: Dict[int, float] = {}
+        self._pulses: Dict[int, _Pulse] = {}
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(PULSE_INTERVAL_MS)
+        self._timer.timeout.connect(self._tick)
+
+        app = QApplication.instance()
+        if app is not None:
+            app.applicationStateChanged.connect(lambda _state: self._update_timer())
+
+    @classmethod
+    def instance(cls) -> "AnimationManager":
+        if cls._instance is None:
+            cls._instance = AnimationManager()
+        return cls._instance
+
+    def register_pulse(self, widget, end_opacity: float = 0.7) -> None:
+        """Pulse ``widget`` periodically while it is visible and focused."""
+        key = id(widget)
+        self._widgets[key] = widget
+        self._end_opacity[key] = end_opacity
+        widget.installEventFilter(self)
+        widget.destroyed.connect(lambda _obj=None, key=key: self._forget(key))
+        self._update_timer()
+
+    def unregister(self, widget) -> None:
+        key = id(widget)
+        if key in self._widgets:
+            widget.removeEventFilter(self)
+            pulse = self._pulses.get(key)
+            if pulse is not None:
+                pulse.stop()
+            self._forget(key)
+
+    def set_enabled(self, enabled: bool) -> None:
+        """Globally switch animations on or off (low-power / remote sessions)."""
+        self.enabled = bool(enabled)
+        if not self.enabled:
+            for pulse in self._pulses.values():
+                pulse.stop()
+        logger.info(f"Animations {'enabled' if self.enabled else 'disabled'}")
+        self._update_timer()
+
+    @property
+    def active_animations(self) -> int:
+        return sum(1 for pulse in self._pulses.values()
+                   if pulse.animation.state() == QPropertyAnimation.State.Running)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "registered": len(self._widgets),
+            "active_animations": self.active_animations,
+            "timer_running": int(self._timer.isActive()),
+            "wakeups": self.wakeups,
+            "started": self.started,
+        }
+
+    def eventFilter(self, obj, event):
+        if event.type() in (QEvent.Type.Show, QEvent.Type.Hide):
+            self._update_timer()
+        return False
+
+    def _forget(self, key: int) -> None:
+        self._widgets.pop(key, None)
+        self._end_opacity.pop(key, None)
+        self._pulses.pop(key, None)
+        # При выходе Python удаляет объекты в произвольном порядке: таймер может уйти раньше виджетов
+        if not sip.isdeleted(self._timer):
+            self._update_timer()
+
+    def _should_run(self) -> bool:
+        if not self.enabled or not self._widgets:
+            return False
+        app = QApplication.instance()
+        if app is None or app.applicationState() != Qt.ApplicationState.ApplicationActive:
+            return False
+        return any(widget.isVisible() for widget in self._widgets.values())
+
+    def _update_timer(self) -> None:
+        if self._should_run():
+            if not self._timer.isActive():
+                self._timer.start()
+        elif self._timer.isActive():
+            self._timer.stop()
+
+    def _tick(self) -> None:
+        self.wakeups += 1
+        for key, widget in self._widgets.items():
+            if not (widget.isVisible() and widget.isActiveWindow()):
+                continue
+            pulse = self._pulses.get(key)
+            if pulse is None:
+                pulse = self._pulses[key] = _Pulse(widget, self._end_opacity[key])
+            if pulse.animation.state() != QPropertyAnimation.State.Running:
+                pulse.start()
+                self.started += 1
@@ -0,0 +1,79 @@
+"""
+Prompt composer microbenchmarks for PromptGenie
+Compositions per second of engine.PromptComposer on the bundled library
+
+    python benchmarks/bench_composer.py [--count 20000]
+
+Runs without Qt. Each case works through ``count`` prepared inputs
+(bundled templates, random keyword selections) and prints operations per
+second.
+"""
+
+import argparse
+import random
+import time
+
+from common import bundled_keywords, bundled_themes
+
+from engine import PromptComposer, canonicalize, parse_prompt  # noqa: E402
+
+
+def random_selections(keywords, count: int, seed: int = 0):
+    rng = random.Random(seed)
+    categories = [name for name, items in keywords.items() if items]
+    result = []
+    for _ in range(count):
+        selection = {}
+        for category in rng.sample(categories, min(4, len(categories))):
+            words = [item["word"] for item in keywords[category] if item.get("word")]
+            selection[category] = rng.sample(words, min(2, len(words)))
+        result.append(selection)
+    return result
+
+
+def rate(func, items) -> float:
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    return len(items) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument("--count", type=int, default=20000, help="inputs per case")
+    args = parser.parse_args()
+
+    keywords = bundled_keywords()
+    templates = [theme.get("prompt_combined_en", "") for theme in bundled_themes()]
+    composer = PromptComposer(keywords)
+    selections = random_selections(keywords, args.count)
+    pairs = [(templates[i % len(templates)], selections[i]) for i in range(args.count)]
+
+    def compose_text(pair):
+        composed = composer.compose(*pair)
+        return composed.positive_text, composed.negative_text
+
+    # Переключение слова в конструкторе и обновление предпросмотра
+    ids = [(cat_id, keyword_id) for cat_id in range(len(composer.categories))
+           for keyword_id in composer.index.keywords_in(cat_id)]
+    toggles = [ids[i % len(ids)] for i in range(args.count)]
+
+    def toggle(ids_pair):
+        # Выбранное слово снимается, невыбранное — выбирается
+        composer.select_id(*ids_pair) or composer.select_id(*ids_pair, selected=False)
+        return composer.preview_text()
+
+    cases = [
+        ("parse template", lambda pair: parse_prompt(pair[0]), pairs),
+        ("canonicalize template", lambda pair: canonicalize(pair[0]), pairs),
+        ("compose", lambda pair: composer.compose(*pair), pairs),
+        ("compose + render text", compose_text, pairs),
+        ("builder toggle + preview", toggle, toggles),
+    ]
+    print(f"{'case':<26} {'ops/s':>12}")
+    for name, func, items in cases:
+        print(f"{name:<26} {rate(func, items):>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Library load benchmark for PromptGenie
+ThemeStore.load against a plain json.load of the whole library file
+
+    python benchmarks/bench_theme_load.py [--sizes 1000 10000 50000] [--journal 199]
+
+"json.load" is the old startup: one indented theme_prompts.json read in
+full. "store" is ThemeStore.load with the snapshot cache plus a journal
+of ``--journal`` pending edits (one short of the default compaction
+threshold, the worst case) and the ID index. "store, no cache" is the
+first start after the snapshot was edited by hand.
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from common import synthetic_themes
+
+from theme_storage import ThemeStore
+
+
+def best_ms(func, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000.0
+
+
+def measure(count: int, journal: int, repeat: int, workdir: Path):
+    themes = synthetic_themes(count)
+    plain = workdir / f"plain-{count}.json"
+    with open(plain, 'w', encoding='utf-8') as f:
+        json.dump({"themes": themes}, f, ensure_ascii=False, indent=2)
+
+    def json_load():
+        with open(plain, 'r', encoding='utf-8') as f:
+            json.load(f)
+
+    path = workdir / f"themes-{count}.json"
+    path.write_bytes(plain.read_bytes())
+    store = ThemeStore(path)
+    loaded = store.load()
+    store.compact(loaded, wait=True)
+    for row in range(min(journal, len(loaded))):
+        store.update(row, dict(loaded[row], title_ru=f"Правка {row}"))
+
+    def load_without_cache():
+        store.cache_path.unlink()
+        ThemeStore(path).load()
+
+    return (best_ms(json_load, repeat), best_ms(lambda: ThemeStore(path).load(), repeat),
+            best_ms(load_without_cache, repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--journal", type=int, default=199, help="pending journal entries")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case, best is reported")
+    args = parser.parse_args()
+
+    print(f"{'themes':>8} {'json.load ms':>13} {'store ms':>9} {'store, no cache ms':>19}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for count in args.sizes:
+            plain_ms, store_ms, cold_ms = measure(count, args.journal, args.repeat, Path(workdir))
+            print(f"{count:>8} {plain_ms:>13.1f} {store_ms:>9.1f} {cold_ms:>19.1f}")
+
+
+if __name__ == "__main__":
+    main()
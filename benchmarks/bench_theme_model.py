@@ -0,0 +1,65 @@
+"""
+Template list benchmark for PromptGenie
+Cost of one add, edit and delete through ThemeListModel as the library grows
+
+    python benchmarks/bench_theme_model.py [--sizes 100 1000 10000 100000]
+
+The proxy (with a category filter) and a QListView are attached, as in the
+main window, so view-side work is included. Per-operation times should stay
+flat from 100 to 100k themes; only the initial load grows with the list.
+"""
+
+import argparse
+import os
+import time
+
+from common import per_call, synthetic_themes
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtWidgets import QApplication, QListView  # noqa: E402
+
+from theme_model import ThemeFilterProxyModel, ThemeListModel  # noqa: E402
+
+
+def measure(count: int, repeat: int):
+    themes = synthetic_themes(count)
+    model = ThemeListModel()
+    proxy = ThemeFilterProxyModel()
+    proxy.setSourceModel(model)
+    view = QListView()
+    view.setUniformItemSizes(True)
+    view.setLayoutMode(QListView.LayoutMode.Batched)
+    view.setModel(proxy)
+
+    start = time.perf_counter()
+    model.set_themes(themes)
+    load_ms = (time.perf_counter() - start) * 1000.0
+    proxy.set_category(themes[0].get("category"))
+
+    extra = synthetic_themes(repeat, seed=1)
+    added = iter(extra)
+    add_ms = per_call(lambda: model.append_theme(dict(next(added))), repeat)
+    middle = count // 2
+    edit_ms = per_call(lambda: model.update_theme(middle, {"title_ru": "Изменённый шаблон"}), repeat)
+    delete_ms = per_call(lambda: model.remove_theme(middle), repeat)
+    view.deleteLater()
+    return load_ms, add_ms, edit_ms, delete_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=50, help="operations of each kind per size")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication([])
+    print(f"{'themes':>8} {'load ms':>9} {'add ms':>8} {'edit ms':>8} {'delete ms':>10}")
+    for count in args.sizes:
+        load_ms, add_ms, edit_ms, delete_ms = measure(count, args.repeat)
+        app.processEvents()
+        print(f"{count:>8} {load_ms:>9.1f} {add_ms:>8.3f} {edit_ms:>8.3f} {delete_ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Keyword tooltip benchmark for PromptGenie
+Replays mouse hovers across 200 keyword checkboxes of the Builder tab
+
+    python benchmarks/bench_tooltips.py [--keywords 200] [--sweeps 20]
+
+Each sweep sends an enter event to every checkbox. The first sweep
+renders the tooltips; later ones hit the KeywordTooltips cache. The
+"per-hover render" row repeats the sweeps the way hovers used to work:
+HTML rebuilt, tooltip font set and a new hide timer started on every
+hover. Most of a hover is QToolTip itself; the last lines isolate the
+HTML work.
+"""
+
+import argparse
+import os
+import time
+
+from common import bundled_keywords
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtCore import QPointF, QTimer  # noqa: E402
+from PyQt6.QtGui import QEnterEvent, QFont  # noqa: E402
+from PyQt6.QtWidgets import QApplication, QToolTip, QWidget, QVBoxLayout  # noqa: E402
+
+from engine import KeywordIndex  # noqa: E402
+from ui_components import (TOOLTIP_HIDE_MS, KeywordTooltips, TooltipCheckBox,  # noqa: E402
+                           render_keyword_tooltip)
+
+
+def sweep_ms(app, boxes, hover) -> float:
+    """Hover every box once; returns milliseconds per hover."""
+    start = time.perf_counter()
+    for box in boxes:
+        hover(box)
+    app.processEvents()
+    return (time.perf_counter() - start) * 1000.0 / len(boxes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument("--keywords", type=int, default=200, help="checkboxes to hover")
+    parser.add_argument("--sweeps", type=int, default=20, help="passes over all checkboxes")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication([])
+    index = KeywordIndex(bundled_keywords())
+    tooltips = KeywordTooltips.instance()
+    tooltips.set_index(index)
+
+    panel = QWidget()
+    layout = QVBoxLayout(panel)
+    # В библиотеке может быть меньше слов — тогда они повторяются
+    boxes = [TooltipCheckBox(index.words[i % len(index)], i % len(index)) for i in range(args.keywords)]
+    for box in boxes:
+        layout.addWidget(box)
+    panel.show()
+    app.processEvents()
+
+    def enter(box):
+        point = QPointF(box.rect().center())
+        app.sendEvent(box, QEnterEvent(point, point, QPointF(box.mapToGlobal(point))))
+
+    timers = []
+
+    def legacy(box):
+        # Прежний enterEvent: HTML, шрифт и новый таймер на каждое наведение
+        tip = render_keyword_tooltip(index.words[box.keyword_id], index.translations[box.keyword_id],
+                                     index.effects[box.keyword_id])
+        QToolTip.setFont(QFont('Segoe UI', 11))
+        QToolTip.showText(box.mapToGlobal(box.rect().center()), tip, box)
+        timer = QTimer()
+        timer.setSingleShot(True)
+        timer.timeout.connect(QToolTip.hideText)
+        timer.start(TOOLTIP_HIDE_MS)
+        timers.append(timer)
+
+    cold = sweep_ms(app, boxes, enter)
+    warm = sum(sweep_ms(app, boxes, enter) for _ in range(args.sweeps - 1)) / max(1, args.sweeps - 1)
+    shared = int(tooltips._hide_timer.isActive())
+    old = sum(sweep_ms(app, boxes, legacy) for _ in range(args.sweeps)) / args.sweeps
+
+    print(f"{len(boxes)} checkboxes, {args.sweeps} sweeps")
+    print(f"{'case':<22} {'ms/hover':>9} {'pending timers':>15}")
+    print(f"{'first sweep (render)':<22} {cold:>9.3f} {shared:>15}")
+    print(f"{'cached':<22} {warm:>9.3f} {shared:>15}")
+    print(f"{'per-hover render':<22} {old:>9.3f} {sum(t.isActive() for t in timers):>15}")
+    ids = [box.keyword_id for box in boxes] * args.sweeps
+    start = time.perf_counter()
+    for i in ids:
+        render_keyword_tooltip(index.words[i], index.translations[i], index.effects[i])
+    render_us = (time.perf_counter() - start) * 1e6 / len(ids)
+    start = time.perf_counter()
+    for i in ids:
+        tooltips.html(i)
+    lookup_us = (time.perf_counter() - start) * 1e6 / len(ids)
+    print(f"HTML only: render {render_us:.2f} us, cache lookup {lookup_us:.2f} us")
+    print(f"cache: {tooltips.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Shared helpers for the PromptGenie benchmarks
+Synthetic libraries built from the bundled data and a simple timer
+"""
+
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+# Модули PromptGenie лежат в корне репозитория
+sys.path.insert(0, str(ROOT))
+
+
+def bundled_themes() -> List[Dict[str, Any]]:
+    with open(ROOT / "theme_prompts.json", 'r', encoding='utf-8') as f:
+        return json.load(f).get("themes", [])
+
+
+def bundled_keywords() -> Dict[str, List[dict]]:
+    with open(ROOT / "keyword_library.json", 'r', encoding='utf-8') as f:
+        return json.load(f).get("keywords", {})
+
+
+def synthetic_themes(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """``count`` themes cycling through the bundled ones with shuffled titles."""
+    rng = random.Random(seed)
+    base = bundled_themes()
+    words = sorted({word for theme in base for word in theme.get("title_ru", "").split()})
+    themes = []
+    for i in range(count):
+        theme = dict(base[i % len(base)])
+        theme["id"] = f"bench-{i}"
+        theme["title_ru"] = " ".join(rng.sample(words, 3)) + f" #{i}"
+        themes.append(theme)
+    return themes
+
+
+def per_call(func: Callable[[], Any], repeat: int) -> float:
+    """Average wall time of one ``func()`` call in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000.0 / repeat
@@ -0,0 +1,430 @@
+"""
+Command-line interface for PromptGenie
+Bulk prompt generation and library exchange without the GUI: python cli.py batch spec.json
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import takewhile
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from engine import PromptComposer, PromptSpace
+from image_store import ImageStore
+from library_io import CONFLICT_POLICIES, FORMATS, LibraryImporter, export_themes
+from shared_store import SharedThemeStore, ThemeConflict, apply_op, theme_etag
+from theme_index import ID_FIELD, new_theme_id
+from theme_storage import ThemeStore
+
+logger = logging.getLogger(__name__)
+
+THEMES_FILE = Path(__file__).parent / "theme_prompts.json"
+KEYWORDS_FILE = Path(__file__).parent / "keyword_library.json"
+IMAGES_DIR = Path(__file__).parent / "data" / "template_images"
+
+# Сколько промптов генерирует один рабочий процесс за задачу
+CHUNK_SIZE = 2000
+
+# Work unit: (template index, first variant, end variant)
+Unit = Tuple[int, int, int]
+
+_state: Dict[str, Any] = {}
+
+
+def load_library(themes_file: Path, keywords_file: Path) -> Tuple[List[dict], Dict[str, List[dict]]]:
+    # Снимок плюс ещё не свёрнутый журнал, без записи (GUI может держать библиотеку открытой)
+    themes, fragments = ThemeStore(themes_file).read_current()
+    # Промпты в библиотеке хранят {{фрагменты}}; воркерам нужен полный текст
+    themes = [fragments.expand_theme(t) for t in themes]
+    with open(keywords_file, 'r', encoding='utf-8') as f:
+        keywords = json.load(f).get('keywords', {})
+    return themes, keywords
+
+
+def select_templates(themes: List[dict], spec: Dict[str, Any]) -> List[int]:
+    """Indices of templates matching the spec's "templates" filter."""
+    flt = spec.get("templates") or {}
+    categories = set(flt.get("categories") or [])
+    titles = set(flt.get("titles") or [])
+    return [
+        i for i, theme in enumerate(themes)
+        if (not categories or theme.get("category") in categories)
+        and (not titles or theme.get("title_ru") in titles)
+    ]
+
+
+def resolve_categories(keywords: Dict[str, List[dict]], spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Map spec category names (or numbers like "1.5") to library keys, keeping pick rules."""
+    result = {}
+    for name, picks in (spec.get("keywords") or {}).items():
+        number = name.rstrip(".")
+        matches = [key for key in keywords
+                   if key == name or key.split(" ", 1)[0].rstrip(".") == number]
+        if not matches:
+            raise ValueError(f"Unknown keyword category: {name}")
+        result[matches[0]] = picks
+    return result
+
+
+def parse_cursor(cursor: Optional[str]) -> Tuple[int, int]:
+    """"<template position>:<variant>" of the last written prompt -> next position to run."""
+    if not cursor:
+        return 0, 0
+    position, variant = cursor.split(":", 1)
+    return int(position), int(variant) + 1
+
+
+class BatchPlan:
+    """Variant space of one spec: templates × a PromptSpace of keyword selections.
+
+    With ``samples`` set, each template gets that many random variants
+    (uniform, or ``"sampling": "weighted"``); sample ``n`` is seeded by the
+    spec seed, the template and ``n``, so output does not depend on how
+    work is split between processes. Without it every allowed combination
+    is enumerated in index order. Each output line carries a ``cursor``
+    that ``--resume`` accepts.
+    """
+
+    def __init__(self, themes: List[dict], keywords: Dict[str, List[dict]], spec: Dict[str, Any]):
+        self.themes = themes
+        self.template_ids = select_templates(themes, spec)
+        self.samples = spec.get("samples")
+        self.seed = spec.get("seed", 0)
+        self.weighted = spec.get("sampling", "uniform") == "weighted"
+        self.space = PromptSpace.from_spec(keywords, resolve_categories(keywords, spec),
+                                           spec.get("exclude") or ())
+        self.composer = PromptComposer(keywords)
+
+    def variants_per_template(self) -> int:
+        if self.samples is not None:
+            return int(self.samples)
+        return self.space.size()
+
+    def units(self, chunk_size: int = CHUNK_SIZE, start: Tuple[int, int] = (0, 0)) -> Iterator[Unit]:
+        per_template = self.variants_per_template()
+        first_position, first_variant = start
+        for position in range(first_position, len(self.template_ids)):
+            begin = first_variant if position == first_position else 0
+            for unit_start in range(begin, per_template, chunk_size):
+                yield position, unit_start, min(unit_start + chunk_size, per_template)
+
+    def _selections(self, position: int, start: int, stop: int) -> Iterator[Tuple[int, Dict[str, List[str]]]]:
+        if self.samples is not None:
+            seed = f"{self.seed}:{self.template_ids[position]}"
+            samples = ((n, self.space.sample_at(n, seed, self.weighted)) for n in range(start, stop))
+            return ((n, selection) for n, selection in samples if selection is not None)
+        return takewhile(lambda item: item[0] < stop, self.space.enumerate(start))
+
+    def render(self, unit: Unit) -> List[str]:
+        """JSONL lines of one work unit."""
+        position, start, stop = unit
+        theme = self.themes[self.template_ids[position]]
+        lines = []
+        for n, selection in self._selections(position, start, stop):
+            composed = self.composer.compose(theme.get("prompt_combined_en", ""), selection)
+            lines.append(json.dumps({
+                "template": theme.get("title_ru", ""),
+                "category": theme.get("category", ""),
+                "cursor": f"{position}:{n}",
+                "keywords": selection,
+                "positive": composed.positive_text,
+                "negative": composed.negative_text,
+            }, ensure_ascii=False))
+        return lines
+
+
+def _init_worker(themes: List[dict], keywords: Dict[str, List[dict]], spec: Dict[str, Any]):
+    _state["plan"] = BatchPlan(themes, keywords, spec)
+
+
+def _render_unit(unit: Unit) -> List[str]:
+    return _state["plan"].render(unit)
+
+
+def run_batch(spec: Dict[str, Any], out, themes_file: Path = THEMES_FILE,
+              keywords_file: Path = KEYWORDS_FILE, workers: Optional[int] = None,
+              limit: Optional[int] = None, resume: Optional[str] = None) -> int:
+    """Stream the spec's prompts as JSONL into ``out``; returns the number written.
+
+    ``resume`` is the ``cursor`` of the last prompt of an earlier run.
+
+    At most ``workers * 2`` units are in flight, so memory use does not grow
+    with the size of the run. Output order is deterministic.
+    """
+    themes, keywords = load_library(themes_file, keywords_file)
+    plan = BatchPlan(themes, keywords, spec)
+    units = plan.units(start=parse_cursor(resume))
+    written = 0
+
+    if workers == 1:
+        for unit in units:
+            for line in plan.render(unit):
+                if limit is not None and written >= limit:
+                    return written
+                out.write(line + "\n")
+                written += 1
+        return written
+
+    workers = workers or os.cpu_count() or 1
+    # Воркеры получают уже прочитанную библиотеку: журнал может пополниться во время прогона
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(themes, keywords, spec)) as pool:
+        pending = deque()
+        for unit in units:
+            pending.append(pool.submit(_render_unit, unit))
+            if len(pending) >= workers * 2:
+                written = _drain(pending.popleft(), out, written, limit)
+                if limit is not None and written >= limit:
+                    for future in pending:
+                        future.cancel()
+                    return written
+        while pending:
+            written = _drain(pending.popleft(), out, written, limit)
+    return written
+
+
+def _drain(future, out, written: int, limit: Optional[int]) -> int:
+    for line in future.result():
+        if limit is not None and written >= limit:
+            break
+        out.write(line + "\n")
+        written += 1
+    return written
+
+
+def cmd_batch(args) -> int:
+    with open(args.spec, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    if args.seed is not None:
+        spec["seed"] = args.seed
+    if args.samples is not None:
+        spec["samples"] = args.samples
+
+    if args.output and args.output != "-":
+        # При продолжении дописываем к уже сгенерированному файлу
+        out = open(args.output, 'a' if args.resume else 'w', encoding='utf-8')
+    else:
+        out = sys.stdout
+    try:
+        written = run_batch(spec, out, Path(args.themes), Path(args.keywords),
+                            workers=args.workers, limit=args.limit, resume=args.resume)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    logger.info(f"Generated {written} prompts")
+    return 0
+
+
+def _progress_logger(label: str):
+    """Progress callback that logs every 10%."""
+    last = [-1]
+
+    def report(done: int, total: int):
+        percent = done * 100 // total if total else 100
+        if percent // 10 != last[0]:
+            last[0] = percent // 10
+            logger.info(f"{label}: {percent}%")
+    return report
+
+
+def cmd_import(args) -> int:
+    store = ThemeStore(Path(args.themes))
+    themes = store.load()
+    image_store = ImageStore(Path(args.images))
+    image_store.rebuild(themes)
+    importer = LibraryImporter(themes, image_store, store.fragments, args.on_conflict)
+    for op, row, theme in importer.run(Path(args.pack), _progress_logger("Import")):
+        if op == "add":
+            theme[ID_FIELD] = new_theme_id()
+            themes.append(theme)
+            image_store.acquire(theme.get("image_path"))
+        else:
+            image_store.replace(themes[row].get("image_path"), theme.get("image_path"))
+            # Как в окне: заменяется содержимое, ID шаблона сохраняется
+            themes[row].update(theme)
+    report = importer.report
+    if report.added or report.replaced:
+        store.compact(themes, wait=True)
+    logger.info(f"Imported {args.pack}: {report}")
+    return 0
+
+
+def cmd_export(args) -> int:
+    # Только чтение: load() мигрировал бы и переписывал библиотеку
+    themes, fragments = ThemeStore(Path(args.themes)).read_current()
+    if args.category:
+        categories = set(args.category)
+        unknown = categories - {t.get("category") for t in themes}
+        if unknown:
+            raise ValueError(f"Unknown category: {', '.join(sorted(unknown))}")
+        themes = [t for t in themes if t.get("category") in categories]
+    export_themes(themes, Path(args.output), args.format, Path(args.images),
+                  fragments, _progress_logger("Export"))
+    return 0
+
+
+def _sync(store: SharedThemeStore, themes: List[dict]) -> List[dict]:
+    for op, row, theme in store.poll(themes):
+        if op == "reload":
+            return store.load()
+        apply_op(themes, op, row, theme, store.index)
+    return themes
+
+
+def _stress_writer(path: str, worker: int, ops: int, seed: int, barrier, results) -> None:
+    """One writer process of ``shared-stress``: random edits like the GUI makes them."""
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s: %(message)s', stream=sys.stderr)
+    rng = random.Random(seed * 1000 + worker)
+    store = SharedThemeStore(Path(path), compact_threshold=50, lock_timeout=60)
+    themes = store.load()
+    counts: Counter = Counter()
+    for n in range(ops):
+        themes = _sync(store, themes)
+        choice = rng.random()
+        try:
+            if choice < 0.2 or not themes:
+                theme = {"id": new_theme_id(), "category": f"w{worker}", "title_ru": f"w{worker}-{n}",
+                         "description_ru": "", "prompt_combined_en": f"prompt {worker} {n}",
+                         "image_path": ""}
+                apply_op(themes, "add", -1, theme, store.index)
+                store.append(theme)
+                counts["add"] += 1
+            elif choice < 0.3:
+                # Как в окне: строка сначала удаляется из списка, затем записывается
+                row = rng.randrange(len(themes))
+                theme = themes[row]
+                apply_op(themes, "delete", row, None, store.index)
+                store.remove(row, theme)
+                counts["delete"] += 1
+            else:
+                row = rng.randrange(len(themes))
+                themes[row]["description_ru"] = f"edited by {worker} #{n}"
+                store.update(row, themes[row])
+                counts["update"] += 1
+        except ThemeConflict as e:
+            counts["conflict"] += 1
+            themes = _sync(store, themes) if e.op != "reload" else store.load()
+            if e.op == "update":
+                # Своя версия сохраняется копией, как в окне
+                copy = dict(e.theme, id=new_theme_id(),
+                            title_ru=e.theme.get("title_ru", "") + " (конфликт)")
+                apply_op(themes, "add", -1, copy, store.index)
+                store.append(copy)
+                counts["add"] += 1
+        if store.needs_compaction():
+            store.compact(themes, wait=True)
+    barrier.wait()
+    themes = _sync(store, themes)
+    results.put((worker, dict(counts), sorted(theme_etag(t) for t in themes)))
+
+
+def cmd_shared_stress(args) -> int:
+    """Runs N writer processes against one shared library and checks they converge."""
+    directory = Path(args.dir) if args.dir else Path(tempfile.mkdtemp(prefix="promptgenie-shared-"))
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / "theme_prompts.json"
+    for stale in directory.glob("theme_prompts.*"):
+        stale.unlink()
+    initial = [{"category": "base", "title_ru": f"base-{i}", "description_ru": "",
+                "prompt_combined_en": f"base prompt {i}", "image_path": ""}
+               for i in range(args.initial)]
+    ThemeStore(path).compact(initial, wait=True)
+
+    barrier = multiprocessing.Barrier(args.writers)
+    results = multiprocessing.Queue()
+    started = time.perf_counter()
+    processes = [
+        multiprocessing.Process(target=_stress_writer,
+                                args=(str(path), worker, args.ops, args.seed, barrier, results))
+        for worker in range(args.writers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    totals: Counter = Counter()
+    for _, counts, _ in reports:
+        totals.update(counts)
+    final = SharedThemeStore(path).load()
+    expected = args.initial + totals["add"] - totals["delete"]
+    etags = sorted(theme_etag(t) for t in final)
+    converged = all(view == etags for _, _, view in reports)
+    logger.info(f"{args.writers} writers, {sum(totals[k] for k in ('add', 'update', 'delete'))} "
+                f"commits in {elapsed:.2f} s; {dict(totals)}")
+    logger.info(f"Final library: {len(final)} themes (expected {expected}); "
+                f"all writers converged: {converged}")
+    ok = len(final) == expected and converged
+    if not ok:
+        logger.error(f"Shared library check failed, files kept in {directory}")
+    return 0 if ok else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="promptgenie", description="PromptGenie command-line tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    batch = sub.add_parser("batch", help="generate prompt variants as JSONL")
+    batch.add_argument("spec", help="JSON spec: templates filter, keyword categories, sampling")
+    batch.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    batch.add_argument("--themes", default=str(THEMES_FILE), help="theme_prompts.json")
+    batch.add_argument("--keywords", default=str(KEYWORDS_FILE), help="keyword_library.json")
+    batch.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    batch.add_argument("--samples", type=int, default=None, help="random variants per template")
+    batch.add_argument("--seed", type=int, default=None, help="sampling seed")
+    batch.add_argument("--limit", type=int, default=None, help="stop after this many prompts")
+    batch.add_argument("--resume", default=None, metavar="CURSOR",
+                       help="continue after the cursor of the last written prompt")
+    batch.set_defaults(func=cmd_batch)
+
+    imp = sub.add_parser("import", help="merge a theme pack (json, jsonl, csv, zip) into the library")
+    imp.add_argument("pack", help="pack file; the format is taken from the extension")
+    imp.add_argument("--themes", default=str(THEMES_FILE), help="theme_prompts.json")
+    imp.add_argument("--images", default=str(IMAGES_DIR), help="template image directory")
+    imp.add_argument("--on-conflict", choices=CONFLICT_POLICIES, default="rename",
+                     help="what to do with a different theme of the same title_ru")
+    imp.set_defaults(func=cmd_import)
+
+    exp = sub.add_parser("export", help="write the library as json, jsonl, csv or a zip bundle")
+    exp.add_argument("output", help="output file; the format is taken from the extension")
+    exp.add_argument("--format", choices=FORMATS, default=None, help="override the format")
+    exp.add_argument("--themes", default=str(THEMES_FILE), help="theme_prompts.json")
+    exp.add_argument("--images", default=str(IMAGES_DIR), help="template image directory")
+    exp.add_argument("--category", action="append", help="only this category (repeatable)")
+    exp.set_defaults(func=cmd_export)
+
+    stress = sub.add_parser("shared-stress",
+                            help="run concurrent writer processes against a shared library")
+    stress.add_argument("-n", "--writers", type=int, default=4, help="writer processes")
+    stress.add_argument("--ops", type=int, default=200, help="edits per writer")
+    stress.add_argument("--initial", type=int, default=100, help="themes in the starting library")
+    stress.add_argument("--seed", type=int, default=0, help="random seed")
+    stress.add_argument("--dir", default=None, help="working directory (default: a new temp dir)")
+    stress.set_defaults(func=cmd_shared_stress)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s', stream=sys.stderr)
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except ValueError as e:
+        # Ошибка во входных данных (спецификация, категория, формат), а не сбой
+        logger.error(str(e))
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+"""
+Prompt engine for PromptGenie
+Pure-Python prompt logic usable without a QApplication
+"""
+
+from .keyword_index import NEGATIVE_MARKER, KeywordIndex, is_negative_category
+from .tokens import PROMPT_SEPARATOR, ParsedPrompt, Token, canonicalize, parse_prompt
+from .composer import ComposedPrompt, PromptComposer, join_prompt, split_prompt
+from .enumerator import CategoryRule, PromptSpace, unrank_combination
+from .fragments import FragmentTable, extract_fragments, migrate_themes
+
+__all__ = [
+    "PROMPT_SEPARATOR",
+    "NEGATIVE_MARKER",
+    "ComposedPrompt",
+    "PromptComposer",
+    "is_negative_category",
+    "join_prompt",
+    "split_prompt",
+    "CategoryRule",
+    "PromptSpace",
+    "unrank_combination",
+    "KeywordIndex",
+    "ParsedPrompt",
+    "Token",
+    "canonicalize",
+    "parse_prompt",
+    "FragmentTable",
+    "extract_fragments",
+    "migrate_themes",
+]
@@ -0,0 +1,184 @@
+"""
+Prompt composer for PromptGenie
+Keyword selection bookkeeping and prompt assembly without Qt
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .keyword_index import KeywordIndex, is_negative_category
+from .tokens import PROMPT_SEPARATOR, parse_prompt
+
+logger = logging.getLogger(__name__)
+
+
+def split_prompt(text: str) -> Tuple[str, str]:
+    """Split ``positive ||| negative`` into its two stripped halves."""
+    positive, sep, negative = (text or "").partition(PROMPT_SEPARATOR)
+    return positive.strip(), negative.strip() if sep else ""
+
+
+def join_prompt(positive: str, negative: str = "") -> str:
+    """Inverse of :func:`split_prompt`; omits the separator without a negative part."""
+    positive, negative = positive.strip(), negative.strip()
+    if not negative:
+        return positive
+    return f"{positive} {PROMPT_SEPARATOR} {negative}"
+
+
+def _join_parts(parts: Iterable[str]) -> str:
+    return ", ".join(part for part in parts if part)
+
+
+def _preview_text(positive: List[str], negative: List[str]) -> str:
+    """Builder preview of positive and negative parts; empty when both are."""
+    lines = []
+    if positive:
+        lines += ["Позитивные:", ", ".join(positive), ""]
+    if negative:
+        lines += ["Негативные:", ", ".join(negative)]
+    return "\n".join(lines).strip()
+
+
+class ComposedPrompt:
+    """Result of :meth:`PromptComposer.compose`."""
+    __slots__ = ("positive", "negative")
+
+    def __init__(self, positive: List[str], negative: List[str]):
+        self.positive = positive
+        self.negative = negative
+
+    @property
+    def positive_text(self) -> str:
+        return _join_parts(self.positive)
+
+    @property
+    def negative_text(self) -> str:
+        return _join_parts(self.negative)
+
+    @property
+    def prompt(self) -> str:
+        """Combined ``positive ||| negative`` string, as stored in templates."""
+        return join_prompt(self.positive_text, self.negative_text)
+
+    def preview_text(self) -> str:
+        """Text shown in the builder preview; empty when nothing is selected."""
+        return _preview_text(self.positive, self.negative)
+
+    def __repr__(self):
+        return f"ComposedPrompt(positive={self.positive!r}, negative={self.negative!r})"
+
+
+class PromptComposer:
+    """Keeps selected keywords per category and assembles prompts from them.
+
+    ``keywords`` is the ``keywords`` mapping of keyword_library.json
+    (category -> list of ``{"word", "translate", "effect"}``), indexed by a
+    :class:`KeywordIndex`. Selections are ordered sets of keyword IDs per
+    category and keep the order in which words were picked; categories are
+    emitted in library order. Polarity comes from the category name (see
+    :data:`NEGATIVE_MARKER`).
+
+    The joined text of each category is cached, so a toggle only re-joins
+    its own category and :meth:`preview_text` concatenates the cached parts.
+    """
+
+    def __init__(self, keywords: Optional[Dict[str, List[dict]]] = None):
+        self.set_keywords(keywords or {})
+
+    def set_keywords(self, keywords: Dict[str, List[dict]]) -> None:
+        """Replace the keyword library; selections that still exist are kept."""
+        previous = self.selections() if hasattr(self, "index") else {}
+        self.index = KeywordIndex(keywords)
+        self._selected: List[Dict[int, None]] = [{} for _ in self.index.categories]
+        self._parts: List[str] = [""] * len(self.index.categories)
+        for category, words in previous.items():
+            for word in words:
+                self.select(category, word)
+
+    @property
+    def categories(self) -> List[str]:
+        return self.index.categories
+
+    def select(self, category: str, word: str, selected: bool = True) -> bool:
+        """Add or remove ``word`` in ``category``; returns True if anything changed."""
+        cat_id = self.index.category_id(category)
+        keyword_id = None if cat_id is None else self.index.keyword_id(cat_id, word)
+        if keyword_id is None:
+            logger.warning(f"Unknown keyword '{word}' in category {category}")
+            return False
+        return self.select_id(cat_id, keyword_id, selected)
+
+    def select_id(self, cat_id: int, keyword_id: int, selected: bool = True) -> bool:
+        """ID-based :meth:`select` for callers that already hold the IDs."""
+        ids = self._selected[cat_id]
+        if selected:
+            if keyword_id in ids:
+                return False
+            ids[keyword_id] = None
+        else:
+            if keyword_id not in ids:
+                return False
+            del ids[keyword_id]
+        words = self.index.words
+        self._parts[cat_id] = ", ".join(words[i] for i in ids)
+        return True
+
+    def is_selected(self, category: str, word: str) -> bool:
+        cat_id = self.index.category_id(category)
+        if cat_id is None:
+            return False
+        return self.index.keyword_id(cat_id, word) in self._selected[cat_id]
+
+    def selected(self, category: str) -> List[str]:
+        cat_id = self.index.category_id(category)
+        if cat_id is None:
+            return []
+        return [self.index.words[i] for i in self._selected[cat_id]]
+
+    def selections(self) -> Dict[str, List[str]]:
+        words = self.index.words
+        return {
+            self.index.categories[cat_id]: [words[i] for i in ids]
+            for cat_id, ids in enumerate(self._selected) if ids
+        }
+
+    def clear(self) -> None:
+        for ids in self._selected:
+            ids.clear()
+        self._parts = [""] * len(self._parts)
+
+    def category_of(self, word: str) -> Optional[str]:
+        return self.index.word_to_category.get(word)
+
+    def is_positive(self, word: str, category: Optional[str] = None) -> bool:
+        """Words of unknown category are treated as positive."""
+        if category is not None:
+            return not is_negative_category(category)
+        return self.index.is_positive_word(word)
+
+    def preview_text(self) -> str:
+        """Builder preview of the current selection; empty when nothing is selected."""
+        positive, negative = [], []
+        for cat_id, part in enumerate(self._parts):
+            if part:
+                (negative if self.index.is_negative(cat_id) else positive).append(part)
+        return _preview_text(positive, negative)
+
+    def compose(self, template: str = "",
+                selections: Optional[Dict[str, Iterable[str]]] = None) -> ComposedPrompt:
+        """Build a prompt from ``template`` (``positive ||| negative``) plus keywords.
+
+        The result is canonical: whitespace is normalized, SD weights are
+        kept and tokens repeated between the template and the keywords
+        appear once. ``selections`` overrides the composer's own state,
+        which lets batch code reuse one composer for many combinations.
+        """
+        if selections is None:
+            selections = self.selections()
+        positive, negative = [], []
+        for category, words in selections.items():
+            (negative if is_negative_category(category) else positive).extend(words)
+        merged = parse_prompt(template).merge(positive, negative)
+        return ComposedPrompt([t.render() for t in merged.positive],
+                              [t.render() for t in merged.negative])
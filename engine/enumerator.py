@@ -0,0 +1,245 @@
+"""
+Prompt-space enumerator for PromptGenie
+Lazy enumeration and seeded sampling of keyword combinations
+"""
+
+import logging
+import random
+from itertools import islice
+from math import comb
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+Selection = Dict[str, List[str]]
+
+# Сколько раз пересэмплировать вариант, нарушающий исключения
+MAX_REJECTIONS = 100
+# Столько пустых сэмплов подряд — и поток сэмплов заканчивается
+MAX_EMPTY_SAMPLES = 100
+# Категории с меньшим числом вариантов держат таблицу вариантов в памяти
+OPTION_TABLE_LIMIT = 4096
+
+
+def unrank_combination(n: int, k: int, rank: int) -> Tuple[int, ...]:
+    """The ``rank``-th k-subset of range(n) in itertools.combinations order."""
+    result = []
+    start = 0
+    for remaining in range(k, 0, -1):
+        for i in range(start, n):
+            count = comb(n - i - 1, remaining - 1)
+            if rank < count:
+                result.append(i)
+                start = i + 1
+                break
+            rank -= count
+    return tuple(result)
+
+
+class CategoryRule:
+    """Words of one category and how many of them a prompt takes."""
+    __slots__ = ("name", "words", "min_picks", "max_picks", "weights", "_sizes", "_table")
+
+    def __init__(self, name: str, words: Sequence[str], min_picks: int = 1,
+                 max_picks: Optional[int] = None, weights: Optional[Sequence[float]] = None):
+        self.name = name
+        self.words = list(words)
+        self.min_picks = max(0, min_picks)
+        self.max_picks = min(len(self.words), self.min_picks if max_picks is None else max_picks)
+        if self.min_picks > self.max_picks:
+            raise ValueError(f"Category {name}: min picks {min_picks} exceeds "
+                             f"{self.max_picks} available")
+        self.weights = list(weights) if weights is not None else [1.0] * len(self.words)
+        # Число подмножеств каждого размера, в порядке размеров
+        self._sizes = [(k, comb(len(self.words), k))
+                       for k in range(self.min_picks, self.max_picks + 1)]
+        self._table = None
+
+    def __len__(self) -> int:
+        return sum(count for _k, count in self._sizes)
+
+    def option(self, rank: int) -> List[str]:
+        """Word subset number ``rank``: by size, then in combinations order."""
+        if self._table is None and len(self) <= OPTION_TABLE_LIMIT:
+            self._table = [tuple(self._unrank(r)) for r in range(len(self))]
+        if self._table is not None:
+            return list(self._table[rank])
+        return self._unrank(rank)
+
+    def _unrank(self, rank: int) -> List[str]:
+        for k, count in self._sizes:
+            if rank < count:
+                return [self.words[i] for i in unrank_combination(len(self.words), k, rank)]
+            rank -= count
+        raise IndexError(rank)
+
+    def sample_weighted(self, rng: random.Random) -> List[str]:
+        """Random size in [min, max], words drawn by weight without replacement."""
+        k = rng.randint(self.min_picks, self.max_picks)
+        if k == 0:
+            return []
+        # Последовательный взвешенный выбор без возвращения
+        indices = list(range(len(self.words)))
+        weights = list(self.weights)
+        picked = []
+        for _ in range(k):
+            if sum(weights) <= 0:
+                break
+            j = rng.choices(range(len(indices)), weights=weights)[0]
+            picked.append(indices.pop(j))
+            weights.pop(j)
+        return [self.words[i] for i in sorted(picked)]
+
+
+class PromptSpace:
+    """Cartesian space of keyword selections over several categories.
+
+    Every point has an integer index (mixed radix over the per-category
+    subset counts), so the space is never materialised: :meth:`enumerate`
+    walks it with an odometer and :meth:`sample` draws indices at random.
+    Both yield ``(cursor, selection)``; passing the last cursor back as
+    ``start`` resumes exactly where a previous run stopped.
+
+    ``exclusions`` are groups of words of which at most one may appear in a
+    selection; combinations violating them are skipped (enumeration) or
+    re-drawn (sampling).
+    """
+
+    def __init__(self, rules: Iterable[CategoryRule],
+                 exclusions: Iterable[Iterable[str]] = ()):
+        self.rules = list(rules)
+        self._conflicts: Dict[str, set] = {}
+        for group in exclusions:
+            group = list(group)
+            for word in group:
+                self._conflicts.setdefault(word, set()).update(w for w in group if w != word)
+        self._radix = [len(rule) for rule in self.rules]
+        self._size = 1
+        for radix in self._radix:
+            self._size *= radix
+
+    @classmethod
+    def from_spec(cls, keywords: Dict[str, List[dict]], categories: Dict[str, Any],
+                  exclusions: Iterable[Iterable[str]] = ()) -> "PromptSpace":
+        """Build from keyword_library data and a ``{category: picks}`` mapping.
+
+        ``picks`` is an int (exact count), ``[min, max]`` or
+        ``{"min": .., "max": .., "weights": {word: weight}}``; word weights
+        default to the item's ``weight`` field, if any.
+        """
+        rules = []
+        for category, picks in categories.items():
+            items = [item for item in keywords[category] if isinstance(item, dict) and item.get("word")]
+            words = [item["word"] for item in items]
+            weights = {item["word"]: float(item.get("weight", 1.0)) for item in items}
+            if isinstance(picks, dict):
+                weights.update(picks.get("weights") or {})
+                lo, hi = picks.get("min", 1), picks.get("max")
+            elif isinstance(picks, (list, tuple)):
+                lo, hi = picks[0], picks[1]
+            else:
+                lo, hi = int(picks), None
+            rules.append(CategoryRule(category, words, int(lo), None if hi is None else int(hi),
+                                      [weights[word] for word in words]))
+        return cls(rules, exclusions)
+
+    def size(self) -> int:
+        """Number of points before exclusions are applied."""
+        return self._size
+
+    def selection_at(self, index: int) -> Selection:
+        digits = self._digits(index)
+        return {rule.name: rule.option(d) for rule, d in zip(self.rules, digits)}
+
+    def is_allowed(self, selection: Selection) -> bool:
+        if not self._conflicts:
+            return True
+        seen = set()
+        for words in selection.values():
+            for word in words:
+                conflicts = self._conflicts.get(word)
+                if conflicts and not conflicts.isdisjoint(seen):
+                    return False
+                seen.add(word)
+        return True
+
+    def enumerate(self, start: int = 0) -> Iterator[Tuple[int, Selection]]:
+        """All allowed selections from index ``start`` on, in index order.
+
+        Only the categories whose digit changed are re-decoded on each step;
+        every selection gets its own word lists.
+        """
+        total = self.size()
+        if start >= total:
+            return
+        digits = self._digits(start)
+        options = [rule.option(d) for rule, d in zip(self.rules, digits)]
+        last = len(self.rules) - 1
+        index = start
+        while True:
+            selection = {rule.name: list(opts) for rule, opts in zip(self.rules, options)}
+            if self.is_allowed(selection):
+                yield index, selection
+            index += 1
+            if index >= total:
+                return
+            pos = last
+            while True:
+                digits[pos] += 1
+                if digits[pos] < self._radix[pos]:
+                    options[pos] = self.rules[pos].option(digits[pos])
+                    break
+                digits[pos] = 0
+                options[pos] = self.rules[pos].option(0)
+                pos -= 1
+
+    def sample(self, seed: Any = 0, weighted: bool = False, start: int = 0,
+               count: Optional[int] = None) -> Iterator[Tuple[int, Selection]]:
+        """Endless (or ``count``-long) stream of random selections.
+
+        Sample ``n`` depends only on ``seed`` and ``n``, so the cursor is
+        just ``n`` and any range can be regenerated independently. Uniform
+        sampling draws over the whole index space; weighted sampling picks a
+        size per category and then words by weight. The stream ends after
+        ``MAX_EMPTY_SAMPLES`` samples in a row found no allowed selection.
+        """
+        stream = self._sample_stream(seed, weighted, start)
+        return stream if count is None else islice(stream, count)
+
+    def sample_at(self, n: int, seed: Any = 0, weighted: bool = False) -> Optional[Selection]:
+        """Sample number ``n``; None if no allowed selection was found."""
+        rng = random.Random(f"{seed}:{n}")
+        total = self.size()
+        for _attempt in range(MAX_REJECTIONS):
+            if weighted:
+                selection = {rule.name: rule.sample_weighted(rng) for rule in self.rules}
+            else:
+                selection = self.selection_at(rng.randrange(total))
+            if self.is_allowed(selection):
+                return selection
+        logger.warning(f"No allowed selection for sample {n} after {MAX_REJECTIONS} draws")
+        return None
+
+    def _sample_stream(self, seed, weighted, start) -> Iterator[Tuple[int, Selection]]:
+        n = start
+        misses = 0
+        while True:
+            selection = self.sample_at(n, seed, weighted)
+            if selection is not None:
+                misses = 0
+                yield n, selection
+            else:
+                misses += 1
+                if misses >= MAX_EMPTY_SAMPLES:
+                    logger.warning(f"Sampling stopped at {n}: {misses} samples in a row "
+                                   f"found no allowed selection")
+                    return
+            n += 1
+
+    def _digits(self, index: int) -> List[int]:
+        if not 0 <= index < max(1, self.size()):
+            raise IndexError(index)
+        digits = [0] * len(self.rules)
+        for pos in range(len(self.rules) - 1, -1, -1):
+            index, digits[pos] = divmod(index, self._radix[pos])
+        return digits
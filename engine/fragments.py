@@ -0,0 +1,154 @@
+"""
+Prompt fragments for PromptGenie
+Named reusable prompt parts ({{quality_prefix}}) shared between templates
+"""
+
+import logging
+import re
+import sys
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .tokens import PROMPT_SEPARATOR
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_RE = re.compile(r"\{\{(\w+)\}\}")
+PROMPT_FIELD = "prompt_combined_en"
+
+
+def placeholder(name: str) -> str:
+    return "{{" + name + "}}"
+
+
+class FragmentTable:
+    """Name -> text table of shared prompt fragments.
+
+    Theme prompts keep ``{{name}}`` placeholders in memory and on disk and
+    are expanded only when rendered (:meth:`expand`). Fragment names and
+    texts are interned.
+    """
+
+    def __init__(self, fragments: Optional[Dict[str, str]] = None):
+        self._texts: Dict[str, str] = {}
+        self._patterns: List[Tuple[str, "re.Pattern"]] = []
+        for name, text in (fragments or {}).items():
+            self.add(name, text)
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._texts
+
+    def get(self, name: str) -> Optional[str]:
+        return self._texts.get(name)
+
+    def to_dict(self) -> Dict[str, str]:
+        return dict(self._texts)
+
+    def add(self, name: str, text: str) -> None:
+        name, text = sys.intern(name), sys.intern(text)
+        self._texts[name] = text
+        # Замена только по границам токенов, от длинных фрагментов к коротким
+        self._patterns = [
+            (n, re.compile(r"(?<![^\s,|])" + re.escape(t) + r"(?![^\s,|])"))
+            for n, t in sorted(self._texts.items(), key=lambda item: -len(item[1]))
+        ]
+
+    def expand(self, text: str) -> str:
+        """Replace known placeholders with their text; unknown ones are kept."""
+        if not text or "{{" not in text:
+            return text
+        return FRAGMENT_RE.sub(lambda m: self._texts.get(m.group(1), m.group(0)), text)
+
+    def compress(self, text: str) -> str:
+        """Replace fragment texts with placeholders; inverse of :meth:`expand`."""
+        if not text or not self._patterns:
+            return text
+        for name, pattern in self._patterns:
+            text = pattern.sub(placeholder(name), text)
+        return text
+
+    def expand_theme(self, theme: Dict[str, Any]) -> Dict[str, Any]:
+        """The theme itself, or a shallow copy with the prompt expanded."""
+        prompt = theme.get(PROMPT_FIELD)
+        if not prompt or "{{" not in prompt:
+            return theme
+        expanded = dict(theme)
+        expanded[PROMPT_FIELD] = self.expand(prompt)
+        return expanded
+
+    def compress_theme(self, theme: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = theme.get(PROMPT_FIELD)
+        if not prompt or not self._patterns:
+            return theme
+        compressed = self.compress(prompt)
+        if compressed == prompt:
+            return theme
+        theme = dict(theme)
+        theme[PROMPT_FIELD] = compressed
+        return theme
+
+
+def _boundaries(section: str) -> List[int]:
+    return [i for i, ch in enumerate(section) if ch == ","]
+
+
+def _best_part(sections: Iterable[str], suffix: bool, min_uses: int,
+               min_chars: int) -> Optional[str]:
+    """Most space-saving token-aligned prefix (or suffix) shared by sections."""
+    counts: Counter = Counter()
+    for section in sections:
+        section = section.strip()
+        if not section:
+            continue
+        cuts = _boundaries(section)
+        if suffix:
+            parts = {section[i + 1:].strip() for i in cuts}
+        else:
+            parts = {section[:i].strip() for i in cuts}
+        parts.add(section)
+        counts.update(part for part in parts if len(part) >= min_chars)
+    best, best_saving = None, 0
+    for part, uses in counts.items():
+        saving = uses * (len(part) - len(placeholder("quality_prefix")))
+        if uses >= min_uses and saving > best_saving:
+            best, best_saving = part, saving
+    return best
+
+
+def extract_fragments(prompts: Iterable[str], min_uses: int = 10,
+                      min_chars: int = 40) -> FragmentTable:
+    """Find the shared quality prefix and negative suffix of a prompt library.
+
+    ``quality_prefix`` is the positive-section prefix and ``std_negative``
+    the negative-section suffix that save the most characters among those
+    used by at least ``min_uses`` prompts.
+    """
+    positives, negatives = [], []
+    for prompt in prompts:
+        positive, sep, negative = (prompt or "").partition(PROMPT_SEPARATOR)
+        positives.append(positive)
+        if sep:
+            negatives.append(negative)
+    table = FragmentTable()
+    prefix = _best_part(positives, False, min_uses, min_chars)
+    if prefix:
+        table.add("quality_prefix", prefix)
+    suffix = _best_part(negatives, True, min_uses, min_chars)
+    if suffix:
+        table.add("std_negative", suffix)
+    return table
+
+
+def migrate_themes(themes: List[Dict[str, Any]], **kwargs) -> FragmentTable:
+    """Extract fragments from ``themes`` and compress their prompts in place."""
+    table = extract_fragments((t.get(PROMPT_FIELD) or "" for t in themes), **kwargs)
+    for theme in themes:
+        prompt = theme.get(PROMPT_FIELD)
+        if prompt:
+            theme[PROMPT_FIELD] = table.compress(prompt)
+    if len(table):
+        logger.info(f"Extracted {len(table)} shared prompt fragments from {len(themes)} themes")
+    return table
@@ -0,0 +1,84 @@
+"""
+Keyword index for PromptGenie
+Interned keyword IDs, word->category lookup and category polarity, built once per library
+"""
+
+import logging
+import sys
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Категории, в названии которых есть это слово, считаются негативными
+NEGATIVE_MARKER = "негатив"
+
+
+def is_negative_category(category: str) -> bool:
+    return NEGATIVE_MARKER in category.lower()
+
+
+class KeywordIndex:
+    """Read-only index over the ``keywords`` mapping of keyword_library.json.
+
+    Categories and keywords get dense integer IDs in library order; the
+    keywords of one category occupy a contiguous ID range. Word strings are
+    interned. ``negative_mask`` has bit ``c`` set for every negative
+    category ``c``.
+    """
+
+    def __init__(self, keywords: Optional[Dict[str, List[dict]]] = None):
+        self.categories: List[str] = []
+        self.words: List[str] = []
+        self.translations: List[str] = []
+        self.effects: List[str] = []
+        self.keyword_category: List[int] = []
+        self.word_to_category: Dict[str, str] = {}
+        self.negative_mask = 0
+        self._category_ids: Dict[str, int] = {}
+        self._ranges: List[range] = []
+        self._ids: Dict[Tuple[int, str], int] = {}
+
+        for name, items in (keywords or {}).items():
+            cat_id = len(self.categories)
+            self.categories.append(name)
+            self._category_ids[name] = cat_id
+            if is_negative_category(name):
+                self.negative_mask |= 1 << cat_id
+            start = len(self.words)
+            for item in items or []:
+                word = item.get("word") if isinstance(item, dict) else None
+                if not word:
+                    continue
+                if (cat_id, word) in self._ids:
+                    logger.warning(f"Duplicate keyword '{word}' in category {name}")
+                    continue
+                word = sys.intern(word)
+                self._ids[(cat_id, word)] = len(self.words)
+                self.words.append(word)
+                self.translations.append(item.get("translate", "") or "")
+                self.effects.append(item.get("effect", "") or "")
+                self.keyword_category.append(cat_id)
+                self.word_to_category.setdefault(word, name)
+            self._ranges.append(range(start, len(self.words)))
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def category_id(self, name: str) -> Optional[int]:
+        return self._category_ids.get(name)
+
+    def keyword_id(self, cat_id: int, word: str) -> Optional[int]:
+        return self._ids.get((cat_id, word))
+
+    def keywords_in(self, cat_id: int) -> range:
+        return self._ranges[cat_id]
+
+    def is_negative(self, cat_id: int) -> bool:
+        return bool(self.negative_mask >> cat_id & 1)
+
+    def is_positive_word(self, word: str) -> bool:
+        """Words of unknown category are treated as positive."""
+        category = self.word_to_category.get(word)
+        if category is None:
+            return True
+        return not self.is_negative(self._category_ids[category])
@@ -0,0 +1,163 @@
+"""
+Prompt tokens for PromptGenie
+Parses prompt strings into weighted, deduplicated token lists
+"""
+
+import re
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+# Разделитель позитивной и негативной части в prompt_combined_en
+PROMPT_SEPARATOR = "|||"
+# Вес одного уровня скобок в синтаксисе Stable Diffusion: (x) = 1.1, [x] = 1/1.1
+EMPHASIS = 1.1
+
+_WHITESPACE = re.compile(r"\s+")
+_WEIGHTED = re.compile(r"^\((.+):\s*([0-9]*\.?[0-9]+)\s*\)$", re.DOTALL)
+
+
+def normalize_space(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class Token:
+    """One comma-separated prompt element with an SD-style weight."""
+    __slots__ = ("text", "weight", "key")
+
+    def __init__(self, text: str, weight: float = 1.0):
+        self.text = normalize_space(text)
+        self.weight = round(weight, 2)
+        self.key = self.text.casefold()
+
+    def render(self) -> str:
+        if self.weight == 1.0:
+            return self.text
+        return f"({self.text}:{self.weight:g})"
+
+    def __eq__(self, other):
+        return isinstance(other, Token) and (self.key, self.weight) == (other.key, other.weight)
+
+    def __hash__(self):
+        return hash((self.key, self.weight))
+
+    def __repr__(self):
+        return f"Token({self.text!r}, {self.weight:g})"
+
+
+def _split_top_level(section: str) -> List[str]:
+    """Split on commas outside parentheses/brackets, so "(a, b:1.2)" stays whole."""
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(section):
+        if ch in "([":
+            depth += 1
+        elif ch in ")]" and depth:
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(section[start:i])
+            start = i + 1
+    parts.append(section[start:])
+    return parts
+
+
+def _parse_token(raw: str) -> Optional[Token]:
+    text = normalize_space(raw)
+    if not text:
+        return None
+    weight = 1.0
+    while True:
+        if text.startswith("(") and text.endswith(")") and _is_wrapped(text, "(", ")"):
+            match = _WEIGHTED.match(text)
+            if match:
+                text, weight = match.group(1).strip(), weight * float(match.group(2))
+            else:
+                text, weight = text[1:-1].strip(), weight * EMPHASIS
+        elif text.startswith("[") and text.endswith("]") and _is_wrapped(text, "[", "]"):
+            text, weight = text[1:-1].strip(), weight / EMPHASIS
+        else:
+            break
+    return Token(text, weight) if text else None
+
+
+def _is_wrapped(text: str, open_ch: str, close_ch: str) -> bool:
+    """True if the first bracket closes at the very end ("(a) (b)" is not wrapped)."""
+    depth = 0
+    for i, ch in enumerate(text):
+        if ch == open_ch:
+            depth += 1
+        elif ch == close_ch:
+            depth -= 1
+            if depth == 0:
+                return i == len(text) - 1
+    return False
+
+
+def dedupe(tokens: Iterable[Token]) -> List[Token]:
+    """Drop repeated tokens (case- and whitespace-insensitive), keeping first positions.
+
+    If a repeat carries an explicit weight and the kept token does not, the
+    kept token takes that weight.
+    """
+    result: List[Token] = []
+    seen = {}
+    for token in tokens:
+        kept = seen.get(token.key)
+        if kept is None:
+            seen[token.key] = len(result)
+            result.append(token)
+        elif result[kept].weight == 1.0 and token.weight != 1.0:
+            result[kept] = Token(result[kept].text, token.weight)
+    return result
+
+
+@lru_cache(maxsize=4096)
+def parse_section(section: str) -> Tuple[Token, ...]:
+    """Tokens of one prompt section, deduplicated, in order of appearance."""
+    tokens = (_parse_token(raw) for raw in _split_top_level(section or ""))
+    return tuple(dedupe(token for token in tokens if token is not None))
+
+
+class ParsedPrompt:
+    """Positive and negative token lists of a ``positive ||| negative`` prompt."""
+    __slots__ = ("positive", "negative")
+
+    def __init__(self, positive: Iterable[Token] = (), negative: Iterable[Token] = ()):
+        self.positive = list(positive)
+        self.negative = list(negative)
+
+    def merge(self, positive: Iterable[str] = (), negative: Iterable[str] = ()) -> "ParsedPrompt":
+        """New prompt with extra raw sections appended and all duplicates removed."""
+        pos = list(self.positive)
+        for section in positive:
+            pos.extend(parse_section(section))
+        neg = list(self.negative)
+        for section in negative:
+            neg.extend(parse_section(section))
+        return ParsedPrompt(dedupe(pos), dedupe(neg))
+
+    @property
+    def positive_text(self) -> str:
+        return ", ".join(token.render() for token in self.positive)
+
+    @property
+    def negative_text(self) -> str:
+        return ", ".join(token.render() for token in self.negative)
+
+    def render(self) -> str:
+        """Canonical string form; the separator is omitted without negatives."""
+        if not self.negative:
+            return self.positive_text
+        return f"{self.positive_text} {PROMPT_SEPARATOR} {self.negative_text}"
+
+    def __repr__(self):
+        return f"ParsedPrompt(positive={self.positive!r}, negative={self.negative!r})"
+
+
+def parse_prompt(text: str) -> ParsedPrompt:
+    """Parse ``positive ||| negative``; text without a separator is all positive."""
+    positive, sep, negative = (text or "").partition(PROMPT_SEPARATOR)
+    return ParsedPrompt(parse_section(positive), parse_section(negative) if sep else ())
+
+
+def canonicalize(text: str) -> str:
+    """Whitespace-normalized, duplicate-free form of a prompt string."""
+    return parse_prompt(text).render()
@@ -0,0 +1,347 @@
+"""
+Image generation client for PromptGenie
+HTTP clients for image-generation APIs with keep-alive pooling, rate limiting and retries
+"""
+
+import base64
+import http.client
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Ответы, после которых запрос имеет смысл повторить
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+Response = Tuple[int, Dict[str, str], bytes]
+
+
+class ImageGenerationError(Exception):
+    """A generation request failed; ``retryable`` errors are retried by the client."""
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class GenerationCancelled(ImageGenerationError):
+    pass
+
+
+class ImageJob:
+    """One txt2img request; ``prompt`` and ``negative`` are plain text."""
+    __slots__ = ("id", "title", "prompt", "negative", "width", "height", "steps", "context",
+                 "cached")
+
+    def __init__(self, id: int, prompt: str, negative: str = "", width: int = 512,
+                 height: int = 512, steps: int = 30, title: str = "", context: Any = None):
+        self.id = id
+        self.title = title
+        self.prompt = prompt
+        self.negative = negative
+        self.width = width
+        self.height = height
+        self.steps = steps
+        # Произвольные данные вызывающего кода (например, шаблон)
+        self.context = context
+        # True, если результат взят из кэша без запроса к сервису
+        self.cached = False
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        return {"width": self.width, "height": self.height, "steps": self.steps}
+
+    def __repr__(self):
+        return f"ImageJob({self.id}, {self.title!r}, {self.width}x{self.height}, steps={self.steps})"
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections to one host, shared by worker threads.
+
+    At most ``max_size`` idle connections are kept. A request on a reused
+    connection that the server has already closed is repeated once on a
+    fresh connection.
+    """
+
+    def __init__(self, base_url: str, max_size: int = 4, timeout: float = 300.0):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Unsupported API URL: {base_url}")
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.created = 0
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(max_size)
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        self.created += 1
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> Response:
+        for attempt in range(2):
+            try:
+                conn, reused = self._idle.get_nowait(), True
+            except queue.Empty:
+                conn, reused = self._new_connection(), False
+            try:
+                conn.request(method, self.prefix + path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            return response.status, {k.lower(): v for k, v in response.getheaders()}, data
+        raise AssertionError("unreachable")
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class RateLimiter:
+    """Token bucket: ``rate_per_minute`` requests with bursts of ``burst``.
+
+    A rate of 0 disables limiting. :meth:`acquire` reserves a slot and
+    sleeps until it is due, so concurrent callers are spaced out evenly.
+    """
+
+    def __init__(self, rate_per_minute: float = 0, burst: int = 1):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Wait for a slot; returns the time slept in seconds."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter; ``Retry-After`` from the server wins."""
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return min(self.max_delay, max(0.0, retry_after))
+        return min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+class Provider:
+    """Request format of one image-generation API."""
+    name = ""
+    default_url = ""
+    # Ограничение по умолчанию, запросов в минуту (0 — без ограничения)
+    default_rate = 0
+    path = ""
+
+    def __init__(self, api_key: str = ""):
+        self.api_key = api_key
+
+    def headers(self) -> Dict[str, str]:
+        return {"Content-Type": "application/json", "Accept": "application/json"}
+
+    def payload(self, job: ImageJob) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def images(self, data: Dict[str, Any]) -> List[bytes]:
+        raise NotImplementedError
+
+
+def _decode_image(value: str) -> bytes:
+    # Некоторые сборки WebUI отдают data URI вместо голого base64
+    if value.startswith("data:"):
+        value = value.partition(",")[2]
+    return base64.b64decode(value)
+
+
+class StableDiffusionWebUI(Provider):
+    """AUTOMATIC1111 / Forge WebUI started with ``--api``.
+
+    ``api_key`` in the form ``user:password`` is sent as basic auth
+    (``--api-auth``).
+    """
+    name = "Stable Diffusion API"
+    default_url = "http://127.0.0.1:7860"
+    path = "/sdapi/v1/txt2img"
+
+    def headers(self) -> Dict[str, str]:
+        headers = super().headers()
+        if ":" in self.api_key:
+            token = base64.b64encode(self.api_key.encode("utf-8")).decode("ascii")
+            headers["Authorization"] = f"Basic {token}"
+        return headers
+
+    def payload(self, job: ImageJob) -> Dict[str, Any]:
+        return {
+            "prompt": job.prompt,
+            "negative_prompt": job.negative,
+            "width": job.width,
+            "height": job.height,
+            "steps": job.steps,
+            "batch_size": 1,
+            "n_iter": 1,
+            "seed": -1,
+        }
+
+    def images(self, data: Dict[str, Any]) -> List[bytes]:
+        return [_decode_image(image) for image in data.get("images") or []]
+
+
+class OpenAIImages(Provider):
+    """OpenAI images API (DALL-E 2: square 256/512/1024, no negative prompt)."""
+    name = "OpenAI DALL-E"
+    default_url = "https://api.openai.com"
+    default_rate = 5
+    path = "/v1/images/generations"
+    SIZES = (256, 512, 1024)
+
+    def headers(self) -> Dict[str, str]:
+        headers = super().headers()
+        headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def payload(self, job: ImageJob) -> Dict[str, Any]:
+        side = min(self.SIZES, key=lambda s: abs(s - max(job.width, job.height)))
+        return {
+            "model": "dall-e-2",
+            "prompt": job.prompt,
+            "n": 1,
+            "size": f"{side}x{side}",
+            "response_format": "b64_json",
+        }
+
+    def images(self, data: Dict[str, Any]) -> List[bytes]:
+        return [_decode_image(item["b64_json"]) for item in data.get("data") or []
+                if item.get("b64_json")]
+
+
+PROVIDERS: Dict[str, type] = {cls.name: cls for cls in (StableDiffusionWebUI, OpenAIImages)}
+
+
+class ImageGenerationClient:
+    """Thread-safe client for one provider.
+
+    All worker threads share one :class:`ConnectionPool` and one
+    :class:`RateLimiter`; failed requests are retried according to
+    ``retry``. Blocking — call it from worker threads, not the GUI thread.
+    """
+
+    def __init__(self, provider: Provider, base_url: Optional[str] = None,
+                 rate_per_minute: Optional[float] = None, max_connections: int = 4,
+                 timeout: float = 300.0, retry: Optional[RetryPolicy] = None):
+        self.provider = provider
+        self.pool = ConnectionPool(base_url or provider.default_url, max_connections, timeout)
+        if rate_per_minute is None:
+            rate_per_minute = provider.default_rate
+        self.limiter = RateLimiter(rate_per_minute)
+        self.retry = retry or RetryPolicy()
+        self.requests = 0
+        self.retries = 0
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "ImageGenerationClient":
+        """Build a client from the ``image_api`` section of config.json."""
+        service = settings.get("service") or StableDiffusionWebUI.name
+        provider_cls = PROVIDERS.get(service)
+        if provider_cls is None:
+            raise ImageGenerationError(f"Сервис не поддерживается: {service}")
+        return cls(
+            provider_cls(settings.get("api_key", "")),
+            base_url=settings.get("base_url") or None,
+            rate_per_minute=settings.get("rate_per_minute"),
+            max_connections=max(1, int(settings.get("concurrency", 1))),
+            timeout=float(settings.get("timeout", 300)),
+            retry=RetryPolicy(int(settings.get("max_attempts", 4))),
+        )
+
+    def generate(self, job: ImageJob,
+                 is_cancelled: Optional[Callable[[], bool]] = None) -> List[bytes]:
+        """Run ``job`` and return the encoded images (PNG for the bundled providers)."""
+        body = json.dumps(self.provider.payload(job)).encode("utf-8")
+        headers = self.provider.headers()
+        for attempt in range(self.retry.max_attempts):
+            if is_cancelled and is_cancelled():
+                raise GenerationCancelled("Генерация отменена")
+            self.limiter.acquire()
+            try:
+                return self._post(body, headers)
+            except ImageGenerationError as e:
+                if not e.retryable or attempt + 1 >= self.retry.max_attempts:
+                    raise
+                delay = self.retry.delay(attempt, e.retry_after)
+                self.retries += 1
+                logger.warning(f"{self.provider.name}: {e}; повтор через {delay:.1f} с "
+                               f"({attempt + 2}/{self.retry.max_attempts})")
+                time.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def _post(self, body: bytes, headers: Dict[str, str]) -> List[bytes]:
+        self.requests += 1
+        try:
+            status, response_headers, data = self.pool.request("POST", self.provider.path,
+                                                               body, headers)
+        except (http.client.HTTPException, OSError) as e:
+            raise ImageGenerationError(f"Ошибка соединения: {e}", retryable=True)
+        if status != 200:
+            retry_after = response_headers.get("retry-after")
+            try:
+                retry_after = float(retry_after) if retry_after else None
+            except ValueError:
+                retry_after = None
+            raise ImageGenerationError(
+                f"HTTP {status}: {data[:200].decode('utf-8', 'replace')}",
+                status=status, retryable=status in RETRY_STATUSES, retry_after=retry_after
+            )
+        try:
+            images = self.provider.images(json.loads(data))
+        except (ValueError, KeyError, TypeError) as e:
+            raise ImageGenerationError(f"Некорректный ответ сервиса: {e}")
+        if not images:
+            raise ImageGenerationError("Сервис не вернул изображений")
+        return images
+
+    def close(self) -> None:
+        self.pool.close()
@@ -0,0 +1,136 @@
+"""
+Image job queue for PromptGenie
+Runs image-generation jobs on a QThreadPool and reports progress to the GUI
+"""
+
+import logging
+from pathlib import Path
+from typing import Iterable, List
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from image_client import GenerationCancelled, ImageGenerationClient, ImageJob
+from result_cache import ResultCache, result_key
+
+logger = logging.getLogger(__name__)
+
+
+class _JobSignals(QObject):
+    finished = pyqtSignal(int, object, object)  # generation, ImageJob, List[Path]
+    failed = pyqtSignal(int, object, str)       # generation, ImageJob, message
+
+
+class _JobTask(QRunnable):
+    """Runs one job unless its result is cached, and stores the images in the cache."""
+
+    def __init__(self, queue: "ImageJobQueue", generation: int, job: ImageJob):
+        super().__init__()
+        self._queue = queue
+        self._generation = generation
+        self._job = job
+
+    def run(self):
+        is_cancelled = lambda: self._queue._is_stale(self._generation)
+        job, client, cache = self._job, self._queue.client, self._queue.cache
+        try:
+            key = result_key(client.provider.name, job.prompt, job.negative, **job.params)
+            paths = cache.get(key)
+            job.cached = paths is not None
+            if paths is None:
+                paths = cache.put(key, client.generate(job, is_cancelled))
+        except GenerationCancelled:
+            return
+        except Exception as e:
+            logger.error(f"Ошибка генерации изображения для '{self._job.title}': {e}")
+            self._queue._signals.failed.emit(self._generation, self._job, str(e))
+            return
+        self._queue._signals.finished.emit(self._generation, self._job, paths)
+
+
+class ImageJobQueue(QObject):
+    """Queue of :class:`ImageJob` processed by ``concurrency`` pool threads.
+
+    :meth:`submit` returns immediately; every job ends with ``job_finished``
+    (image paths in the :class:`ResultCache`) or ``job_failed``, and
+    ``progress(done, total)`` is emitted after each one. Requests already
+    in the cache are answered without contacting the service.
+    :meth:`cancel` drops jobs that have not started and ignores the results
+    of running ones.
+    """
+    job_finished = pyqtSignal(object, list)
+    job_failed = pyqtSignal(object, str)
+    progress = pyqtSignal(int, int)
+
+    def __init__(self, client: ImageGenerationClient, cache: ResultCache,
+                 concurrency: int = 1, parent=None):
+        super().__init__(parent)
+        self.client = client
+        self.cache = cache
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(max(1, concurrency))
+        self._generation = 0
+        self._next_id = 0
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+
+        self._signals = _JobSignals(self)
+        self._signals.finished.connect(self._on_finished)
+        self._signals.failed.connect(self._on_failed)
+
+    @property
+    def busy(self) -> bool:
+        return self.done < self.total
+
+    def set_client(self, client: ImageGenerationClient, concurrency: int = 1) -> None:
+        """Switch provider settings; running jobs are cancelled."""
+        self.cancel()
+        self.client.close()
+        self.client = client
+        self._pool.setMaxThreadCount(max(1, concurrency))
+
+    def make_job(self, prompt: str, negative: str = "", **kwargs) -> ImageJob:
+        self._next_id += 1
+        return ImageJob(self._next_id, prompt, negative, **kwargs)
+
+    def submit(self, jobs: Iterable[ImageJob]) -> int:
+        """Queue jobs; returns how many were added."""
+        jobs = list(jobs)
+        if not self.busy:
+            self.total = self.done = self.failed = 0
+        for job in jobs:
+            self._pool.start(_JobTask(self, self._generation, job))
+        self.total += len(jobs)
+        if jobs:
+            self.progress.emit(self.done, self.total)
+        return len(jobs)
+
+    def cancel(self) -> None:
+        self._generation += 1
+        self._pool.clear()
+        self.total = self.done
+        self.progress.emit(self.done, self.total)
+
+    def shutdown(self, wait_ms: int = 3000) -> None:
+        self.cancel()
+        self._pool.waitForDone(wait_ms)
+        self.client.close()
+        self.cache.flush()
+
+    def _is_stale(self, generation: int) -> bool:
+        return generation != self._generation
+
+    def _on_finished(self, generation: int, job: ImageJob, paths: List[Path]):
+        if self._is_stale(generation):
+            return
+        self.done += 1
+        self.job_finished.emit(job, paths)
+        self.progress.emit(self.done, self.total)
+
+    def _on_failed(self, generation: int, job: ImageJob, message: str):
+        if self._is_stale(generation):
+            return
+        self.done += 1
+        self.failed += 1
+        self.job_failed.emit(job, message)
+        self.progress.emit(self.done, self.total)
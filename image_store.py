@@ -0,0 +1,141 @@
+"""
+Image store for PromptGenie
+Content-addressed template images with reference counting and garbage collection
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Optional
+
+from utils import match_file_mode
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1 << 16
+
+
+class ImageStore:
+    """Template images in ``root`` named by their content hash.
+
+    File names are the first 16 hex digits of the sha1 plus the extension.
+    Adding a file that is already stored returns the existing name, so an
+    image shared by many templates exists once on disk. Reference counts
+    are derived from the themes' ``image_path`` (:meth:`rebuild`) and
+    maintained with :meth:`acquire`/:meth:`release`; releasing the last
+    reference deletes the file. Images stored under legacy (non-hash)
+    names are counted the same way. Hashing and copying are blocking —
+    run :meth:`add_file` on a worker thread for large files.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._refs: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> Path:
+        return self.root / name
+
+    def refcount(self, name: str) -> int:
+        return self._refs.get(name, 0)
+
+    def add_stream(self, src: IO[bytes], suffix: str) -> str:
+        """Store the content of ``src``; returns its file name in the store."""
+        h = hashlib.sha1()
+        fd, tmp_name = tempfile.mkstemp(prefix=".add.", suffix=".tmp", dir=str(self.root))
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                    h.update(chunk)
+                    out.write(chunk)
+            name = f"{h.hexdigest()[:16]}{suffix.lower()}"
+            if (self.root / name).exists():
+                os.remove(tmp_name)
+            else:
+                match_file_mode(tmp_name, self.root / name)
+                os.replace(tmp_name, self.root / name)
+            return name
+        except BaseException:
+            try:
+                os.remove(tmp_name)
+            except OSError:
+                pass
+            raise
+
+    def add_file(self, source: Path, link: bool = False) -> str:
+        """Store a copy of ``source`` (a hard link with ``link`` where possible)."""
+        source = Path(source)
+        if link:
+            digest = hashlib.sha1()
+            with open(source, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            name = f"{digest.hexdigest()[:16]}{source.suffix.lower()}"
+            target = self.root / name
+            if not target.exists():
+                try:
+                    os.link(source, target)
+                except OSError:
+                    return self.add_file(source)
+            return name
+        with open(source, 'rb') as f:
+            return self.add_stream(f, source.suffix)
+
+    def rebuild(self, themes: Iterable[Dict[str, Any]]) -> None:
+        """Recount references from the themes' ``image_path``."""
+        refs = Counter(theme.get("image_path") for theme in themes if theme.get("image_path"))
+        with self._lock:
+            self._refs = refs
+
+    def acquire(self, name: Optional[str]) -> None:
+        if name:
+            with self._lock:
+                self._refs[name] += 1
+
+    def release(self, name: Optional[str]) -> bool:
+        """Drop one reference; returns True if the file was deleted.
+
+        A name without references (never acquired, or already released) is
+        left alone: the file may belong to a theme the store does not count.
+        """
+        if not name:
+            return False
+        with self._lock:
+            if name not in self._refs:
+                return False
+            if self._refs[name] > 1:
+                self._refs[name] -= 1
+                return False
+            self._refs.pop(name, None)
+        return self._delete(name)
+
+    def discard(self, name: Optional[str]) -> bool:
+        """Delete an image that was added but never referenced (e.g. a cancelled dialog)."""
+        if not name or self.refcount(name):
+            return False
+        return self._delete(name)
+
+    def replace(self, old: Optional[str], new: Optional[str]) -> None:
+        """A theme switched its image from ``old`` to ``new``."""
+        if old != new:
+            self.acquire(new)
+            self.release(old)
+
+    def _delete(self, name: str) -> bool:
+        # Только файлы внутри хранилища
+        if Path(name).name != name:
+            return False
+        try:
+            os.remove(self.root / name)
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            logger.error(f"Не удалось удалить изображение {name}: {e}")
+            return False
+        logger.info(f"Удалено изображение без ссылок: {name}")
+        return True
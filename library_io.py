@@ -0,0 +1,471 @@
+"""
+Library import/export for PromptGenie
+Streaming exchange of theme packs as JSON, JSONL, CSV and ZIP bundles with images
+"""
+
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, Optional, Tuple
+
+from engine.fragments import FragmentTable
+from engine.tokens import canonicalize, normalize_space
+from image_store import ImageStore
+from theme_index import ID_FIELD
+from utils import match_file_mode
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("json", "jsonl", "csv", "zip")
+THEME_FIELDS = ("category", "title_ru", "description_ru", "prompt_combined_en", "image_path")
+CONFLICT_POLICIES = ("rename", "skip", "replace")
+BUNDLE_THEMES = "themes.jsonl"
+BUNDLE_IMAGES = "images/"
+CHUNK_SIZE = 1 << 16
+# Как часто (в шаблонах) сообщать о прогрессе
+PROGRESS_EVERY = 256
+
+Progress = Callable[[int, int], None]
+
+_NON_WS = re.compile(r"\S")
+
+
+def detect_format(path: Path) -> str:
+    fmt = Path(path).suffix.lower().lstrip(".")
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат файла: {path} (ожидается {', '.join(FORMATS)})")
+    return fmt
+
+
+def theme_digest(theme: Dict[str, Any]) -> str:
+    """Content hash of a theme; whitespace and duplicate prompt tokens do not count."""
+    h = hashlib.sha1()
+    for field in ("category", "title_ru", "description_ru"):
+        h.update(normalize_space(str(theme.get(field) or "")).encode("utf-8"))
+        h.update(b"\0")
+    h.update(canonicalize(theme.get("prompt_combined_en") or "").encode("utf-8"))
+    return h.hexdigest()
+
+
+class _JsonStream:
+    """Pull parser over a text stream: decodes one JSON value at a time.
+
+    Only the value being decoded (plus one read chunk) is kept in memory.
+    """
+
+    def __init__(self, fp: IO[str], chunk_size: int = CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character without consuming it ('' at the end)."""
+        while True:
+            match = _NON_WS.search(self.buf, self.pos)
+            if match:
+                self.pos = match.start()
+                return self.buf[self.pos]
+            self.pos = len(self.buf)
+            if not self._fill():
+                return ""
+
+    def expect(self, ch: str) -> None:
+        found = self.peek()
+        if found != ch:
+            raise ValueError(f"Некорректный JSON: ожидался '{ch}', найдено '{found or 'конец файла'}'")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+                # Число в конце буфера может продолжаться в следующем блоке
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def iter_json_themes(fp: IO[str], meta: Optional[Dict[str, Any]] = None,
+                     chunk_size: int = CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yield the themes of a ``{"themes": [...]}`` document one by one.
+
+    Other top-level keys (``fragments``, ``journal_seq``) are stored in
+    ``meta`` as they are reached. A bare top-level list is read as themes.
+    """
+    meta = {} if meta is None else meta
+    stream = _JsonStream(fp, chunk_size)
+
+    def array() -> Iterator[Dict[str, Any]]:
+        stream.expect("[")
+        while True:
+            ch = stream.peek()
+            if ch == "]":
+                stream.pos += 1
+                return
+            if ch == ",":
+                stream.pos += 1
+                continue
+            if not ch:
+                raise ValueError("Некорректный JSON: неожиданный конец файла")
+            yield stream.value()
+
+    if stream.peek() == "[":
+        yield from array()
+        return
+    stream.expect("{")
+    while True:
+        ch = stream.peek()
+        if ch == "}" or not ch:
+            return
+        if ch == ",":
+            stream.pos += 1
+            continue
+        key = stream.value()
+        stream.expect(":")
+        if key == "themes":
+            yield from array()
+        else:
+            meta[key] = stream.value()
+
+
+class _Source:
+    """Theme records of one pack file plus access to the images it references."""
+
+    def __init__(self, path: Path, fmt: Optional[str] = None):
+        self.path = Path(path)
+        self.fmt = fmt or detect_format(self.path)
+        self.total = self.path.stat().st_size
+        self.position = 0
+        self.fragments = FragmentTable()
+        self._zip: Optional[zipfile.ZipFile] = None
+
+    def __enter__(self):
+        if self.fmt == "zip":
+            self._zip = zipfile.ZipFile(self.path)
+        return self
+
+    def __exit__(self, *exc):
+        if self._zip is not None:
+            self._zip.close()
+
+    def themes(self) -> Iterator[Dict[str, Any]]:
+        if self.fmt == "zip":
+            info = self._zip.getinfo(BUNDLE_THEMES)
+            self.total = info.file_size
+            raw = self._zip.open(info)
+        else:
+            raw = open(self.path, 'rb')
+        with raw:
+            text = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='' if self.fmt == "csv" else None)
+            for theme in self._records(text):
+                self.position = raw.tell()
+                yield theme
+
+    def _records(self, text: IO[str]) -> Iterator[Dict[str, Any]]:
+        if self.fmt == "csv":
+            csv.field_size_limit(1 << 30)
+            for row in csv.DictReader(text):
+                yield {key: value for key, value in row.items() if key and value is not None}
+        elif self.fmt == "json":
+            meta: Dict[str, Any] = {}
+            for theme in iter_json_themes(text, meta):
+                if "fragments" in meta and not len(self.fragments):
+                    self.fragments = FragmentTable(meta["fragments"])
+                elif isinstance(theme, dict) and not len(self.fragments) \
+                        and "{{" in str(theme.get("prompt_combined_en", "")):
+                    # Таблица фрагментов записана после шаблонов: отдельный проход
+                    self.fragments = self._scan_fragments()
+                yield theme
+        else:
+            for line in text:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    def _scan_fragments(self) -> FragmentTable:
+        meta: Dict[str, Any] = {}
+        with open(self.path, 'r', encoding='utf-8-sig') as f:
+            for _ in iter_json_themes(f, meta):
+                pass
+        return FragmentTable(meta.get("fragments"))
+
+    def open_image(self, name: str) -> Optional[IO[bytes]]:
+        """Open an image referenced by a theme of this pack, or None if it is missing."""
+        if self._zip is not None:
+            member = name if name.startswith(BUNDLE_IMAGES) else BUNDLE_IMAGES + name
+            try:
+                return self._zip.open(member)
+            except KeyError:
+                return None
+        # Имя из файла пакета: пути вне его папки (абсолютные, "..", ссылки) не читаются
+        root = self.path.parent.resolve()
+        candidate = (root / name).resolve()
+        try:
+            if PurePosixPath(name).is_absolute() or Path(name).is_absolute():
+                raise ValueError(name)
+            candidate.relative_to(root)
+        except ValueError:
+            logger.warning(f"Изображение вне папки пакета пропущено: {name}")
+            return None
+        return open(candidate, 'rb') if candidate.is_file() else None
+
+
+class ImportReport:
+    """Counters of one import run."""
+    __slots__ = ("added", "replaced", "renamed", "skipped", "duplicates", "images", "errors")
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def as_dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __str__(self):
+        return (f"добавлено {self.added}, заменено {self.replaced}, переименовано {self.renamed}, "
+                f"пропущено {self.skipped}, дубликатов {self.duplicates}, "
+                f"изображений {self.images}, ошибок {self.errors}")
+
+
+class LibraryImporter:
+    """Merges a theme pack into an in-memory library without loading the pack.
+
+    :meth:`run` yields ``("add", -1, theme)`` and ``("replace", row, theme)``
+    operations in file order; the caller applies them in that order (adds
+    go to the end of the list). Themes whose content hash is already in the
+    library are dropped. A different theme with an existing ``title_ru`` is
+    handled by ``on_conflict``: "rename" adds it as "Title (2)", "skip"
+    drops it, "replace" overwrites the existing theme. Images are added to
+    ``image_store`` (content-addressed); the caller takes the references
+    when it applies the operations.
+    """
+
+    def __init__(self, themes: Iterable[Dict[str, Any]], image_store: Optional[ImageStore] = None,
+                 fragments: Optional[FragmentTable] = None, on_conflict: str = "rename"):
+        if on_conflict not in CONFLICT_POLICIES:
+            raise ValueError(f"Unknown conflict policy: {on_conflict}")
+        self.image_store = image_store
+        self.fragments = fragments or FragmentTable()
+        self.on_conflict = on_conflict
+        self.report = ImportReport()
+        self._digests = set()
+        self._titles: Dict[str, int] = {}
+        self._rows = 0
+        for theme in themes:
+            self._digests.add(theme_digest(self.fragments.expand_theme(theme)))
+            self._titles.setdefault(theme.get("title_ru") or "", self._rows)
+            self._rows += 1
+
+    def run(self, path: Path, progress: Optional[Progress] = None,
+            is_cancelled: Optional[Callable[[], bool]] = None) -> Iterator[Tuple[str, int, Dict[str, Any]]]:
+        with _Source(path) as source:
+            for count, record in enumerate(source.themes(), 1):
+                if is_cancelled and is_cancelled():
+                    return
+                op = self._resolve(source, record)
+                if op is not None:
+                    yield op
+                if progress and count % PROGRESS_EVERY == 0:
+                    progress(source.position, source.total)
+            if progress:
+                progress(source.total, source.total)
+        logger.info(f"Импорт {path}: {self.report}")
+
+    def _resolve(self, source: _Source, record: Any) -> Optional[Tuple[str, int, Dict[str, Any]]]:
+        theme = self._normalize(record, source.fragments)
+        if theme is None:
+            self.report.errors += 1
+            return None
+        digest = theme_digest(theme)
+        if digest in self._digests:
+            self.report.duplicates += 1
+            return None
+
+        title = theme["title_ru"]
+        row = self._titles.get(title)
+        if row is not None:
+            if self.on_conflict == "skip":
+                self.report.skipped += 1
+                return None
+            if self.on_conflict == "rename":
+                theme["title_ru"] = self._free_title(title)
+                row = None
+                self.report.renamed += 1
+
+        theme["image_path"] = self._import_image(source, theme.get("image_path") or "")
+        self._digests.add(digest)
+        stored = self.fragments.compress_theme(theme)
+        if row is not None:
+            self.report.replaced += 1
+            return "replace", row, stored
+        self._titles[theme["title_ru"]] = self._rows
+        self._rows += 1
+        self.report.added += 1
+        return "add", -1, stored
+
+    @staticmethod
+    def _normalize(record: Any, fragments: FragmentTable) -> Optional[Dict[str, Any]]:
+        if not isinstance(record, dict):
+            return None
+        # ID пакета не переносится: библиотека выдаёт свои
+        theme = {key: value for key, value in record.items()
+                 if isinstance(key, str) and key != ID_FIELD}
+        for field in THEME_FIELDS:
+            value = theme.get(field)
+            theme[field] = "" if value is None else str(value).strip()
+        if not theme["title_ru"] or not theme["prompt_combined_en"]:
+            return None
+        # Фрагменты пакета разворачиваются: у библиотеки может быть своя таблица
+        return fragments.expand_theme(theme)
+
+    def _free_title(self, title: str) -> str:
+        n = 2
+        while f"{title} ({n})" in self._titles:
+            n += 1
+        return f"{title} ({n})"
+
+    def _import_image(self, source: _Source, name: str) -> str:
+        if not name or self.image_store is None:
+            return ""
+        src = source.open_image(name)
+        if src is None:
+            # Ссылка на уже существующий файл библиотеки — только простое имя файла в хранилище
+            if name != PurePosixPath(name).name or "\\" in name:
+                return ""
+            return name if self.image_store.path(name).is_file() else ""
+        with src:
+            stored = self.image_store.add_stream(src, PurePosixPath(name).suffix)
+        self.report.images += 1
+        return stored
+
+
+@contextmanager
+def _atomic_output(path: Path):
+    """Binary temp file next to ``path``, renamed into place on success."""
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        match_file_mode(tmp_name, path)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.remove(tmp_name)
+        except OSError:
+            pass
+        raise
+
+
+def _file_sha1(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _write_records(text: IO[str], fmt: str, themes: Iterable[Dict[str, Any]],
+                   progress: Optional[Progress], total: int) -> int:
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(text, fieldnames=THEME_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+    elif fmt == "json":
+        text.write('{"themes": [\n')
+    for theme in themes:
+        if fmt == "csv":
+            writer.writerow(theme)
+        else:
+            line = json.dumps(theme, ensure_ascii=False)
+            text.write((",\n" if fmt == "json" and count else "") + line
+                       + ("" if fmt == "json" else "\n"))
+        count += 1
+        if progress and count % PROGRESS_EVERY == 0:
+            progress(count, total)
+    if fmt == "json":
+        text.write("\n]}\n")
+    return count
+
+
+def export_themes(themes: Iterable[Dict[str, Any]], path: Path, fmt: Optional[str] = None,
+                  images_dir: Optional[Path] = None, fragments: Optional[FragmentTable] = None,
+                  progress: Optional[Progress] = None) -> int:
+    """Write ``themes`` to ``path`` one record at a time; returns the count.
+
+    Prompts are written expanded, so packs do not depend on the local
+    fragment table. A "zip" bundle holds ``themes.jsonl`` and the
+    referenced images under ``images/<sha1>.<ext>`` (stored once per
+    content). The file appears atomically when the export completes.
+    """
+    path = Path(path)
+    fmt = fmt or detect_format(path)
+    fragments = fragments or FragmentTable()
+    total = len(themes) if hasattr(themes, "__len__") else 0
+    images: Dict[str, str] = {}
+
+    def prepared() -> Iterator[Dict[str, Any]]:
+        for theme in themes:
+            theme = dict(fragments.expand_theme(theme))
+            name = theme.get("image_path") or ""
+            if fmt == "zip":
+                source = images_dir / name if images_dir and name else None
+                if source is not None and source.is_file():
+                    if name not in images:
+                        images[name] = f"{BUNDLE_IMAGES}{_file_sha1(source)}{source.suffix.lower()}"
+                    theme["image_path"] = images[name]
+                else:
+                    theme["image_path"] = ""
+            yield theme
+
+    with _atomic_output(path) as out:
+        if fmt == "zip":
+            with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as zf:
+                with zf.open(BUNDLE_THEMES, 'w', force_zip64=True) as raw:
+                    text = io.TextIOWrapper(raw, encoding='utf-8')
+                    count = _write_records(text, "jsonl", prepared(), progress, total)
+                    text.flush()
+                    text.detach()
+                written = set()
+                for name, member in images.items():
+                    if member not in written:
+                        # PNG/JPEG уже сжаты
+                        zf.write(images_dir / name, member, compress_type=zipfile.ZIP_STORED)
+                        written.add(member)
+        else:
+            text = io.TextIOWrapper(out, encoding='utf-8', newline='' if fmt == "csv" else None)
+            count = _write_records(text, fmt, prepared(), progress, total)
+            text.flush()
+            text.detach()
+    if progress:
+        progress(count, total or count)
+    logger.info(f"Экспортировано {count} шаблонов в {path}")
+    return count
@@ -0,0 +1,318 @@
+"""
+Library watcher for PromptGenie
+Hot reload of theme_prompts.json and keyword_library.json with structural diffs
+"""
+
+import hashlib
+import json
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from PyQt6.QtCore import QFileSystemWatcher, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+from theme_index import ID_FIELD
+
+logger = logging.getLogger(__name__)
+
+# ID шаблона или (категория, название, номер среди шаблонов с тем же названием)
+ThemeKey = Union[str, Tuple[str, str, int]]
+
+
+def theme_keys(themes: Iterable[Dict[str, Any]]) -> Iterator[ThemeKey]:
+    """Keys that identify themes across reloads, in list order.
+
+    A theme is identified by its ID. Themes written without one (by hand or
+    by an older version) fall back to category and title; duplicates are
+    told apart by their order.
+    """
+    seen: Counter = Counter()
+    for theme in themes:
+        theme_id = theme.get(ID_FIELD)
+        if theme_id:
+            yield theme_id
+            continue
+        name = (theme.get("category") or "", theme.get("title_ru") or "")
+        yield name + (seen[name],)
+        seen[name] += 1
+
+
+def content_digest(theme: Dict[str, Any]) -> str:
+    """Hash of all fields of an (expanded) theme except its ID."""
+    if ID_FIELD in theme:
+        theme = {key: value for key, value in theme.items() if key != ID_FIELD}
+    data = json.dumps(theme, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class ThemeDiff:
+    """Changes between two versions of the theme library.
+
+    ``changed`` and ``removed`` carry the digest the theme had in the
+    previous version, so the caller can tell whether its own copy was
+    edited locally in the meantime. ``digests`` is the digest map of the
+    new version (the baseline for the next diff). ``local`` maps the keys
+    of all three lists to ``(row, theme)`` in the caller's list at the time
+    of the diff (see :meth:`LibraryWatcher`), so rows are not searched on
+    the GUI thread.
+    """
+    __slots__ = ("added", "removed", "changed", "digests", "local", "external", "fragments",
+                 "seq", "signature")
+
+    def __init__(self, digests: Dict[ThemeKey, str]):
+        self.added: List[Tuple[ThemeKey, Dict[str, Any]]] = []
+        self.removed: List[Tuple[ThemeKey, str]] = []
+        self.changed: List[Tuple[ThemeKey, str, Dict[str, Any]]] = []
+        self.digests = digests
+        self.local: Dict[ThemeKey, Tuple[int, Dict[str, Any]]] = {}
+        # False, если файл записало само хранилище (только новая база для сравнения)
+        self.external = True
+        # Заполняются при чтении файла, см. ThemeStore.adopt_snapshot
+        self.fragments = None
+        self.seq = 0
+        self.signature = None
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self):
+        return (f"ThemeDiff(+{len(self.added)} -{len(self.removed)} "
+                f"~{len(self.changed)})")
+
+
+def diff_themes(baseline: Dict[ThemeKey, str], themes: List[Dict[str, Any]]) -> ThemeDiff:
+    """Compare ``themes`` with the digests of the previous version."""
+    digests: Dict[ThemeKey, str] = {}
+    diff = ThemeDiff(digests)
+    for key, theme in zip(theme_keys(themes), themes):
+        digest = digests[key] = content_digest(theme)
+        old = baseline.get(key)
+        if old is None:
+            diff.added.append((key, theme))
+        elif old != digest:
+            diff.changed.append((key, old, theme))
+    diff.removed = [(key, old) for key, old in baseline.items() if key not in digests]
+    return diff
+
+
+class KeywordDiff:
+    """Categories added, removed or changed between two keyword libraries."""
+    __slots__ = ("keywords", "added", "removed", "changed")
+
+    def __init__(self, keywords: Dict[str, List[dict]], added: List[str],
+                 removed: List[str], changed: List[str]):
+        self.keywords = keywords
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self):
+        return (f"KeywordDiff(+{len(self.added)} -{len(self.removed)} "
+                f"~{len(self.changed)})")
+
+
+def diff_keywords(old: Dict[str, List[dict]], new: Dict[str, List[dict]]) -> KeywordDiff:
+    """Compare two ``keywords`` mappings category by category."""
+    return KeywordDiff(
+        new,
+        added=[name for name in new if name not in old],
+        removed=[name for name in old if name not in new],
+        changed=[name for name, items in new.items() if name in old and old[name] != items],
+    )
+
+
+class _ReloadSignals(QObject):
+    done = pyqtSignal(str, object)  # путь, ThemeDiff | KeywordDiff
+    failed = pyqtSignal(str, str)
+
+
+class _ReloadTask(QRunnable):
+    def __init__(self, signals: _ReloadSignals, path: str, func, args):
+        super().__init__()
+        self._signals = signals
+        self._path = path
+        self._func = func
+        self._args = args
+
+    def run(self):
+        try:
+            result = self._func(self._args)
+        except Exception as e:
+            logger.error(f"Ошибка перезагрузки {self._path}: {e}", exc_info=True)
+            self._signals.failed.emit(self._path, str(e))
+            return
+        self._signals.done.emit(self._path, result)
+
+
+class LibraryWatcher(QObject):
+    """Watches the theme snapshot and the keyword library for external edits.
+
+    Changes are debounced by ``delay_ms`` (editors often write a file in
+    several steps or replace it), then the file is parsed and diffed
+    against the previous version on a pool thread. ``themes_changed``
+    delivers a :class:`ThemeDiff` whose themes are already compressed with
+    the store's fragment table; ``keywords_changed`` a :class:`KeywordDiff`.
+    ``themes_snapshot`` is called on the GUI thread and returns a copy of
+    the list the diff will be applied to.
+    Writes made by the store itself are ignored (see
+    :meth:`theme_storage.ThemeStore.changed_on_disk`). With ``watch_themes``
+    off only the keyword library is watched (a shared library is synced
+    through its journal instead).
+    """
+    themes_changed = pyqtSignal(object)
+    keywords_changed = pyqtSignal(object)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, theme_store, keywords_path: Path,
+                 themes_snapshot: Callable[[], List[Dict[str, Any]]], delay_ms: int = 500,
+                 parent=None, watch_themes: bool = True):
+        super().__init__(parent)
+        self.store = theme_store
+        self._themes_snapshot = themes_snapshot
+        self.themes_path = str(Path(theme_store.path).resolve())
+        self.keywords_path = str(Path(keywords_path).resolve())
+        self._paths = [self.keywords_path]
+        if watch_themes:
+            self._paths.insert(0, self.themes_path)
+        self._theme_digests: Optional[Dict[ThemeKey, str]] = None
+        self._keywords: Optional[Dict[str, List[dict]]] = None
+        self._running = set()
+        self._dirty = set()
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+
+        self._signals = _ReloadSignals(self)
+        self._signals.done.connect(self._on_done)
+        self._signals.failed.connect(self._on_failed)
+
+        self._timers: Dict[str, QTimer] = {}
+        for path in self._paths:
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.setInterval(delay_ms)
+            timer.timeout.connect(lambda path=path: self._reload(path))
+            self._timers[path] = timer
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self._schedule)
+        # Замена файла через rename снимает наблюдение с пути — следим и за папками
+        self._watcher.directoryChanged.connect(self._directory_changed)
+
+    def start(self) -> None:
+        """Start watching; the theme baseline is read from disk in the background."""
+        paths = [p for p in self._paths if Path(p).exists()]
+        dirs = {str(Path(p).parent) for p in self._paths}
+        for path in paths + sorted(dirs):
+            if path not in self._watcher.files() + self._watcher.directories():
+                self._watcher.addPath(path)
+        if self._theme_digests is None and self.themes_path in self._timers \
+                and Path(self.themes_path).exists():
+            self._run(self.themes_path, self._read_themes, None)
+
+    def stop(self) -> None:
+        paths = self._watcher.files() + self._watcher.directories()
+        if paths:
+            self._watcher.removePaths(paths)
+        for timer in self._timers.values():
+            timer.stop()
+        self._pool.clear()
+        self._pool.waitForDone(2000)
+
+    def set_keywords(self, keywords: Dict[str, List[dict]]) -> None:
+        """Baseline for keyword diffs: the library the GUI has just loaded."""
+        self._keywords = keywords
+
+    def _schedule(self, path: str) -> None:
+        timer = self._timers.get(path)
+        if timer is not None:
+            timer.start()
+
+    def _directory_changed(self, directory: str) -> None:
+        watched = self._watcher.files()
+        for path in self._timers:
+            if str(Path(path).parent) == directory and Path(path).exists():
+                if path not in watched:
+                    self._watcher.addPath(path)
+                    self._schedule(path)
+
+    def _reload(self, path: str) -> None:
+        if path in self._running:
+            # Повторим после завершения текущей перезагрузки
+            self._dirty.add(path)
+            return
+        if path not in self._watcher.files() and Path(path).exists():
+            self._watcher.addPath(path)
+        if path == self.themes_path:
+            if self._theme_digests is not None:
+                self._run(path, self._read_themes,
+                          (self._theme_digests, self._themes_snapshot()))
+        elif self._keywords is not None:
+            self._run(path, self._read_keywords, self._keywords)
+
+    def _run(self, path: str, func, args) -> None:
+        self._running.add(path)
+        self._pool.start(_ReloadTask(self._signals, path, func, args))
+
+    # Выполняются в пуле потоков
+
+    def _read_themes(self, args) -> ThemeDiff:
+        baseline, local = args or (None, None)
+        external = baseline is not None and self.store.changed_on_disk()
+        themes, fragments, seq, signature = self.store.read_snapshot()
+        if not external:
+            diff = ThemeDiff({key: content_digest(fragments.expand_theme(theme))
+                              for key, theme in zip(theme_keys(themes), themes)})
+            diff.external = False
+            return diff
+        for theme in themes:
+            theme.setdefault("image_path", "")
+        diff = diff_themes(baseline, [fragments.expand_theme(theme) for theme in themes])
+        # В памяти промпты хранятся с фрагментами из таблицы хранилища
+        compress = self.store.fragments.compress_theme
+        diff.added = [(key, compress(theme)) for key, theme in diff.added]
+        diff.changed = [(key, old, compress(theme)) for key, old, theme in diff.changed]
+        diff.fragments, diff.seq, diff.signature = fragments, seq, signature
+        wanted = {key for key, _ in diff.added}
+        wanted.update(key for key, _ in diff.removed)
+        wanted.update(key for key, _, _ in diff.changed)
+        if wanted:
+            diff.local = {key: (row, theme)
+                          for row, (key, theme) in enumerate(zip(theme_keys(local), local))
+                          if key in wanted}
+        return diff
+
+    def _read_keywords(self, baseline: Dict[str, List[dict]]) -> KeywordDiff:
+        with open(self.keywords_path, 'r', encoding='utf-8') as f:
+            keywords = json.load(f).get('keywords', {})
+        return diff_keywords(baseline, keywords)
+
+    # GUI-поток
+
+    def _on_done(self, path: str, result) -> None:
+        self._running.discard(path)
+        if path == self.themes_path:
+            self._theme_digests = result.digests
+            if result.external:
+                logger.info(f"{Path(path).name} изменён: {result}")
+                self.themes_changed.emit(result)
+        else:
+            self._keywords = result.keywords
+            if result:
+                logger.info(f"{Path(path).name} изменён: {result}")
+                self.keywords_changed.emit(result)
+        self._rerun(path)
+
+    def _on_failed(self, path: str, message: str) -> None:
+        self._running.discard(path)
+        # Файл мог быть записан не полностью — дождёмся следующего изменения
+        self.failed.emit(path, message)
+        self._rerun(path)
+
+    def _rerun(self, path: str) -> None:
+        if path in self._dirty:
+            self._dirty.discard(path)
+            self._reload(path)
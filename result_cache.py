@@ -0,0 +1,194 @@
+"""
+Result cache for PromptGenie
+Content-addressed store of generated images keyed by prompt and generation parameters
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from engine.tokens import canonicalize
+from utils import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "index.json"
+
+
+def result_key(service: str, prompt: str, negative: str = "", **params: Any) -> str:
+    """Cache key of one generation request.
+
+    Prompts are canonicalized (whitespace, duplicates, SD weights), so
+    cosmetic differences hit the same entry. ``params`` are the generation
+    settings (width, height, steps, ...).
+    """
+    payload = {
+        "service": service,
+        "prompt": canonicalize(prompt),
+        "negative": canonicalize(negative),
+        "params": params,
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Generated images stored once per content hash under ``root``.
+
+    ``blobs/<aa>/<sha256>.png`` holds the image data; ``index.json`` maps
+    request keys (:func:`result_key`) to blob digests with a last-use time.
+    Identical images produced by different requests share one blob. When
+    the blobs exceed ``max_bytes`` the least recently used entries are
+    evicted and unreferenced blobs deleted. Safe to use from worker threads.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = 512 * 1024 * 1024):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / INDEX_NAME
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._sizes: Dict[str, int] = {}
+        self._refs: Dict[str, int] = {}
+        self._bytes = 0
+        self._load()
+
+    def _load(self) -> None:
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f).get("entries", {})
+            except (OSError, ValueError) as e:
+                logger.error(f"Ошибка чтения индекса кэша {self.index_path}: {e}")
+                self._entries = {}
+        for key, entry in list(self._entries.items()):
+            blobs = entry.get("blobs") or []
+            if not all(self._blob_size(digest) is not None for digest in blobs):
+                # Файл удалён вручную — запись бесполезна
+                del self._entries[key]
+                continue
+            for digest in blobs:
+                self._ref(digest)
+
+    def _blob_size(self, digest: str) -> Optional[int]:
+        size = self._sizes.get(digest)
+        if size is None:
+            try:
+                size = self._sizes[digest] = self.blob_path(digest).stat().st_size
+            except OSError:
+                return None
+        return size
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / f"{digest}.png"
+
+    @property
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: str) -> Optional[List[Path]]:
+        """Paths of the cached images for ``key``, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry["used"] = time.time()
+            return [self.blob_path(digest) for digest in entry["blobs"]]
+
+    def put(self, key: str, images: List[bytes]) -> List[Path]:
+        """Store ``images`` under ``key`` and return their blob paths."""
+        digests = [hashlib.sha256(data).hexdigest() for data in images]
+        # Запись файлов — вне блокировки, имена определяются содержимым
+        for digest, data in zip(digests, images):
+            path = self.blob_path(digest)
+            if not path.exists():
+                path.parent.mkdir(exist_ok=True)
+                tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+        with self._lock:
+            # Сначала новые ссылки: при той же картинке старая запись не удалит общий файл
+            for digest, data in zip(digests, images):
+                self._sizes[digest] = len(data)
+                self._ref(digest)
+            old = self._entries.get(key)
+            if old is not None:
+                self._release(old["blobs"])
+            for digest, data in zip(digests, images):
+                path = self.blob_path(digest)
+                if not path.exists():
+                    # Файл удалили между записью и блокировкой (вытеснение в другом потоке)
+                    path.parent.mkdir(exist_ok=True)
+                    path.write_bytes(data)
+            now = time.time()
+            self._entries[key] = {"blobs": digests, "created": now, "used": now}
+            self._evict(keep=key)
+            self._save()
+        return [self.blob_path(digest) for digest in digests]
+
+    def flush(self) -> None:
+        """Persist last-use times updated by :meth:`get`."""
+        with self._lock:
+            self._save()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "blobs": len(self._refs),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def _ref(self, digest: str) -> None:
+        refs = self._refs.get(digest, 0)
+        if not refs:
+            self._bytes += self._sizes[digest]
+        self._refs[digest] = refs + 1
+
+    def _release(self, digests: List[str]) -> None:
+        for digest in digests:
+            refs = self._refs.get(digest, 0) - 1
+            if refs > 0:
+                self._refs[digest] = refs
+                continue
+            self._refs.pop(digest, None)
+            self._bytes -= self._sizes.pop(digest, 0)
+            try:
+                self.blob_path(digest).unlink()
+            except OSError:
+                pass
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        if self._bytes <= self.max_bytes:
+            return
+        for key in sorted(self._entries, key=lambda k: self._entries[k].get("used", 0)):
+            if self._bytes <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self._release(self._entries.pop(key)["blobs"])
+            self.evictions += 1
+        logger.debug(f"Кэш результатов: {self._bytes} байт после вытеснения")
+
+    def _save(self) -> None:
+        try:
+            atomic_write_json(self.index_path, {"entries": self._entries})
+        except OSError as e:
+            logger.error(f"Ошибка записи индекса кэша {self.index_path}: {e}")
@@ -0,0 +1,140 @@
+"""
+Search scheduler for PromptGenie
+Debounces search box input and runs queries on a QThreadPool worker
+"""
+
+import logging
+import time
+from typing import Any, Callable, Optional
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+logger = logging.getLogger(__name__)
+
+
+class VisibilityBitmap:
+    """Packed per-row visibility flags produced by a search query."""
+    __slots__ = ("size", "_bits")
+
+    def __init__(self, size: int):
+        self.size = size
+        self._bits = bytearray((size + 7) // 8)
+
+    def set(self, row: int, visible: bool = True):
+        if visible:
+            self._bits[row >> 3] |= 1 << (row & 7)
+        else:
+            self._bits[row >> 3] &= ~(1 << (row & 7)) & 0xFF
+
+    def __getitem__(self, row: int) -> bool:
+        if not 0 <= row < self.size:
+            # Строки, появившиеся после запроса, не скрываем до следующего результата
+            return True
+        return bool(self._bits[row >> 3] & (1 << (row & 7)))
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class _SearchSignals(QObject):
+    finished = pyqtSignal(int, object, float)
+
+
+class _SearchTask(QRunnable):
+    """Worker that runs a single query unless it became stale."""
+
+    def __init__(self, signals: _SearchSignals, generation: int, query: str, context: Any,
+                 func: Callable, is_stale: Callable[[int], bool]):
+        super().__init__()
+        self._signals = signals
+        self._generation = generation
+        self._query = query
+        self._context = context
+        self._func = func
+        self._is_stale = is_stale
+
+    def run(self):
+        if self._is_stale(self._generation):
+            return
+        started = time.perf_counter()
+        try:
+            result = self._func(self._query, self._context,
+                                lambda: self._is_stale(self._generation))
+        except Exception as e:
+            logger.error(f"Ошибка при выполнении поиска: {e}", exc_info=True)
+            return
+        if self._is_stale(self._generation):
+            return
+        self._signals.finished.emit(self._generation, result,
+                                    (time.perf_counter() - started) * 1000.0)
+
+
+class SearchScheduler(QObject):
+    """Coalesces keystrokes and runs the query function off the GUI thread.
+
+    ``query_func(query, context, is_cancelled)`` is called on a pool thread
+    and returns what ``results_ready`` delivers: a :class:`VisibilityBitmap`
+    over the rows it was given, or matches keyed by ID (None means "show all").
+    It may poll ``is_cancelled()`` and return early; results of outdated
+    queries are never delivered.
+    """
+    results_ready = pyqtSignal(object)
+    latency_measured = pyqtSignal(float)
+
+    def __init__(self, query_func: Callable, debounce_ms: int = 150,
+                 pool: Optional[QThreadPool] = None, parent=None):
+        super().__init__(parent)
+        self._query_func = query_func
+        self._pool = pool or QThreadPool.globalInstance()
+        self._generation = 0
+        self._query = ""
+        self._context = None
+        self.last_latency_ms = 0.0
+
+        self._signals = _SearchSignals(self)
+        self._signals.finished.connect(self._on_finished)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._start)
+        self.set_debounce(debounce_ms)
+
+    def set_debounce(self, debounce_ms: int):
+        self._timer.setInterval(max(0, int(debounce_ms)))
+
+    def schedule(self, query: str, context: Any = None):
+        """Queue a query; earlier pending or running queries become stale."""
+        self._query = query
+        self._context = context
+        self._generation += 1
+        self._timer.start()
+
+    def flush(self, query: Optional[str] = None, context: Any = None):
+        """Run the pending (or given) query right away, skipping the debounce."""
+        if query is not None:
+            self._query = query
+            self._context = context
+            self._generation += 1
+        self._timer.stop()
+        self._start()
+
+    def cancel(self):
+        """Drop the pending query and ignore any result still in flight."""
+        self._timer.stop()
+        self._generation += 1
+
+    def _is_stale(self, generation: int) -> bool:
+        return generation != self._generation
+
+    def _start(self):
+        task = _SearchTask(self._signals, self._generation, self._query, self._context,
+                           self._query_func, self._is_stale)
+        self._pool.start(task)
+
+    def _on_finished(self, generation: int, result, elapsed_ms: float):
+        if self._is_stale(generation):
+            return
+        self.last_latency_ms = elapsed_ms
+        logger.debug(f"Поиск '{self._query}' выполнен за {elapsed_ms:.2f} мс")
+        self.latency_measured.emit(elapsed_ms)
+        self.results_ready.emit(result)
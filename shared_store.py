@@ -0,0 +1,397 @@
+"""
+Shared theme store for PromptGenie
+Theme library written by several PromptGenie processes: file locks, ETags and journal sync
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from theme_index import ID_FIELD, ThemeIndex, new_theme_id
+from theme_storage import ThemeStore
+from utils import FileLock
+
+logger = logging.getLogger(__name__)
+
+# Операция над списком шаблонов: ("add" | "update" | "delete" | "reload", строка, шаблон)
+ThemeOp = Tuple[str, int, Optional[Dict[str, Any]]]
+
+# (st_dev, st_ino, размер, mtime_ns) журнала
+JournalState = Tuple[int, int, int, int]
+
+
+def theme_etag(theme: Dict[str, Any]) -> str:
+    """Content hash of a theme as stored in the journal."""
+    data = json.dumps(theme, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def apply_op(themes: List[Dict[str, Any]], op: str, row: int,
+             theme: Optional[Dict[str, Any]], index: Optional[ThemeIndex] = None) -> None:
+    """Apply a :data:`ThemeOp` to a plain list (the GUI goes through its model).
+
+    ``index`` is notified of the change if given.
+    """
+    if op == "add":
+        themes.append(theme)
+        if index is not None:
+            index.add(theme, len(themes) - 1)
+    elif op == "update":
+        old, themes[row] = themes[row], theme
+        if index is not None:
+            index.replace(row, old, theme)
+    elif op == "delete":
+        old = themes.pop(row)
+        if index is not None:
+            index.remove(old, row)
+
+
+class ThemeConflict(Exception):
+    """Another instance changed or deleted the theme first; nothing was written.
+
+    ``theme`` is a copy of the local version, ``remote`` the journal entry
+    that won.
+    """
+
+    def __init__(self, op: str, theme: Optional[Dict[str, Any]],
+                 remote: Optional[Dict[str, Any]]):
+        title = (theme or {}).get("title_ru", "")
+        super().__init__(f"Шаблон '{title}' изменён другим экземпляром PromptGenie")
+        self.op = op
+        self.theme = theme
+        self.remote = remote
+
+
+class SharedThemeStore(ThemeStore):
+    """:class:`ThemeStore` for a library shared by several processes.
+
+    All instances append to the same journal while holding an advisory
+    lock on ``<snapshot>.lock``. Every entry records the ETag (content
+    hash) of the theme version it replaces or deletes and the instance
+    that wrote it. A write whose theme was changed by an entry this
+    instance has not applied yet raises :class:`ThemeConflict` (first
+    writer wins); edits of different themes merge. Themes are found by
+    their stable ID through :attr:`index`, not by row, so the instances may
+    order new themes differently.
+
+    :meth:`poll` delivers entries written by other instances. Whether there
+    is anything to read is decided from the journal's size, mtime and inode
+    against the offset already read, without opening the file. Compaction
+    only runs when this instance has applied the whole journal; the new
+    journal starts with a ``compacted`` marker carrying the folded
+    sequence number, so others notice if they missed entries.
+    """
+
+    def __init__(self, path: Path, journal_path: Optional[Path] = None,
+                 compact_threshold: int = 200, lock_timeout: float = 10.0):
+        super().__init__(path, journal_path, compact_threshold)
+        self.origin = uuid.uuid4().hex
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.lock_timeout = lock_timeout
+        # ID шаблона → ETag версии, которую видел этот экземпляр
+        self._etags: Dict[str, str] = {}
+        self._offset = 0
+        self._state: Optional[JournalState] = None
+        # Последняя прочитанная строка журнала: inode заменённого файла может
+        # достаться новому, поэтому продолжение чтения сверяется по ней
+        self._tail = b""
+
+    def _file_lock(self) -> FileLock:
+        return FileLock(self.lock_path, self.lock_timeout)
+
+    def load(self) -> List[Dict[str, Any]]:
+        with self._file_lock():
+            self._etags = {}
+            themes = super().load()
+            self._state = self._journal_state()
+            self._offset = self._state[2] if self._state else 0
+            self._tail = self._last_line()
+        for theme in themes:
+            self._etag(theme)
+        return themes
+
+    def append(self, theme: Dict[str, Any]) -> None:
+        self.extend([theme])
+
+    def extend(self, themes: List[Dict[str, Any]]) -> None:
+        """Record several appended themes under one lock."""
+        for theme in themes:
+            theme.setdefault(ID_FIELD, new_theme_id())
+        self._commit([({"op": "add", "theme": theme}, theme) for theme in themes])
+
+    def update(self, index: int, theme: Dict[str, Any]) -> None:
+        theme_id = theme.get(ID_FIELD)
+        self._commit([({"op": "update", "id": theme_id, "index": index,
+                        "etag": self._etags.get(theme_id), "theme": theme}, theme)])
+
+    def remove(self, index: int, theme: Optional[Dict[str, Any]] = None) -> None:
+        theme_id = (theme or {}).get(ID_FIELD)
+        self._commit([({"op": "delete", "id": theme_id, "index": index,
+                        "etag": self._etags.get(theme_id)}, theme)])
+
+    def poll(self, themes: List[Dict[str, Any]]) -> Iterator[ThemeOp]:
+        """Changes written by other instances since the last call.
+
+        ``themes`` is the caller's list. Each op must be applied to it
+        before the next one is requested, since rows are resolved against
+        the updated list, and the iterator must be consumed to the end.
+        Rows are looked up in :attr:`index`; the caller keeps it current
+        (the window's model does, see :func:`apply_op` for plain lists).
+        ``("reload", -1, None)`` means entries were folded into the
+        snapshot before this instance read them: reload the library.
+        """
+        state = self._journal_state()
+        if state is not None and state == self._state:
+            return
+        if state is None and self._state is None and not self.changed_on_disk():
+            return
+        with self._file_lock():
+            entries = self._read_new()
+            if entries is not None:
+                self._state = self._journal_state()
+        if entries is None:
+            yield "reload", -1, None
+            return
+        for entry in entries:
+            seq = entry.get("seq", 0)
+            # Маркер свёртки: за ним идут сохранённые записи с меньшими номерами
+            if seq <= self._seq or entry.get("op") == "compacted":
+                continue
+            self._seq = seq
+            self._pending += 1
+            if entry.get("origin") == self.origin:
+                continue
+            yield from self._entry_ops(themes, entry)
+
+    def compact(self, themes: List[Dict[str, Any]], wait: bool = False) -> None:
+        """Like :meth:`ThemeStore.compact`, skipped while other writes are unapplied."""
+        with self._lock:
+            snapshot = [dict(theme) for theme in themes]
+            seq, state = self._seq, self._state
+
+        def run():
+            try:
+                with self._file_lock():
+                    if self._journal_state() != state:
+                        logger.info("Shared library changed, journal compaction postponed")
+                        return
+                    self._write_snapshot(snapshot, seq)
+            except Exception as e:
+                logger.error(f"Error compacting shared theme journal: {e}", exc_info=True)
+                if wait:
+                    raise
+
+        if self._compactor is not None and self._compactor.is_alive():
+            self._compactor.join()
+        if wait:
+            run()
+            return
+        self._compactor = threading.Thread(target=run, name="ThemeStoreCompactor", daemon=True)
+        self._compactor.start()
+
+    # Внутреннее
+
+    def _etag(self, theme: Dict[str, Any]) -> str:
+        theme_id = theme.get(ID_FIELD)
+        etag = self._etags.get(theme_id)
+        if etag is None:
+            etag = theme_etag(theme)
+            if theme_id:
+                self._etags[theme_id] = etag
+        return etag
+
+    def _resolve(self, themes: List[Dict[str, Any]], entry: Dict[str, Any]) -> int:
+        if self.index.themes is not themes:
+            self.index = ThemeIndex(themes)
+        if entry.get("id"):
+            return self.index.row_of(entry["id"])
+        # Запись без ID: строка, если там та же версия шаблона, иначе поиск по ETag
+        index, etag = entry.get("index", -1), entry.get("etag")
+        if 0 <= index < len(themes) and (etag is None or self._etag(themes[index]) == etag):
+            return index
+        if etag is None:
+            return -1
+        for row, theme in enumerate(themes):
+            if self._etag(theme) == etag:
+                return row
+        return -1
+
+    def _entry_ops(self, themes: List[Dict[str, Any]], entry: Dict[str, Any]) -> Iterator[ThemeOp]:
+        op, theme = entry.get("op"), entry.get("theme")
+        if op == "add":
+            yield "add", -1, theme
+            self._etag(theme)
+        elif op in ("update", "delete"):
+            row = self._resolve(themes, entry)
+            if op == "delete":
+                if row >= 0:
+                    self._etags.pop(themes[row].get(ID_FIELD), None)
+                    yield "delete", row, themes[row]
+            elif row < 0:
+                # Удалён здесь, но раньше изменён в другом экземпляре — побеждает изменение
+                yield "add", -1, theme
+                self._etag(theme)
+            else:
+                self._etags.pop(themes[row].get(ID_FIELD), None)
+                if ID_FIELD not in theme and themes[row].get(ID_FIELD):
+                    theme[ID_FIELD] = themes[row][ID_FIELD]
+                yield "update", row, theme
+                self._etag(theme)
+
+    def _apply(self, themes: List[Dict[str, Any]], entry: Dict[str, Any]) -> bool:
+        if entry.get("op") == "compacted":
+            return True
+        if entry.get("op") not in ("add", "update", "delete"):
+            return False
+        for op, row, theme in self._entry_ops(themes, entry):
+            apply_op(themes, op, row, theme, self.index)
+        return True
+
+    def _journal_state(self) -> Optional[JournalState]:
+        try:
+            st = os.stat(self.journal_path)
+        except OSError:
+            return None
+        return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _read_new(self) -> Optional[List[Dict[str, Any]]]:
+        """Journal entries after the applied offset; None if some were folded away.
+
+        Called with the file lock held.
+        """
+        state = self._journal_state()
+        if state is None:
+            # Журнал удалён без маркера — неизвестно, что попало в снимок
+            return None if self.changed_on_disk() else []
+        start = self._offset
+        with open(self.journal_path, 'rb') as f:
+            replaced = self._state is None or state[:2] != self._state[:2] or state[2] < start
+            if not replaced and start:
+                f.seek(start - len(self._tail))
+                replaced = f.read(len(self._tail)) != self._tail
+            if replaced:
+                start = 0
+            f.seek(start)
+            data = f.read()
+        # Запись всегда дописывается целиком под блокировкой, но обрезок не читаем
+        data = data[:data.rfind(b"\n") + 1]
+        entries = []
+        for line in data.splitlines():
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping damaged line in {self.journal_path}")
+        if replaced:
+            if entries and entries[0].get("op") == "compacted":
+                folded = entries[0].get("seq", 0)
+                first = min((e.get("seq", 0) for e in entries[1:]), default=folded + 1)
+                if self._seq < folded and self._seq < first - 1:
+                    return None
+                # Другой экземпляр свернул журнал, всё свёрнутое здесь уже применено
+                self._signature = self.snapshot_signature()
+                self._pending = 0
+            elif self.changed_on_disk():
+                return None
+        self._offset = start + len(data)
+        if data:
+            self._tail = data[data.rfind(b"\n", 0, -1) + 1:]
+        elif replaced:
+            self._tail = b""
+        return entries
+
+    def _commit(self, items: List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]) -> None:
+        with self._file_lock():
+            new = self._read_unapplied()
+            unread = [e for e in new if e.get("origin") != self.origin]
+            for entry, theme in items:
+                self._check_conflict(entry, theme, unread)
+            # Свои ещё не прочитанные записи тоже занимают номера
+            seq = max([self._seq] + [e.get("seq", 0) for e in new])
+            lines = []
+            for entry, _ in items:
+                seq += 1
+                lines.append(json.dumps({"seq": seq, "origin": self.origin, **entry},
+                                        ensure_ascii=False, separators=(',', ':')) + "\n")
+            with self._lock:
+                with open(self.journal_path, 'a', encoding='utf-8', newline='\n') as f:
+                    f.writelines(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                if not unread:
+                    # Чужих записей нет — свои сразу считаются применёнными
+                    self._seq = seq
+                    self._pending += len(new) + len(lines)
+                    self._state = self._journal_state()
+                    self._offset = self._state[2]
+                    self._tail = lines[-1].encode("utf-8")
+        for entry, theme in items:
+            if entry["op"] == "delete":
+                self._etags.pop(entry.get("id"), None)
+            elif theme.get(ID_FIELD):
+                self._etags[theme[ID_FIELD]] = theme_etag(theme)
+
+    def _read_unapplied(self) -> List[Dict[str, Any]]:
+        """Journal entries not applied yet, without consuming them."""
+        offset, state, pending, tail = self._offset, self._state, self._pending, self._tail
+        try:
+            entries = self._read_new()
+        finally:
+            self._offset, self._state, self._pending, self._tail = offset, state, pending, tail
+        if entries is None:
+            raise ThemeConflict("reload", None, None)
+        return [e for e in entries if e.get("seq", 0) > self._seq and e.get("op") != "compacted"]
+
+    def _check_conflict(self, entry: Dict[str, Any], theme: Optional[Dict[str, Any]],
+                        unread: List[Dict[str, Any]]) -> None:
+        if entry["op"] == "add":
+            return
+        theme_id, etag = entry.get("id"), entry.get("etag")
+        for remote in unread:
+            if remote.get("op") not in ("update", "delete"):
+                continue
+            if theme_id and remote.get("id"):
+                if remote["id"] != theme_id:
+                    continue
+            elif etag is None or remote.get("etag") != etag:
+                continue
+            if entry["op"] == "delete" and remote["op"] == "delete":
+                continue
+            raise ThemeConflict(entry["op"], dict(theme) if theme is not None else None, remote)
+
+    def _truncate_journal(self, seq: int) -> None:
+        """Start a new journal with a ``compacted`` marker (called under both locks).
+
+        The last ``compact_threshold`` folded entries are kept after the
+        marker, so instances that are slightly behind can still catch up
+        without reloading the snapshot.
+        """
+        keep = []
+        if self.journal_path.exists():
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if entry.get("op") != "compacted" and \
+                            entry.get("seq", 0) > seq - self.compact_threshold:
+                        keep.append(line)
+        marker = json.dumps({"seq": seq, "op": "compacted", "origin": self.origin}) + "\n"
+        self._rewrite_journal([marker] + keep)
+        self._pending = 0
+        self._state = self._journal_state()
+        self._offset = self._state[2]
+        self._tail = (keep[-1] if keep else marker).encode("utf-8")
+
+    def _last_line(self) -> bytes:
+        if self._offset == 0:
+            return b""
+        with open(self.journal_path, 'rb') as f:
+            f.seek(max(0, self._offset - 65536))
+            data = f.read(self._offset - f.tell())
+        return data[data.rfind(b"\n", 0, -1) + 1:]
@@ -0,0 +1,414 @@
+"""
+SQLite storage backend for PromptGenie
+Themes, categories, keywords and images in one database with FTS5 search
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from engine.fragments import FragmentTable, migrate_themes
+from template_search import normalize_text, tokenize
+from theme_index import ID_FIELD, ThemeIndex, assign_theme_ids, new_theme_id
+from utils import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+# Поля шаблона, у которых есть собственные столбцы; остальное хранится в extra
+THEME_FIELDS = ("category", "title_ru", "description_ru", "prompt_combined_en", "image_path")
+KEYWORD_FIELDS = ("word", "translate", "effect", "when")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (kind, name)
+);
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS themes (
+    id INTEGER PRIMARY KEY,
+    uid TEXT,
+    position INTEGER NOT NULL,
+    category_id INTEGER REFERENCES categories(id),
+    title_ru TEXT,
+    description_ru TEXT,
+    prompt_combined_en TEXT,
+    image_id INTEGER REFERENCES images(id),
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_themes_position ON themes(position);
+CREATE INDEX IF NOT EXISTS idx_themes_category ON themes(category_id);
+CREATE TABLE IF NOT EXISTS keywords (
+    id INTEGER PRIMARY KEY,
+    category_id INTEGER NOT NULL REFERENCES categories(id),
+    position INTEGER NOT NULL,
+    word TEXT,
+    translate TEXT,
+    effect TEXT,
+    "when" TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_keywords_category ON keywords(category_id, position);
+CREATE VIRTUAL TABLE IF NOT EXISTS themes_fts USING fts5(
+    title_ru, description_ru, prompt_combined_en, category,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS fragments (
+    name TEXT PRIMARY KEY,
+    text TEXT NOT NULL
+);
+"""
+
+
+class SQLiteStore:
+    """Optional storage backend with the same interface as ``ThemeStore``.
+
+    ``load``/``append``/``update``/``remove``/``compact``/``close`` mirror the
+    journal store so the window can use either one. Besides that the store can
+    be queried without materialising the library: :meth:`count`,
+    :meth:`get`, :meth:`iter_themes`, :meth:`themes_in_category` and the FTS5
+    backed :meth:`search`.
+
+    Full-text columns hold text normalized with
+    :func:`template_search.normalize_text`, because the unicode61 tokenizer
+    does not fold "ё" into "е". Prompts are stored with ``{{fragment}}``
+    placeholders (table ``fragments``) and indexed expanded.
+
+    The stable theme ID (``id`` of the theme dict) is the ``uid`` column
+    with a unique index, so edits and deletes find their row directly.
+
+    :attr:`conn` is a connection of the calling thread: the theme loader
+    thread and the GUI (e.g. ``load_keywords``) run at the same time, and
+    in WAL mode their reads do not block each other.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate_uids()
+        self.index = ThemeIndex()
+        self.fragments = FragmentTable(dict(
+            self.conn.execute("SELECT name, text FROM fragments").fetchall()
+        ))
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Каждый поток работает только со своим соединением; check_same_thread
+            # снят лишь для того, чтобы close() мог закрыть все соединения
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            with self._connections_lock:
+                self._connections.append(conn)
+            self._local.conn = conn
+        return conn
+
+    # --- Interface shared with ThemeStore ---
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Return all themes in library order."""
+        themes = list(self.iter_themes())
+        self.index = ThemeIndex(themes)
+        return themes
+
+    def append(self, theme: Dict[str, Any]) -> None:
+        with self.conn:
+            row = self.conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM themes").fetchone()
+            self._insert_theme(row[0], theme)
+
+    def extend(self, themes: List[Dict[str, Any]]) -> None:
+        """Append several themes in one transaction (bulk import)."""
+        with self.conn:
+            row = self.conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM themes").fetchone()
+            for offset, theme in enumerate(themes):
+                self._insert_theme(row[0] + offset, theme)
+
+    def update(self, index: int, theme: Dict[str, Any]) -> None:
+        theme_id = self._id_of(theme) or self._id_at(index)
+        if theme_id is None:
+            raise IndexError(f"No theme at index {index}")
+        with self.conn:
+            values = self._theme_columns(theme)
+            self.conn.execute(
+                "UPDATE themes SET category_id = ?, title_ru = ?, description_ru = ?,"
+                " prompt_combined_en = ?, image_id = ?, extra = ? WHERE id = ?",
+                (*values, theme_id)
+            )
+            self.conn.execute("DELETE FROM themes_fts WHERE rowid = ?", (theme_id,))
+            self._index_theme(theme_id, theme)
+
+    def remove(self, index: int, theme: Optional[Dict[str, Any]] = None) -> None:
+        theme_id = self._id_of(theme) or self._id_at(index)
+        if theme_id is None:
+            raise IndexError(f"No theme at index {index}")
+        with self.conn:
+            # Позиции не сдвигаются: порядок задаётся сортировкой, пропуски допустимы
+            self.conn.execute("DELETE FROM themes WHERE id = ?", (theme_id,))
+            self.conn.execute("DELETE FROM themes_fts WHERE rowid = ?", (theme_id,))
+
+    def needs_compaction(self) -> bool:
+        return False
+
+    def compact(self, themes: Optional[List[Dict[str, Any]]] = None, wait: bool = False) -> None:
+        """Checkpoint the WAL; every change is already committed."""
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self, themes: Optional[List[Dict[str, Any]]] = None) -> None:
+        self.compact()
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    # --- Queries ---
+
+    def is_empty(self) -> bool:
+        themes = self.conn.execute("SELECT 1 FROM themes LIMIT 1").fetchone()
+        keywords = self.conn.execute("SELECT 1 FROM keywords LIMIT 1").fetchone()
+        return themes is None and keywords is None
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM themes").fetchone()[0]
+
+    def get(self, index: int) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            self._THEME_SELECT + " ORDER BY t.position LIMIT 1 OFFSET ?", (index,)
+        ).fetchone()
+        return self._row_to_theme(row) if row else None
+
+    def iter_themes(self, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Yield themes in library order without loading them all at once."""
+        cursor = self.conn.execute(self._THEME_SELECT + " ORDER BY t.position")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield self._row_to_theme(row)
+
+    def themes_in_category(self, category: str) -> List[Dict[str, Any]]:
+        rows = self.conn.execute(
+            self._THEME_SELECT + " WHERE c.name = ? ORDER BY t.position", (category,)
+        ).fetchall()
+        return [self._row_to_theme(row) for row in rows]
+
+    def categories(self) -> List[Tuple[str, int]]:
+        """Return ``(name, theme_count)`` for theme categories, sorted by name."""
+        rows = self.conn.execute(
+            "SELECT c.name, COUNT(t.id) FROM categories c JOIN themes t ON t.category_id = c.id"
+            " WHERE c.kind = 'theme' GROUP BY c.id ORDER BY c.name"
+        ).fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+    def search(self, query: str, limit: int = 100) -> List[Tuple[Dict[str, Any], float]]:
+        """Full-text search over titles, descriptions, prompts and categories.
+
+        Every query token is matched as a prefix; results are ordered by the
+        FTS5 BM25 rank (best first).
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        match = " ".join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+        rows = self.conn.execute(
+            "SELECT t.id, t.uid, c.name AS category, t.title_ru, t.description_ru, t.prompt_combined_en,"
+            " i.path AS image_path, t.extra, bm25(themes_fts, 3.0, 1.0, 1.0, 2.0) AS rank"
+            " FROM themes_fts JOIN themes t ON t.id = themes_fts.rowid"
+            " LEFT JOIN categories c ON c.id = t.category_id"
+            " LEFT JOIN images i ON i.id = t.image_id"
+            " WHERE themes_fts MATCH ? ORDER BY rank LIMIT ?",
+            (match, limit)
+        ).fetchall()
+        return [(self._row_to_theme(row), -row["rank"]) for row in rows]
+
+    # --- Keywords ---
+
+    def load_keywords(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Return the keyword library in the ``keyword_library.json`` layout."""
+        result: Dict[str, List[Dict[str, Any]]] = {}
+        for cat in self.conn.execute(
+                "SELECT id, name FROM categories WHERE kind = 'keyword' ORDER BY position"):
+            result[cat["name"]] = []
+        rows = self.conn.execute(
+            "SELECT c.name AS category, k.word, k.translate, k.effect, k.\"when\", k.extra"
+            " FROM keywords k JOIN categories c ON c.id = k.category_id"
+            " ORDER BY c.position, k.position"
+        )
+        for row in rows:
+            item = {field: row[field] for field in KEYWORD_FIELDS if row[field] is not None}
+            if row["extra"]:
+                item.update(json.loads(row["extra"]))
+            result.setdefault(row["category"], []).append(item)
+        return result
+
+    def save_keywords(self, keywords: Dict[str, List[Dict[str, Any]]]) -> None:
+        """Replace the keyword library."""
+        with self.conn:
+            self.conn.execute("DELETE FROM keywords")
+            self.conn.execute("DELETE FROM categories WHERE kind = 'keyword'")
+            for cat_pos, (category, items) in enumerate(keywords.items()):
+                cur = self.conn.execute(
+                    "INSERT INTO categories (kind, name, position) VALUES ('keyword', ?, ?)",
+                    (category, cat_pos)
+                )
+                rows = []
+                for pos, item in enumerate(items or []):
+                    extra = {k: v for k, v in item.items() if k not in KEYWORD_FIELDS}
+                    rows.append((cur.lastrowid, pos, *(item.get(f) for f in KEYWORD_FIELDS),
+                                 json.dumps(extra, ensure_ascii=False) if extra else None))
+                self.conn.executemany(
+                    "INSERT INTO keywords (category_id, position, word, translate, effect, \"when\", extra)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+                )
+
+    # --- JSON import/export ---
+
+    def import_json(self, themes_path: Optional[Path] = None,
+                    keywords_path: Optional[Path] = None) -> None:
+        """Replace the database content with the given JSON files."""
+        if themes_path and Path(themes_path).exists():
+            with open(themes_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            themes = data.get('themes', [])
+            assign_theme_ids(themes)
+            if 'fragments' in data:
+                self.fragments = FragmentTable(data['fragments'])
+            else:
+                self.fragments = migrate_themes(themes)
+            with self.conn:
+                self.conn.execute("DELETE FROM themes")
+                self.conn.execute("DELETE FROM themes_fts")
+                self.conn.execute("DELETE FROM fragments")
+                self.conn.executemany(
+                    "INSERT INTO fragments (name, text) VALUES (?, ?)",
+                    list(self.fragments.to_dict().items())
+                )
+                for position, theme in enumerate(themes):
+                    self._insert_theme(position, theme)
+            logger.info(f"Imported {len(themes)} themes from {themes_path} into {self.path}")
+
+        if keywords_path and Path(keywords_path).exists():
+            with open(keywords_path, 'r', encoding='utf-8') as f:
+                self.save_keywords(json.load(f).get('keywords', {}))
+            logger.info(f"Imported keyword library from {keywords_path} into {self.path}")
+
+    def export_json(self, themes_path: Optional[Path] = None,
+                    keywords_path: Optional[Path] = None) -> None:
+        """Write the database content back in the JSON formats."""
+        if themes_path:
+            atomic_write_json(themes_path, {"fragments": self.fragments.to_dict(),
+                                            "themes": self.load()}, indent=2)
+        if keywords_path:
+            atomic_write_json(keywords_path, {"keywords": self.load_keywords()}, indent=2)
+
+    # --- Internals ---
+
+    _THEME_SELECT = (
+        "SELECT t.id, t.uid, c.name AS category, t.title_ru, t.description_ru, t.prompt_combined_en,"
+        " i.path AS image_path, t.extra"
+        " FROM themes t LEFT JOIN categories c ON c.id = t.category_id"
+        " LEFT JOIN images i ON i.id = t.image_id"
+    )
+
+    def _migrate_uids(self) -> None:
+        """Adds the uid column to older databases and fills missing IDs."""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(themes)")}
+        with self.conn:
+            if "uid" not in columns:
+                self.conn.execute("ALTER TABLE themes ADD COLUMN uid TEXT")
+            missing = self.conn.execute("SELECT id FROM themes WHERE uid IS NULL").fetchall()
+            self.conn.executemany("UPDATE themes SET uid = ? WHERE id = ?",
+                                  [(new_theme_id(), row[0]) for row in missing])
+            self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_themes_uid ON themes(uid)")
+        if missing:
+            logger.info(f"Assigned IDs to {len(missing)} themes in {self.path}")
+
+    def _id_of(self, theme: Optional[Dict[str, Any]]) -> Optional[int]:
+        if not theme or not theme.get(ID_FIELD):
+            return None
+        row = self.conn.execute("SELECT id FROM themes WHERE uid = ?", (theme[ID_FIELD],)).fetchone()
+        return row[0] if row else None
+
+    def _id_at(self, index: int) -> Optional[int]:
+        if index < 0:
+            return None
+        row = self.conn.execute(
+            "SELECT id FROM themes ORDER BY position LIMIT 1 OFFSET ?", (index,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _category_id(self, name: Optional[str]) -> Optional[int]:
+        if name is None:
+            return None
+        self.conn.execute(
+            "INSERT OR IGNORE INTO categories (kind, name) VALUES ('theme', ?)", (name,)
+        )
+        return self.conn.execute(
+            "SELECT id FROM categories WHERE kind = 'theme' AND name = ?", (name,)
+        ).fetchone()[0]
+
+    def _image_id(self, path: Optional[str]) -> Optional[int]:
+        if not path:
+            return None
+        self.conn.execute("INSERT OR IGNORE INTO images (path) VALUES (?)", (path,))
+        return self.conn.execute("SELECT id FROM images WHERE path = ?", (path,)).fetchone()[0]
+
+    def _theme_columns(self, theme: Dict[str, Any]) -> tuple:
+        extra = {k: v for k, v in theme.items() if k not in THEME_FIELDS and k != ID_FIELD}
+        image_path = theme.get("image_path")
+        if "image_path" in theme and not image_path:
+            # Пустой путь не является изображением, но должен пережить экспорт
+            extra["image_path"] = image_path
+        return (
+            self._category_id(theme.get("category")),
+            theme.get("title_ru"),
+            theme.get("description_ru"),
+            self.fragments.compress(theme.get("prompt_combined_en")),
+            self._image_id(image_path),
+            json.dumps(extra, ensure_ascii=False) if extra else None,
+        )
+
+    def _insert_theme(self, position: int, theme: Dict[str, Any]) -> int:
+        theme.setdefault(ID_FIELD, new_theme_id())
+        cur = self.conn.execute(
+            "INSERT INTO themes (uid, position, category_id, title_ru, description_ru,"
+            " prompt_combined_en, image_id, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (theme[ID_FIELD], position, *self._theme_columns(theme))
+        )
+        self._index_theme(cur.lastrowid, theme)
+        return cur.lastrowid
+
+    def _index_theme(self, theme_id: int, theme: Dict[str, Any]) -> None:
+        theme = self.fragments.expand_theme(theme)
+        self.conn.execute(
+            "INSERT INTO themes_fts (rowid, title_ru, description_ru, prompt_combined_en, category)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (theme_id, *(normalize_text(theme.get(field) or "")
+                         for field in ("title_ru", "description_ru", "prompt_combined_en", "category")))
+        )
+
+    @staticmethod
+    def _row_to_theme(row) -> Dict[str, Any]:
+        theme: Dict[str, Any] = {ID_FIELD: row["uid"]}
+        for field in THEME_FIELDS:
+            if row[field] is not None:
+                theme[field] = row[field]
+        if row["extra"]:
+            theme.update(json.loads(row["extra"]))
+        return theme
@@ -0,0 +1,300 @@
+"""
+Style registry for PromptGenie
+Builds one application-level stylesheet from the palette and switches widget
+variants through dynamic properties
+"""
+
+import logging
+from string import Template
+from typing import Dict, Optional
+
+from PyQt6.QtCore import QEvent, QObject
+from PyQt6.QtGui import QColor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PALETTE = {
+    "background": "#1e1e1e",
+    "surface": "#252526",
+    "surface_alt": "#2d2d2d",
+    "border": "#444",
+    "text": "#e0e0e0",
+    "text_muted": "#888888",
+    "accent": "#007acc",
+    "accent_dark": "#005a99",
+    "highlight": "#00ddff",
+    "negative": "#ff6b6b",
+    "negative_border": "#ff4444",
+}
+
+# Цвета кнопок, которые используются в приложении, и имена их вариантов
+BUTTON_ACCENTS = {
+    "#007acc": "primary",
+    "#ff9800": "warning",
+    "#f44336": "danger",
+    "#4caf50": "success",
+}
+
+# Варианты StatusLabel: (начало градиента, конец градиента)
+STATUS_VARIANTS = {
+    "info": ("#007acc", "#005a99"),
+    "success": ("#00aa55", "#008844"),
+    "warning": ("#ff8f00", "#e65100"),
+    "error": ("#c62828", "#b71c1c"),
+}
+
+BASE_QSS = Template("""
+QMainWindow, QDialog {
+    background: $background;
+    color: $text;
+    font-family: 'Segoe UI';
+}
+QLabel#templateCategory { font-size: 14px; color: #4fc3f7; }
+QLabel#templateTitle { font-size: 16px; font-weight: bold; margin-bottom: 10px; }
+QLabel#templateImage { background: #151515; border: 1px solid #333; border-radius: 4px; }
+QLabel#placeholder { color: $text_muted; font-style: italic; }
+QLabel#errorLabel { color: red; font-weight: bold; }
+
+TooltipCheckBox {
+    padding: 10px 12px;
+    font-size: 12pt;
+    font-weight: 500;
+    border-radius: 12px;
+    background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
+        stop:0 $surface_alt, stop:1 #353535);
+    border: 1.5px solid $border;
+    color: $text;
+    spacing: 12px;
+}
+TooltipCheckBox[wordType="negative"] {
+    border: 1.5px solid $negative_border;
+    color: $negative;
+}
+TooltipCheckBox:hover {
+    background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
+        stop:0 #3a3a3a, stop:1 #444444);
+    border: 1.5px solid $accent;
+    padding-top: 8px;
+    padding-bottom: 12px;
+}
+TooltipCheckBox:checked {
+    background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
+        stop:0 $accent, stop:1 $accent_dark);
+    color: white;
+    font-weight: 600;
+}
+
+StyledTabWidget::pane {
+    background: $background;
+    border: 2px solid $accent;
+    border-radius: 16px;
+    margin: 8px;
+    padding: 10px;
+}
+StyledTabWidget QTabBar::tab {
+    padding: 16px 40px;
+    margin: 0 4px;
+    border-radius: 14px 14px 0 0;
+    font-weight: 600;
+    font-size: 13pt;
+    min-width: 160px;
+    background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+        stop:0 #2a2a2a, stop:1 #333333);
+    color: #aaaaaa;
+    border: 2px solid transparent;
+}
+StyledTabWidget QTabBar::tab:selected {
+    background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+        stop:0 $accent, stop:1 $accent_dark);
+    color: white;
+    border-bottom: none;
+}
+StyledTabWidget QTabBar::tab:hover:!selected {
+    background: #3a3a3a;
+    color: $highlight;
+}
+
+GradientButton {
+    border-radius: 22px;
+    color: white;
+    font-weight: 600;
+    font-size: 12pt;
+    padding: 0 30px;
+}
+GradientButton:hover {
+    padding-top: -3px;
+    padding-bottom: 3px;
+}
+GradientButton:pressed {
+    padding-top: 2px;
+    padding-bottom: -2px;
+}
+
+GlassPanel {
+    background: rgba(30, 30, 30, 0.7);
+    border: 1px solid rgba(0, 122, 204, 0.3);
+    border-radius: 18px;
+}
+
+SearchBox {
+    padding: 0 50px;
+    font-size: 13pt;
+    border: 2px solid $border;
+    border-radius: 24px;
+    background: #2a2a2a;
+    color: $text;
+}
+SearchBox:focus {
+    border: 2px solid $accent;
+    background: #333;
+}
+
+StatusLabel {
+    color: white;
+    padding: 12px 20px;
+    border-radius: 0 0 16px 16px;
+    font-weight: 600;
+}
+
+TemplateDescriptionEdit, TemplatePreviewEdit {
+    background: $surface;
+    border: 1px solid $border;
+    border-radius: 4px;
+    padding: 10px;
+    color: $text;
+    selection-background-color: $accent;
+}
+TemplateDescriptionEdit {
+    min-height: 80px;
+    max-height: 120px;
+}
+TemplatePreviewEdit {
+    font-family: 'Consolas', 'Courier New', monospace;
+    font-size: 12px;
+}
+TemplateDescriptionEdit:focus, TemplatePreviewEdit:focus {
+    border: 1px solid $accent;
+}
+""")
+
+BUTTON_QSS = Template("""
+GradientButton[accent="$name"] {
+    background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
+        stop:0 $color, stop:1 $dark);
+    border: 2px solid $color;
+}
+GradientButton[accent="$name"]:hover {
+    background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
+        stop:0 $light, stop:1 $color);
+}
+""")
+
+STATUS_QSS = Template("""
+StatusLabel[status="$name"] {
+    background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
+        stop:0 $start, stop:1 $end);
+}
+""")
+
+
+def darken(hex_color: str, amount: int = 40) -> str:
+    c = QColor(hex_color)
+    c.setHsv(c.hue(), c.saturation(), max(0, c.value() - amount))
+    return c.name()
+
+
+def lighten(hex_color: str, amount: int = 50) -> str:
+    c = QColor(hex_color)
+    c.setHsv(c.hue(), c.saturation(), min(255, c.value() + amount))
+    return c.name()
+
+
+class _StyleChangeCounter(QObject):
+    """Counts StyleChange events, i.e. widget-level setStyleSheet calls."""
+
+    def __init__(self, registry, parent=None):
+        super().__init__(parent)
+        self._registry = registry
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.StyleChange:
+            self._registry.widget_style_changes += 1
+        return False
+
+
+class StyleRegistry:
+    """Single source of the application stylesheet.
+
+    Widgets do not call ``setStyleSheet`` themselves; they pick a variant
+    with :meth:`set_variant`, which only sets a dynamic property and
+    re-polishes the widget. The stylesheet itself is parsed once per
+    :meth:`apply` (and again only when a new button accent is registered).
+    """
+    _instance: Optional["StyleRegistry"] = None
+
+    def __init__(self, palette: Optional[Dict[str, str]] = None):
+        self.palette = dict(DEFAULT_PALETTE, **(palette or {}))
+        self.accents = dict(BUTTON_ACCENTS)
+        self.parse_count = 0
+        self.repolish_count = 0
+        self.widget_style_changes = 0
+        self._app = None
+        self._counter = None
+
+    @classmethod
+    def instance(cls) -> "StyleRegistry":
+        if cls._instance is None:
+            cls._instance = StyleRegistry()
+        return cls._instance
+
+    def stylesheet(self) -> str:
+        """Build the full application stylesheet from the palette."""
+        parts = [BASE_QSS.substitute(self.palette)]
+        for color, name in self.accents.items():
+            parts.append(BUTTON_QSS.substitute(
+                name=name, color=color, dark=darken(color), light=lighten(color)
+            ))
+        for name, (start, end) in STATUS_VARIANTS.items():
+            parts.append(STATUS_QSS.substitute(name=name, start=start, end=end))
+        return "".join(parts)
+
+    def apply(self, app) -> None:
+        """Install the stylesheet on the QApplication."""
+        self._app = app
+        app.setStyleSheet(self.stylesheet())
+        self.parse_count += 1
+        logger.debug(f"Application stylesheet applied (parse #{self.parse_count})")
+
+    def accent(self, color: str) -> str:
+        """Return the variant name for a button color, registering it if new."""
+        color = QColor(color).name()
+        name = self.accents.get(color)
+        if name is None:
+            name = "c" + color.lstrip("#")
+            self.accents[color] = name
+            if self._app is not None:
+                self.apply(self._app)
+        return name
+
+    def set_variant(self, widget, prop: str, value: str) -> None:
+        """Switch a widget variant via a dynamic property and re-polish it."""
+        if widget.property(prop) == value:
+            return
+        widget.setProperty(prop, value)
+        style = widget.style()
+        style.unpolish(widget)
+        style.polish(widget)
+        self.repolish_count += 1
+
+    def track_style_changes(self, app) -> None:
+        """Count widget-level stylesheet changes (debug aid, adds an event filter)."""
+        if self._counter is None:
+            self._counter = _StyleChangeCounter(self, app)
+            app.installEventFilter(self._counter)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "parse_count": self.parse_count,
+            "repolish_count": self.repolish_count,
+            "widget_style_changes": self.widget_style_changes,
+        }
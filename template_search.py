@@ -0,0 +1,331 @@
+"""
+Template search index for PromptGenie
+Tokenized inverted index over the theme library with BM25 ranking
+"""
+
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+# Поля шаблона, которые попадают в индекс, и их вес в частоте терма
+SEARCH_FIELDS = {
+    "title_ru": 3.0,
+    "category": 2.0,
+    "description_ru": 1.0,
+    "prompt_combined_en": 1.0,
+}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Насколько может уйти статистика коллекции (число документов, средняя
+# длина, df термина), прежде чем сохранённые оценки пересчитываются
+STATS_DRIFT = 0.1
+
+
+def normalize_text(text: str) -> str:
+    """Case-fold text and fold 'ё' into 'е' so both spellings match."""
+    return str(text).casefold().replace("ё", "е")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into normalized word tokens."""
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+class TemplateSearchIndex:
+    """Inverted index over templates, ranked with BM25.
+
+    Documents are identified by an arbitrary hashable key supplied by the
+    caller. The index is updated incrementally with :meth:`add`,
+    :meth:`update` and :meth:`remove`; every query token is matched as a
+    prefix, so results follow the user while typing.
+
+    A prefix matches every document containing any term that starts with
+    it, so a shorter prefix never matches fewer documents; the document
+    gets the score of its rarest matching term. Postings store finished
+    BM25 term scores, so a query only merges dictionaries. The collection
+    statistics behind the scores (document count, average length, a
+    term's document frequency) are refreshed once they drift by more
+    than ``STATS_DRIFT``. Edits only score their own postings; the drift
+    check runs on the next query. A full rescore is computed by the
+    querying thread outside the lock and swapped in, so edits from the
+    GUI thread never wait for it.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, cache_size: int = 256):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[Hashable, float]] = {}  # термин -> {ключ: оценка BM25}
+        self._doc_terms: Dict[Hashable, Dict[str, float]] = {}  # ключ -> {термин: частота}
+        self._doc_len: Dict[Hashable, float] = {}
+        self._total_len = 0.0
+        self._terms: List[str] = []  # отсортированный словарь для поиска по префиксу
+        # Статистика, с которой посчитаны оценки: (документов, средняя длина) и df терминов
+        self._stats: Tuple[int, float] = (0, 1.0)
+        self._term_df: Dict[str, int] = {}
+        self._touched: Set[str] = set()  # термины, изменённые после последней проверки
+        # Ключи, изменённые во время полного пересчёта (None — пересчёт не идёт)
+        self._rescoring: Optional[Set[Hashable]] = None
+        self._generation = 0  # растёт при build(); устаревший пересчёт не применяется
+        # Оценки по отдельным токенам запроса; сбрасываются при любом изменении
+        self._cache: "OrderedDict[str, Dict[Hashable, float]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._doc_terms
+
+    def build(self, items: Iterable[Tuple[Hashable, Dict[str, Any]]]):
+        """Rebuild the index from ``(key, theme)`` pairs."""
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_len.clear()
+            self._total_len = 0.0
+            for key, theme in items:
+                self._index_document(key, theme, keep_sorted=False)
+            self._terms = sorted(self._postings)
+            self._stats = self._current_stats()
+            self._touched.clear()
+            self._generation += 1
+            # Пока в списках частоты; оценки считаются один раз по итоговой статистике
+            self._postings, self._term_df = self._scored(self._postings, self._doc_len, self._stats)
+            self._cache.clear()
+
+    def add(self, key: Hashable, theme: Dict[str, Any]):
+        """Add or replace a single document."""
+        with self._lock:
+            if key in self._doc_terms:
+                self._remove_document(key)
+            self._touched.update(self._index_document(key, theme, keep_sorted=True))
+            if self._rescoring is not None:
+                self._rescoring.add(key)
+            self._cache.clear()
+
+    def update(self, key: Hashable, theme: Dict[str, Any]):
+        """Re-index a document after its fields changed."""
+        self.add(key, theme)
+
+    def remove(self, key: Hashable) -> bool:
+        """Remove a document; returns False if it was not indexed."""
+        with self._lock:
+            if key not in self._doc_terms:
+                return False
+            self._touched.update(self._remove_document(key))
+            if self._rescoring is not None:
+                self._rescoring.add(key)
+            self._cache.clear()
+            return True
+
+    def match(self, query: str) -> Dict[Hashable, float]:
+        """Return ``{key: score}`` for documents matching every query token.
+
+        The returned mapping may be shared with the internal cache and must
+        not be modified. An empty query matches nothing.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return {}
+
+        self._rescore_all()
+        with self._lock:
+            per_token = []
+            for token in tokens:
+                scores = self._token_scores(token)
+                if not scores:
+                    return {}
+                per_token.append(scores)
+
+        if len(per_token) == 1:
+            return per_token[0]
+
+        # Пересечение начинаем с самого короткого списка
+        per_token.sort(key=len)
+        total = per_token[0]
+        for scores in per_token[1:]:
+            total = {key: value + scores[key] for key, value in total.items() if key in scores}
+            if not total:
+                break
+        return total
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[Hashable, float]]:
+        """Return ``(key, score)`` pairs ordered by descending BM25 score."""
+        matches = self.match(query)
+        if limit:
+            return heapq.nlargest(limit, matches.items(), key=lambda kv: kv[1])
+        return sorted(matches.items(), key=lambda kv: kv[1], reverse=True)
+
+    def _token_scores(self, token: str) -> Dict[Hashable, float]:
+        cached = self._cache.get(token)
+        if cached is not None:
+            self._cache.move_to_end(token)
+            return cached
+
+        if self._touched:
+            self._refresh()
+        postings = self._postings
+        terms = self._expand(token)
+        # От частых терминов к редким: у документа остаётся оценка самого редкого
+        terms.sort(key=lambda term: len(postings[term]), reverse=True)
+        scores: Dict[Hashable, float] = {}
+        for term in terms:
+            scores.update(postings[term])
+
+        self._cache[token] = scores
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return scores
+
+    def _expand(self, token: str) -> List[str]:
+        """Return all indexed terms starting with ``token``."""
+        start = bisect.bisect_left(self._terms, token)
+        end = bisect.bisect_left(self._terms, token + "\U0010ffff", start)
+        return self._terms[start:end]
+
+    @staticmethod
+    def _drifted(value: float, base: float) -> bool:
+        return abs(value - base) > STATS_DRIFT * base
+
+    def _current_stats(self) -> Tuple[int, float]:
+        n_docs = len(self._doc_terms)
+        return n_docs, (self._total_len / n_docs if n_docs else 0.0) or 1.0
+
+    def _refresh(self):
+        """Rescores the touched terms whose document frequency drifted."""
+        terms, self._touched = self._touched, set()
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                self._term_df.pop(term, None)
+            elif self._drifted(len(postings), self._term_df.get(term, 0)):
+                self._rescore(term)
+
+    def _rescore_all(self):
+        """Rescores everything once the collection statistics drifted.
+
+        Runs on the querying thread; only taking the snapshot and swapping
+        in the result hold the lock. Documents edited in between are
+        re-scored before the swap.
+        """
+        with self._lock:
+            n_docs, avg_len = stats = self._current_stats()
+            if self._rescoring is not None or not (
+                    self._drifted(n_docs, self._stats[0]) or self._drifted(avg_len, self._stats[1])):
+                return
+            # Словари терминов документов не изменяются, их достаточно скопировать по ссылке
+            doc_terms = dict(self._doc_terms)
+            doc_len = dict(self._doc_len)
+            generation = self._generation
+            self._rescoring = set()
+        try:
+            frequencies: Dict[str, Dict[Hashable, float]] = {}
+            for key, terms in doc_terms.items():
+                for term, tf in terms.items():
+                    postings = frequencies.get(term)
+                    if postings is None:
+                        postings = frequencies[term] = {}
+                    postings[key] = tf
+            postings, term_df = self._scored(frequencies, doc_len, stats)
+        except BaseException:
+            with self._lock:
+                self._rescoring = None
+            raise
+
+        with self._lock:
+            edited, self._rescoring = self._rescoring, None
+            if generation != self._generation:
+                return
+            # Старые списки освобождаются уже после выхода из блокировки
+            replaced = self._postings
+            for key in edited:
+                for term in doc_terms.get(key, ()):
+                    term_postings = postings.get(term)
+                    if term_postings is not None:
+                        term_postings.pop(key, None)
+                        if not term_postings:
+                            del postings[term]
+                terms = self._doc_terms.get(key)
+                if terms is None:
+                    continue
+                length = self._doc_len[key]
+                for term, tf in terms.items():
+                    term_postings = postings.setdefault(term, {})
+                    scale, base, per_len = self._weights(term_df.get(term) or len(term_postings) + 1,
+                                                         stats)
+                    term_postings[key] = scale * tf / (tf + base + per_len * length)
+                self._touched.update(terms)
+            self._postings, self._term_df, self._stats = postings, term_df, stats
+            self._cache.clear()
+        # Освобождение целиком — один долгий вызов под GIL; по спискам GUI-поток успевает вклиниться
+        for term_postings in replaced.values():
+            term_postings.clear()
+
+    def _scored(self, frequencies: Dict[str, Dict[Hashable, float]], doc_len: Dict[Hashable, float],
+                stats: Tuple[int, float]) -> Tuple[Dict[str, Dict[Hashable, float]], Dict[str, int]]:
+        """Turns ``{term: {key: tf}}`` into BM25 postings and document frequencies."""
+        postings: Dict[str, Dict[Hashable, float]] = {}
+        term_df: Dict[str, int] = {}
+        for term, tfs in frequencies.items():
+            scale, base, per_len = self._weights(len(tfs), stats)
+            term_df[term] = len(tfs)
+            postings[term] = {key: scale * tf / (tf + base + per_len * doc_len[key])
+                              for key, tf in tfs.items()}
+        return postings, term_df
+
+    def _rescore(self, term: str):
+        postings = self._postings[term]
+        df = self._term_df[term] = len(postings)
+        scale, base, per_len = self._weights(df)
+        doc_terms, doc_len = self._doc_terms, self._doc_len
+        for key in postings:
+            tf = doc_terms[key][term]
+            postings[key] = scale * tf / (tf + base + per_len * doc_len[key])
+
+    def _weights(self, df: int, stats: Optional[Tuple[int, float]] = None) -> Tuple[float, float, float]:
+        n_docs, avg_len = stats or self._stats
+        idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+        return idf * (self.k1 + 1.0), self.k1 * (1.0 - self.b), self.k1 * self.b / avg_len
+
+    def _index_document(self, key: Hashable, theme: Dict[str, Any], keep_sorted: bool) -> Dict[str, float]:
+        terms: Dict[str, float] = {}
+        for field, weight in SEARCH_FIELDS.items():
+            for token in tokenize(theme.get(field, "") or ""):
+                terms[token] = terms.get(token, 0.0) + weight
+
+        length = sum(terms.values())
+        self._doc_terms[key] = terms
+        self._doc_len[key] = length
+        self._total_len += length
+        for term, tf in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if keep_sorted:
+                    bisect.insort(self._terms, term)
+            if keep_sorted:
+                # Оценка по сохранённой статистике; дрейф проверит следующий запрос
+                scale, base, per_len = self._weights(self._term_df.get(term) or len(postings) + 1)
+                postings[key] = scale * tf / (tf + base + per_len * length)
+            else:
+                postings[key] = tf
+        return terms
+
+    def _remove_document(self, key: Hashable) -> Dict[str, float]:
+        terms = self._doc_terms.pop(key)
+        self._total_len -= self._doc_len.pop(key)
+        for term in terms:
+            postings = self._postings[term]
+            del postings[key]
+            if not postings:
+                del self._postings[term]
+                index = bisect.bisect_left(self._terms, term)
+                if index < len(self._terms) and self._terms[index] == term:
+                    del self._terms[index]
+        return terms
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Модули PromptGenie лежат в корне репозитория
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
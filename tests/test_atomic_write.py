@@ -0,0 +1,46 @@
+import io
+import os
+import stat
+
+from image_store import ImageStore
+from library_io import export_themes
+from utils import atomic_write_json
+
+
+def _mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_atomic_write_keeps_existing_mode(tmp_path):
+    path = tmp_path / "themes.json"
+    path.write_text("{}")
+    os.chmod(path, 0o664)
+    atomic_write_json(path, {"themes": []})
+    assert _mode(path) == 0o664
+
+
+def test_atomic_write_new_file_follows_umask(tmp_path):
+    old = os.umask(0o022)
+    try:
+        path = tmp_path / "new.json"
+        atomic_write_json(path, {})
+    finally:
+        os.umask(old)
+    assert _mode(path) == 0o644
+
+
+def test_export_keeps_existing_mode(tmp_path):
+    path = tmp_path / "pack.jsonl"
+    path.write_text("")
+    os.chmod(path, 0o664)
+    export_themes([{"title_ru": "t", "prompt_combined_en": "p"}], path)
+    assert _mode(path) == 0o664
+
+
+def test_image_store_file_follows_umask(tmp_path):
+    old = os.umask(0o002)
+    try:
+        name = ImageStore(tmp_path).add_stream(io.BytesIO(b"png"), ".png")
+    finally:
+        os.umask(old)
+    assert _mode(tmp_path / name) == 0o664
@@ -0,0 +1,69 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import cli
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _library(tmp_path):
+    """Pre-migration snapshot (no fragments, no IDs) plus one pending journal entry."""
+    themes = tmp_path / "themes.json"
+    themes.write_text(json.dumps({"themes": [
+        {"category": "Фото", "title_ru": "Первый", "prompt_combined_en": "a, b"},
+    ]}, ensure_ascii=False), encoding="utf-8")
+    journal = tmp_path / "themes.journal.jsonl"
+    journal.write_text(json.dumps({"seq": 1, "op": "add", "theme": {
+        "id": "t2", "category": "Фото", "title_ru": "Второй", "prompt_combined_en": "c"}},
+        ensure_ascii=False) + "\n", encoding="utf-8")
+    return themes, journal
+
+
+def test_export_is_read_only(tmp_path):
+    themes, journal = _library(tmp_path)
+    before = themes.read_bytes(), journal.read_bytes()
+    out = tmp_path / "out.jsonl"
+    assert cli.main(["export", str(out), "--themes", str(themes),
+                     "--images", str(tmp_path / "images")]) == 0
+    assert (themes.read_bytes(), journal.read_bytes()) == before
+    titles = [json.loads(line)["title_ru"] for line in out.read_text(encoding="utf-8").splitlines()]
+    assert titles == ["Первый", "Второй"]
+
+
+def test_export_unknown_category_is_an_error(tmp_path):
+    themes, _ = _library(tmp_path)
+    out = tmp_path / "out.jsonl"
+    assert cli.main(["export", str(out), "--themes", str(themes), "--category", "Нет такой"]) == 2
+    assert not out.exists()
+
+
+def test_batch_unknown_keyword_category_is_an_error(tmp_path):
+    themes, _ = _library(tmp_path)
+    keywords = tmp_path / "keywords.json"
+    keywords.write_text(json.dumps({"keywords": {"1. КАЧЕСТВО": [{"word": "sharp"}]}}),
+                        encoding="utf-8")
+    spec = tmp_path / "spec.json"
+    spec.write_text(json.dumps({"keywords": {"9. НЕТ": {"min": 1}}}), encoding="utf-8")
+    assert cli.main(["batch", str(spec), "-o", str(tmp_path / "out.jsonl"), "-j", "1",
+                     "--themes", str(themes), "--keywords", str(keywords)]) == 2
+
+
+def test_batch_library_includes_pending_journal(tmp_path):
+    themes, journal = _library(tmp_path)
+    keywords = tmp_path / "keywords.json"
+    keywords.write_text(json.dumps({"keywords": {}}), encoding="utf-8")
+    before = themes.read_bytes(), journal.read_bytes()
+    loaded, _ = cli.load_library(themes, keywords)
+    assert [t["title_ru"] for t in loaded] == ["Первый", "Второй"]
+    assert (themes.read_bytes(), journal.read_bytes()) == before
+
+
+def test_shared_stress_writers_converge(tmp_path):
+    # Отдельный процесс: зависший писатель не должен подвесить весь прогон тестов
+    proc = subprocess.run([sys.executable, str(ROOT / "cli.py"), "shared-stress", "-n", "3",
+                           "--ops", "60", "--initial", "20", "--dir", str(tmp_path)],
+                          capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr
+    assert "all writers converged: True" in proc.stderr
@@ -0,0 +1,38 @@
+import pytest
+
+from engine import CategoryRule, PromptSpace
+
+
+def test_negative_min_picks_is_clamped_before_max():
+    rule = CategoryRule("cat", ["a", "b"], min_picks=-1)
+    assert (rule.min_picks, rule.max_picks) == (0, 0)
+    assert len(rule) == 1
+    assert rule.option(0) == []
+
+
+def test_min_picks_above_word_count_is_rejected():
+    with pytest.raises(ValueError):
+        CategoryRule("cat", ["a", "b"], min_picks=3)
+
+
+def test_enumerate_resumes_from_cursor():
+    space = PromptSpace([CategoryRule("x", ["a", "b", "c"], 1, 2), CategoryRule("y", ["d", "e"])],
+                        exclusions=[["a", "d"]])
+    full = list(space.enumerate())
+    cursor = full[2][0]
+    assert list(space.enumerate(cursor + 1)) == full[3:]
+
+
+def test_enumerate_yields_independent_selections():
+    space = PromptSpace([CategoryRule("x", ["a", "b"]), CategoryRule("y", ["c", "d"])])
+    selections = [selection for _index, selection in space.enumerate()]
+    selections[0]["x"].append("z")
+    assert selections[1]["x"] == ["a"]
+    assert [s["x"] for s in selections] == [["a", "z"], ["a"], ["b"], ["b"]]
+
+
+def test_sampling_stops_when_nothing_is_allowed():
+    space = PromptSpace([CategoryRule("x", ["a"]), CategoryRule("y", ["b"])],
+                        exclusions=[["a", "b"]])
+    assert list(space.sample(seed=1)) == []
+    assert list(space.sample(seed=1, start=5, count=3)) == []
@@ -0,0 +1,110 @@
+import base64
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from image_client import (ImageGenerationClient, ImageGenerationError, ImageJob, RetryPolicy,
+                          StableDiffusionWebUI)
+
+
+class _WebUIStub(BaseHTTPRequestHandler):
+    """Minimal /sdapi/v1/txt2img: echoes the prompt back as the "image"."""
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящего WebUI
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests.append((self.path, body, self.headers.get("Authorization")))
+            server.connections.add(self.client_address)
+            status = server.failures.pop(0) if server.failures else 200
+        if status == 200:
+            image = base64.b64encode(body["prompt"].encode("utf-8")).decode("ascii")
+            self._reply(200, {"images": [image]})
+        else:
+            self._reply(status, {"error": "busy"}, {"Retry-After": "0"})
+
+    def _reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def webui():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _WebUIStub)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.connections = set()
+    server.failures = []
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(server, **kwargs):
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    kwargs.setdefault("retry", RetryPolicy(max_attempts=3, base_delay=0.01))
+    return ImageGenerationClient(StableDiffusionWebUI(kwargs.pop("api_key", "")), url, **kwargs)
+
+
+def test_txt2img_request_and_keep_alive(webui):
+    client = _client(webui, api_key="user:secret")
+    for i in range(5):
+        job = ImageJob(i, f"prompt {i}", "blurry", width=640, height=384, steps=12)
+        assert client.generate(job) == [f"prompt {i}".encode("utf-8")]
+    client.close()
+
+    path, body, auth = webui.requests[0]
+    assert path == "/sdapi/v1/txt2img"
+    assert (body["prompt"], body["negative_prompt"]) == ("prompt 0", "blurry")
+    assert (body["width"], body["height"], body["steps"]) == (640, 384, 12)
+    assert auth == "Basic " + base64.b64encode(b"user:secret").decode("ascii")
+    # Все запросы по одному соединению
+    assert client.pool.created == 1
+    assert len(webui.connections) == 1
+
+
+def test_retries_busy_server(webui):
+    webui.failures = [503, 503]
+    client = _client(webui)
+    assert client.generate(ImageJob(1, "cat")) == [b"cat"]
+    assert (client.requests, client.retries) == (3, 2)
+
+
+def test_client_error_is_not_retried(webui):
+    webui.failures = [400]
+    client = _client(webui)
+    with pytest.raises(ImageGenerationError) as error:
+        client.generate(ImageJob(1, "cat"))
+    assert error.value.status == 400
+    assert client.requests == 1
+
+
+def test_concurrent_jobs_share_the_pool(webui):
+    client = _client(webui, max_connections=2)
+    results = {}
+
+    def worker(first):
+        for i in range(first, first + 5):
+            results[i] = client.generate(ImageJob(i, f"p{i}"))
+
+    threads = [threading.Thread(target=worker, args=(n * 5,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {i: [f"p{i}".encode("utf-8")] for i in range(20)}
+    assert client.pool.created <= 4
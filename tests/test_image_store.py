@@ -0,0 +1,29 @@
+import io
+
+from image_store import ImageStore
+
+
+def test_release_untracked_name_keeps_file(tmp_path):
+    store = ImageStore(tmp_path)
+    name = store.add_stream(io.BytesIO(b"png"), ".png")
+    assert store.release(name) is False
+    assert store.path(name).exists()
+
+
+def test_release_last_reference_deletes_file(tmp_path):
+    store = ImageStore(tmp_path)
+    name = store.add_stream(io.BytesIO(b"png"), ".png")
+    store.acquire(name)
+    store.acquire(name)
+    assert store.release(name) is False
+    assert store.release(name) is True
+    assert not store.path(name).exists()
+    assert store.release(name) is False
+
+
+def test_discard_keeps_referenced_image(tmp_path):
+    store = ImageStore(tmp_path)
+    name = store.add_stream(io.BytesIO(b"png"), ".png")
+    store.acquire(name)
+    assert store.discard(name) is False
+    assert store.path(name).exists()
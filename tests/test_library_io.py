@@ -0,0 +1,47 @@
+import json
+
+from image_store import ImageStore
+from library_io import LibraryImporter
+
+
+def _write_pack(path, image_names):
+    themes = [{"title_ru": f"t{i}", "prompt_combined_en": f"p{i}", "image_path": name}
+              for i, name in enumerate(image_names)]
+    path.write_text("\n".join(json.dumps(theme) for theme in themes), encoding="utf-8")
+
+
+def _import(tmp_path, image_names):
+    pack_dir = tmp_path / "pack"
+    pack_dir.mkdir()
+    pack = pack_dir / "themes.jsonl"
+    _write_pack(pack, image_names)
+    store = ImageStore(tmp_path / "store")
+    importer = LibraryImporter([], store)
+    ops = list(importer.run(pack))
+    return store, [theme["image_path"] for _, _, theme in ops]
+
+
+def test_directory_pack_rejects_paths_outside_pack(tmp_path):
+    secret = tmp_path / "secret.png"
+    secret.write_bytes(b"secret")
+    store, images = _import(tmp_path, ["../secret.png", str(secret), "sub/../../secret.png"])
+    assert images == ["", "", ""]
+    assert not any(path.read_bytes() == b"secret" for path in store.root.iterdir())
+
+
+def test_directory_pack_reads_images_inside_pack(tmp_path):
+    (tmp_path / "pack" / "images").mkdir(parents=True)
+    (tmp_path / "pack" / "images" / "a.png").write_bytes(b"image")
+    pack = tmp_path / "pack" / "themes.jsonl"
+    _write_pack(pack, ["images/a.png"])
+    store = ImageStore(tmp_path / "store")
+    ops = list(LibraryImporter([], store).run(pack))
+    name = ops[0][2]["image_path"]
+    assert store.path(name).read_bytes() == b"image"
+
+
+def test_store_reference_must_be_plain_name(tmp_path):
+    (tmp_path / "store").mkdir()
+    (tmp_path / "outside.png").write_bytes(b"x")
+    _, images = _import(tmp_path, ["../outside.png"])
+    assert images == [""]
@@ -0,0 +1,29 @@
+from result_cache import ResultCache
+
+
+def test_put_same_key_same_content_keeps_blob(tmp_path):
+    cache = ResultCache(tmp_path)
+    first = cache.put("key", [b"image"])
+    second = cache.put("key", [b"image"])
+    assert first == second
+    assert second[0].read_bytes() == b"image"
+    assert cache.get("key") == second
+    assert cache.stats()["blobs"] == 1
+    assert cache.total_bytes == len(b"image")
+
+
+def test_put_same_key_new_content_releases_old_blob(tmp_path):
+    cache = ResultCache(tmp_path)
+    old = cache.put("key", [b"old"])
+    new = cache.put("key", [b"new"])
+    assert not old[0].exists()
+    assert new[0].read_bytes() == b"new"
+    assert cache.total_bytes == len(b"new")
+
+
+def test_shared_blob_survives_other_key_overwrite(tmp_path):
+    cache = ResultCache(tmp_path)
+    cache.put("a", [b"same"])
+    cache.put("b", [b"same"])
+    cache.put("a", [b"other"])
+    assert cache.get("b")[0].read_bytes() == b"same"
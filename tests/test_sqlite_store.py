@@ -0,0 +1,78 @@
+import threading
+
+from sqlite_store import SQLiteStore
+
+
+def _themes(n):
+    return [{"category": f"c{i % 3}", "title_ru": f"t{i}", "prompt_combined_en": f"p{i}"}
+            for i in range(n)]
+
+
+def test_concurrent_loads_from_threads(tmp_path):
+    store = SQLiteStore(tmp_path / "lib.db")
+    store.extend(_themes(500))
+    store.save_keywords({"Стиль": [{"word": "noir", "translate": "нуар"}]})
+    errors, results = [], []
+
+    def load_themes():
+        try:
+            for _ in range(20):
+                results.append(len(store.load()))
+        except Exception as e:  # pragma: no cover - диагностика
+            errors.append(e)
+
+    def load_keywords():
+        try:
+            for _ in range(200):
+                assert store.load_keywords()["Стиль"][0]["word"] == "noir"
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    threads = [threading.Thread(target=load_themes), threading.Thread(target=load_keywords)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert results == [500] * 20
+    store.close()
+
+
+def test_write_in_one_thread_visible_in_another(tmp_path):
+    store = SQLiteStore(tmp_path / "lib.db")
+    thread = threading.Thread(target=store.extend, args=(_themes(3),))
+    thread.start()
+    thread.join()
+    assert [theme["title_ru"] for theme in store.load()] == ["t0", "t1", "t2"]
+    store.close()
+
+
+def test_update_and_remove_by_id(tmp_path):
+    store = SQLiteStore(tmp_path / "lib.db")
+    store.extend(_themes(3))
+    themes = store.load()
+    themes[2]["title_ru"] = "changed"
+    store.update(0, themes[2])
+    store.remove(99, themes[0])
+    assert [theme["title_ru"] for theme in store.load()] == ["t1", "changed"]
+    store.close()
+
+
+def test_readers_never_see_half_written_batches(tmp_path):
+    store = SQLiteStore(tmp_path / "lib.db")
+    done = threading.Event()
+    counts = []
+
+    def writer():
+        for _ in range(100):
+            store.extend(_themes(5))
+        done.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    while not done.is_set():
+        counts.append(store.count())
+    thread.join()
+    assert all(count % 5 == 0 for count in counts)
+    assert store.count() == 500
+    store.close()
@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("PyQt6.QtWidgets")
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Запас на медленные машины CI; обычный запуск укладывается в доли секунды
+STARTUP_BUDGET_MS = 10000
+
+# Окно в отдельном процессе: PROCESS_START отсчитывается от импорта модуля.
+# Данные и библиотека шаблонов — копии во временной папке
+SCRIPT = """
+import json, shutil, sys
+from pathlib import Path
+sys.path.insert(0, sys.argv[1])
+import PromptGenie_qt as pg
+from PyQt6.QtWidgets import QApplication
+
+work = Path.cwd()
+pg.THEMES_FILE = Path(shutil.copy(pg.THEMES_FILE, work / "theme_prompts.json"))
+
+class Window(pg.PromptGenie):
+    def get_data_dir(self):
+        self.images_dir = work / "data" / "template_images"
+        self.images_dir.mkdir(parents=True, exist_ok=True)
+        return work / "data"
+
+app = QApplication([])
+win = Window()
+win.first_painted.connect(lambda ms: app.quit())
+win.show()
+app.exec()
+print(json.dumps({"startup_ms": win.startup_time_ms, "builder_built": win.builder_built,
+                  "keywords": len(win.kw_data)}))
+"""
+
+
+def test_startup_is_measured_and_lazy(tmp_path):
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    proc = subprocess.run([sys.executable, "-c", SCRIPT, str(ROOT)], cwd=tmp_path, env=env,
+                          capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    assert "Startup time (process start to first paint)" in proc.stderr
+    assert 0 < result["startup_ms"] < STARTUP_BUDGET_MS
+    # Конструктор и библиотека ключевых слов не загружаются до открытия вкладки
+    assert not result["builder_built"]
+    assert result["keywords"] == 0
@@ -0,0 +1,73 @@
+import threading
+
+from template_search import TemplateSearchIndex
+
+
+def _theme(title, description="", category="Фото", prompt="photo"):
+    return {"title_ru": title, "description_ru": description,
+            "category": category, "prompt_combined_en": prompt}
+
+
+def _index(themes):
+    index = TemplateSearchIndex()
+    index.build(enumerate(themes))
+    return index
+
+
+def test_shorter_prefix_never_matches_fewer_documents():
+    # Больше сотни разных терминов с общим префиксом
+    themes = [_theme(f"портрет{i:03d}") for i in range(300)]
+    index = _index(themes)
+    word = "портрет123"
+    for size in range(1, len(word)):
+        assert len(index.match(word[:size])) >= len(index.match(word[:size + 1]))
+    assert len(index.match("п")) == 300
+    assert set(index.match("портрет1")) == {i for i in range(100, 200)}
+
+
+def test_prefix_stays_complete_after_edits():
+    themes = [_theme(f"пейзаж{i}") for i in range(200)]
+    index = _index(themes)
+    index.add(200, _theme("пейзажист"))
+    index.remove(0)
+    assert len(index.match("пей")) == 200
+    assert 200 in index.match("пейзажи")
+
+
+def test_yo_folding_and_all_fields():
+    index = _index([_theme("Ёлка", prompt="christmas tree"), _theme("Море", category="Природа")])
+    assert set(index.match("елка")) == {0}
+    assert set(index.match("christ")) == {0}
+    assert set(index.match("природа")) == {1}
+
+
+def test_ranking_prefers_rarer_and_title_terms():
+    themes = [_theme("закат", "закат над морем"), _theme("город", "закат")] + \
+        [_theme("город", "улица") for _ in range(20)]
+    index = _index(themes)
+    ranked = [key for key, _ in index.search("закат")]
+    assert ranked == [0, 1]
+    assert index.search("закат город")[0][0] == 1
+
+
+def test_edits_do_not_wait_for_a_full_rescore():
+    index = _index([_theme(f"город{i}") for i in range(100)])
+    for i in range(100, 150):
+        index.add(i, _theme(f"город{i}"))  # статистика ушла больше чем на STATS_DRIFT
+    scored = index._scored
+    edits = []
+
+    def slow_scored(frequencies, doc_len, stats):
+        # Правка из другого потока посреди пересчёта не должна ждать блокировку
+        editor = threading.Thread(target=lambda: (index.add(500, _theme("уникум")), index.remove(0)))
+        editor.start()
+        editor.join(timeout=5)
+        edits.append(not editor.is_alive())
+        return scored(frequencies, doc_len, stats)
+
+    index._scored = slow_scored
+    assert len(index.match("город")) == 149
+    assert edits == [True]
+    assert index._stats[0] == 150
+    assert set(index.match("уникум")) == {500}
+    assert 0 not in index.match("город0")
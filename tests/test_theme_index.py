@@ -0,0 +1,56 @@
+import random
+
+from theme_index import ID_FIELD, REMOVALS_BEFORE_RENUMBER, ThemeIndex, new_theme_id
+
+
+def _theme(n):
+    return {ID_FIELD: new_theme_id(), "category": f"c{n % 3}", "title_ru": f"t{n}"}
+
+
+def _assert_rows(index, themes):
+    for row, theme in enumerate(themes):
+        assert index.row_of(theme[ID_FIELD]) == row
+
+
+def test_rows_follow_removals_additions_and_replacements(monkeypatch):
+    rng = random.Random(7)
+    themes = [_theme(n) for n in range(200)]
+    index = ThemeIndex(themes)
+    resets = []
+    reset = ThemeIndex.reset
+    monkeypatch.setattr(ThemeIndex, "reset",
+                        lambda self, themes: (resets.append(len(themes)), reset(self, themes)))
+    removed = []
+    most_pending = 0
+    for n in range(300):
+        choice = rng.random()
+        if choice < 0.5 and themes:
+            row = rng.randrange(len(themes))
+            theme = themes.pop(row)
+            index.remove(theme, row)
+            removed.append(theme[ID_FIELD])
+        elif choice < 0.75:
+            theme = _theme(n)
+            themes.append(theme)
+            index.add(theme, len(themes) - 1)
+        else:
+            row = rng.randrange(len(themes))
+            old = themes[row]
+            # Запись журнала: тот же ID, новый объект
+            themes[row] = dict(old, title_ru="edited")
+            index.replace(row, old, themes[row])
+        if n % 100 == 99:
+            # Другой шаблон на месте строки
+            row = rng.randrange(len(themes))
+            old = themes[row]
+            themes[row] = _theme(n)
+            index.replace(row, old, themes[row])
+            removed.append(old[ID_FIELD])
+        most_pending = max(most_pending, len(index._removed))
+        _assert_rows(index, themes)
+    # Строки сдвигались по журналу удалений и перенумеровывались, без полной перестройки
+    assert most_pending > REMOVALS_BEFORE_RENUMBER
+    assert resets == []
+    assert all(index.row_of(theme_id) == -1 for theme_id in removed)
+    assert len(index) == len(themes)
+    assert sum(index.category_count(c) for c in index.categories()) == len(themes)
@@ -0,0 +1,61 @@
+import json
+import os
+import stat
+
+import pytest
+
+from theme_storage import ThemeStore
+
+
+def _store(tmp_path):
+    store = ThemeStore(tmp_path / "themes.json")
+    themes = store.load()
+    theme = {"title_ru": "Первый", "prompt_combined_en": "a"}
+    themes.append(theme)
+    store.append(theme)
+    return store, themes
+
+
+def test_compact_wait_reports_failed_write(tmp_path):
+    store, themes = _store(tmp_path)
+    store.path = tmp_path / "missing" / "themes.json"
+    with pytest.raises(OSError):
+        store.compact(themes, wait=True)
+    with pytest.raises(OSError):
+        store.close(themes)
+
+
+def test_background_compaction_only_logs(tmp_path, caplog):
+    store, themes = _store(tmp_path)
+    store.path = tmp_path / "missing" / "themes.json"
+    store.compact(themes)
+    store._compactor.join()
+    assert "Error compacting theme journal" in caplog.text
+
+
+def test_truncated_journal_keeps_mode(tmp_path):
+    store, themes = _store(tmp_path)
+    os.chmod(store.journal_path, 0o664)
+    seq = store._seq
+    second = {"title_ru": "Второй", "prompt_combined_en": "b"}
+    themes.append(second)
+    store.append(second)
+    store._write_snapshot([dict(t) for t in themes[:1]], seq)
+    assert store.journal_path.exists()
+    assert stat.S_IMODE(os.stat(store.journal_path).st_mode) == 0o664
+
+
+def test_snapshot_cache_follows_the_snapshot(tmp_path):
+    store, themes = _store(tmp_path)
+    store.compact(themes, wait=True)
+    assert store.cache_path.exists()
+    assert [t["title_ru"] for t in ThemeStore(store.path).load()] == ["Первый"]
+
+    # Правка вручную меняет подпись снимка — кэш больше не используется
+    data = json.loads(store.path.read_text(encoding="utf-8"))
+    data["themes"][0]["title_ru"] = "Изменён вручную"
+    store.path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    assert [t["title_ru"] for t in ThemeStore(store.path).load()] == ["Изменён вручную"]
+
+    store.cache_path.write_bytes(b"\x00garbage")
+    assert [t["title_ru"] for t in ThemeStore(store.path).read_snapshot()[0]] == ["Изменён вручную"]
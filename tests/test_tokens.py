@@ -0,0 +1,35 @@
+from engine import Token, canonicalize, parse_prompt
+
+
+def test_brackets_fold_into_weights():
+    assert canonicalize("(a)") == "(a:1.1)"
+    assert canonicalize("[a]") == "(a:0.91)"
+    assert canonicalize("((a))") == "(a:1.21)"
+    assert canonicalize("[[a]]") == "(a:0.83)"
+    assert canonicalize("([a])") == "a"
+    # Явный вес умножается на внешние скобки
+    assert canonicalize("(a:1.3)") == "(a:1.3)"
+    assert canonicalize("((a:1.2))") == "(a:1.32)"
+
+
+def test_brackets_that_do_not_wrap_the_token_are_kept():
+    assert canonicalize("(a) (b)") == "(a) (b)"
+    assert canonicalize("(a, b:1.2), c") == "(a, b:1.2), c"
+
+
+def test_duplicates_are_dropped_case_and_space_insensitive():
+    assert canonicalize("a, A ,  a") == "a"
+    assert canonicalize(" red   car, Red car, blue ") == "red car, blue"
+    # Повтор с явным весом передаёт его первому вхождению
+    assert canonicalize("a, b, (a:1.2)") == "(a:1.2), b"
+    assert canonicalize("(a:1.2), a") == "(a:1.2)"
+
+
+def test_separator_splits_positive_and_negative():
+    prompt = parse_prompt("(cat), [dog] ||| blur, (blur), noise")
+    assert prompt.positive == [Token("cat", 1.1), Token("dog", 0.91)]
+    assert prompt.negative == [Token("blur", 1.1), Token("noise")]
+    assert canonicalize("x ||| y, y") == "x ||| y"
+    # Без негативной части разделитель не выводится
+    assert canonicalize("a |||  ") == "a"
+    assert parse_prompt("a | b").negative == []
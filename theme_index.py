@@ -0,0 +1,198 @@
+"""
+Theme index for PromptGenie
+Stable theme IDs with id → theme, id → row and category → ids lookups
+"""
+
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+# Поле шаблона с постоянным идентификатором
+ID_FIELD = "id"
+DEFAULT_CATEGORY = "Без категории"
+# Сколько удалений копится до перенумерации строк
+REMOVALS_BEFORE_RENUMBER = 32
+
+
+def new_theme_id() -> str:
+    return uuid.uuid4().hex
+
+
+def theme_key(theme: Dict[str, Any]) -> str:
+    """Key of a theme in search results and indexes: its stable ID."""
+    return theme[ID_FIELD]
+
+
+def category_of(theme: Dict[str, Any]) -> str:
+    return theme.get("category", DEFAULT_CATEGORY)
+
+
+def assign_theme_ids(themes: Iterable[Dict[str, Any]]) -> int:
+    """Give a new ID to every theme without one (or with a duplicate); returns the count."""
+    seen: Set[str] = set()
+    assigned = 0
+    for theme in themes:
+        theme_id = theme.get(ID_FIELD)
+        if not theme_id or theme_id in seen:
+            theme_id = theme[ID_FIELD] = new_theme_id()
+            assigned += 1
+        seen.add(theme_id)
+    return assigned
+
+
+class ThemeIndex:
+    """Lookups over a theme list by stable ID.
+
+    ``id → theme`` and ``category → ids`` are kept exact by the
+    :meth:`add`, :meth:`remove`, :meth:`replace` and :meth:`recategorize`
+    notifications, each O(1). Rows are cached per ID as of the last
+    renumbering; removals since then are logged and a cached row is shifted
+    past them on lookup, so the rows are renumbered only once per
+    ``REMOVALS_BEFORE_RENUMBER`` deletions. A cached row that no longer
+    holds its theme (the list was changed without notifications) makes
+    :meth:`row_of` rebuild the index, so lookups stay correct either way.
+    """
+    __slots__ = ("themes", "_by_id", "_rows", "_removed", "_categories", "_length")
+
+    def __init__(self, themes: Optional[List[Dict[str, Any]]] = None):
+        self.reset(themes if themes is not None else [])
+
+    def reset(self, themes: List[Dict[str, Any]]) -> None:
+        self.themes = themes
+        # Строится при каждой загрузке библиотеки, поэтому без обращений к self в цикле
+        by_id: Dict[str, Dict[str, Any]] = {}
+        rows: Dict[str, int] = {}
+        categories: Dict[str, Set[str]] = {}
+        for row, theme in enumerate(themes):
+            theme_id = theme.get(ID_FIELD)
+            if theme_id:
+                by_id[theme_id] = theme
+                rows[theme_id] = row
+                category = theme.get("category", DEFAULT_CATEGORY)
+                ids = categories.get(category)
+                if ids is None:
+                    ids = categories[category] = set()
+                ids.add(theme_id)
+        self._by_id = by_id
+        self._rows = rows
+        self._categories = categories
+        self._removed: List[int] = []
+        self._length = len(themes)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, theme_id) -> bool:
+        return theme_id in self._by_id
+
+    def get(self, theme_id: str) -> Optional[Dict[str, Any]]:
+        return self._by_id.get(theme_id)
+
+    def row_of(self, theme_id: Optional[str]) -> int:
+        """Row of the theme with ``theme_id`` in the list, or -1."""
+        if not theme_id:
+            return -1
+        if len(self._removed) > REMOVALS_BEFORE_RENUMBER:
+            self._renumber()
+        row = self._rows.get(theme_id)
+        if row is not None:
+            row = self._shift(row)
+            if self._holds(row, theme_id):
+                return row
+        self._renumber()
+        row = self._rows.get(theme_id)
+        if row is not None and self._holds(row, theme_id):
+            return row
+        if theme_id in self._by_id or len(self.themes) != self._length:
+            # Список менялся в обход индекса
+            self.reset(self.themes)
+            row = self._rows.get(theme_id)
+            return -1 if row is None else row
+        return -1
+
+    def category_ids(self, category: str) -> Set[str]:
+        """IDs of the themes in ``category`` (the index's own set, do not modify)."""
+        return self._categories.get(category, set())
+
+    def category_count(self, category: str) -> int:
+        ids = self._categories.get(category)
+        return len(ids) if ids else 0
+
+    def categories(self) -> List[str]:
+        """Non-empty categories, sorted."""
+        return sorted(self._categories)
+
+    # Уведомления об изменениях списка
+
+    def add(self, theme: Dict[str, Any], row: int) -> None:
+        """``theme`` was appended to the list at ``row``."""
+        self._length += 1
+        theme_id = theme.get(ID_FIELD)
+        if not theme_id:
+            return
+        self._by_id[theme_id] = theme
+        # Строка в нумерации до удалений: каждое из них было выше неё
+        self._rows[theme_id] = row + len(self._removed)
+        self._categories.setdefault(category_of(theme), set()).add(theme_id)
+
+    def remove(self, theme: Dict[str, Any], row: int) -> None:
+        self._forget(theme)
+        self._length -= 1
+        self._removed.append(row)
+
+    def replace(self, row: int, old: Dict[str, Any], new: Dict[str, Any]) -> None:
+        """``themes[row]`` was replaced by another object (a journal entry)."""
+        theme_id = new.get(ID_FIELD)
+        if theme_id and theme_id == old.get(ID_FIELD) and theme_id in self._rows:
+            # Строка та же: меняется только объект, кэш строки остаётся
+            if self._by_id.get(theme_id) is old:
+                self._discard_category(category_of(old), theme_id)
+            self._by_id[theme_id] = new
+            self._categories.setdefault(category_of(new), set()).add(theme_id)
+            return
+        self._forget(old)
+        self._renumber()
+        self._length -= 1
+        self.add(new, row)
+
+    def recategorize(self, theme: Dict[str, Any], old_category: str) -> None:
+        """The theme was edited in place; ``old_category`` is its category before."""
+        category = category_of(theme)
+        theme_id = theme.get(ID_FIELD)
+        if theme_id and category != old_category:
+            self._discard_category(old_category, theme_id)
+            self._categories.setdefault(category, set()).add(theme_id)
+
+    # Внутреннее
+
+    def _forget(self, theme: Dict[str, Any]) -> None:
+        theme_id = theme.get(ID_FIELD)
+        if self._by_id.get(theme_id) is theme:
+            del self._by_id[theme_id]
+            self._rows.pop(theme_id, None)
+            self._discard_category(category_of(theme), theme_id)
+
+    def _holds(self, row: int, theme_id: str) -> bool:
+        return 0 <= row < len(self.themes) and self.themes[row] is self._by_id.get(theme_id)
+
+    def _shift(self, row: int) -> int:
+        for removed in self._removed:
+            if removed < row:
+                row -= 1
+        return row
+
+    def _renumber(self) -> None:
+        if not self._removed:
+            return
+        themes = self.themes
+        for row in range(min(self._removed), len(themes)):
+            theme_id = themes[row].get(ID_FIELD)
+            if theme_id:
+                self._rows[theme_id] = row
+        self._removed.clear()
+
+    def _discard_category(self, category: str, theme_id: str) -> None:
+        ids = self._categories.get(category)
+        if ids is not None:
+            ids.discard(theme_id)
+            if not ids:
+                del self._categories[category]
@@ -0,0 +1,273 @@
+"""
+Theme list model for PromptGenie
+Model/view replacement for the QListWidget based template list
+"""
+
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QSortFilterProxyModel, pyqtSignal
+
+from theme_index import ID_FIELD, ThemeIndex, category_of, new_theme_id, theme_key
+
+
+class ThemeListModel(QAbstractListModel):
+    """List model over the shared ``themes`` list.
+
+    The model does not copy the themes: it works on the same list object the
+    window keeps in ``self.themes``, so every mutation goes through the model
+    and is reported to the views with row-level signals.
+
+    ``theme_index`` (:class:`theme_index.ThemeIndex`) finds themes and rows by
+    their stable ID; the model keeps it up to date and gives appended
+    themes an ID if they have none. ``categoriesChanged`` names the
+    categories whose theme count changed.
+    """
+    ThemeRole = Qt.ItemDataRole.UserRole
+    CategoryRole = Qt.ItemDataRole.UserRole + 1
+
+    categoriesChanged = pyqtSignal(list)
+
+    def __init__(self, themes: Optional[List[Dict[str, Any]]] = None, parent=None):
+        super().__init__(parent)
+        self._themes = themes if themes is not None else []
+        self.theme_index = ThemeIndex(self._themes)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._themes)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._themes):
+            return None
+
+        theme = self._themes[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{theme.get('category', 'Без категории')} - {theme.get('title_ru', '')}"
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return theme.get("description_ru", "")
+        if role == self.ThemeRole:
+            return theme
+        if role == self.CategoryRole:
+            return theme.get("category", "Без категории")
+        return None
+
+    def themes(self) -> List[Dict[str, Any]]:
+        """Return the underlying list (not a copy)."""
+        return self._themes
+
+    def theme_at(self, row: int) -> Optional[Dict[str, Any]]:
+        """Return the theme stored at ``row`` or None."""
+        if 0 <= row < len(self._themes):
+            return self._themes[row]
+        return None
+
+    def theme_by_id(self, theme_id: str) -> Optional[Dict[str, Any]]:
+        return self.theme_index.get(theme_id)
+
+    def row_of(self, theme: Dict[str, Any]) -> int:
+        """Return the row of the given theme object, or -1."""
+        row = self.theme_index.row_of(theme.get(ID_FIELD))
+        return row if row >= 0 and self._themes[row] is theme else -1
+
+    def set_themes(self, themes: List[Dict[str, Any]], index: Optional[ThemeIndex] = None):
+        """Replace the whole list (used only on initial load).
+
+        ``index`` may be an index the store has already built over ``themes``.
+        """
+        self.beginResetModel()
+        self._themes = themes
+        self.theme_index = index if index is not None and index.themes is themes else ThemeIndex(themes)
+        self.endResetModel()
+
+    def _claim_id(self, theme: Dict[str, Any]) -> None:
+        theme_id = theme.get(ID_FIELD)
+        if not theme_id or theme_id in self.theme_index:
+            theme[ID_FIELD] = new_theme_id()
+
+    def append_theme(self, theme: Dict[str, Any]) -> int:
+        """Append a theme and return its row."""
+        self._claim_id(theme)
+        row = len(self._themes)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._themes.append(theme)
+        self.theme_index.add(theme, row)
+        self.endInsertRows()
+        self.categoriesChanged.emit([category_of(theme)])
+        return row
+
+    def append_themes(self, themes: List[Dict[str, Any]]) -> int:
+        """Append several themes with a single insert notification; returns the first row."""
+        row = len(self._themes)
+        if themes:
+            self.beginInsertRows(QModelIndex(), row, row + len(themes) - 1)
+            for offset, theme in enumerate(themes):
+                self._claim_id(theme)
+                self._themes.append(theme)
+                self.theme_index.add(theme, row + offset)
+            self.endInsertRows()
+            self.categoriesChanged.emit(list({category_of(theme) for theme in themes}))
+        return row
+
+    def update_theme(self, row: int, values: Dict[str, Any]) -> bool:
+        """Update the theme at ``row`` in place and notify the views.
+
+        The theme keeps its ID even if ``values`` carries another one.
+        """
+        theme = self.theme_at(row)
+        if theme is None:
+            return False
+        category = category_of(theme)
+        theme_id = theme.get(ID_FIELD)
+        theme.update(values)
+        if theme_id:
+            theme[ID_FIELD] = theme_id
+        self.theme_index.recategorize(theme, category)
+        index = self.index(row, 0)
+        self.dataChanged.emit(index, index)
+        if category_of(theme) != category:
+            self.categoriesChanged.emit([category, category_of(theme)])
+        return True
+
+    def remove_theme(self, row: int) -> Optional[Dict[str, Any]]:
+        """Remove the theme at ``row`` and return it."""
+        if not 0 <= row < len(self._themes):
+            return None
+        self.beginRemoveRows(QModelIndex(), row, row)
+        theme = self._themes.pop(row)
+        self.theme_index.remove(theme, row)
+        self.endRemoveRows()
+        self.categoriesChanged.emit([category_of(theme)])
+        return theme
+
+
+class CategoryListModel(QAbstractListModel):
+    """Categories of a :class:`ThemeListModel` with theme counts, for a combo box.
+
+    Row 0 stands for all categories; the rest are sorted category names
+    shown as "Фотография (42)". ``CategoryRole`` holds the plain name ("" for
+    row 0). Rows follow ``categoriesChanged``, so a mutation inserts,
+    removes or relabels only the affected rows instead of refilling the
+    list from every theme.
+    """
+    CategoryRole = Qt.ItemDataRole.UserRole
+
+    def __init__(self, themes_model: ThemeListModel, all_label: str = "Все категории", parent=None):
+        super().__init__(parent)
+        self._source = themes_model
+        self._all_label = all_label
+        self._categories: List[str] = themes_model.theme_index.categories()
+        themes_model.categoriesChanged.connect(self._update)
+        themes_model.modelReset.connect(self._reset)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._categories) + 1
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() <= len(self._categories):
+            return None
+        if index.row() == 0:
+            if role == Qt.ItemDataRole.DisplayRole:
+                return f"{self._all_label} ({self._source.rowCount()})"
+            if role == self.CategoryRole:
+                return ""
+            return None
+        category = self._categories[index.row() - 1]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{category} ({self._source.theme_index.category_count(category)})"
+        if role == self.CategoryRole:
+            return category
+        return None
+
+    def categories(self) -> List[str]:
+        """Sorted category names (not a copy)."""
+        return self._categories
+
+    def _reset(self):
+        self.beginResetModel()
+        self._categories = self._source.theme_index.categories()
+        self.endResetModel()
+
+    def _update(self, categories: Iterable[str]):
+        index = self._source.theme_index
+        for category in categories:
+            pos = bisect_left(self._categories, category)
+            present = pos < len(self._categories) and self._categories[pos] == category
+            count = index.category_count(category)
+            if count and not present:
+                self.beginInsertRows(QModelIndex(), pos + 1, pos + 1)
+                self._categories.insert(pos, category)
+                self.endInsertRows()
+            elif present and not count:
+                self.beginRemoveRows(QModelIndex(), pos + 1, pos + 1)
+                del self._categories[pos]
+                self.endRemoveRows()
+            elif present:
+                changed = self.index(pos + 1, 0)
+                self.dataChanged.emit(changed, changed)
+        # Общее число шаблонов в первой строке
+        first = self.index(0, 0)
+        self.dataChanged.emit(first, first)
+
+
+class ThemeFilterProxyModel(QSortFilterProxyModel):
+    """Proxy that filters themes by category and ranked search results.
+
+    The category filter is membership in the category's ID set of the
+    source model's ``theme_index``.
+    Search results arrive as a ``{key: score}`` mapping keyed like the
+    search index; ``key_func`` maps a theme to that key. A row is shown if
+    its key is in the mapping, so results never refer to stale rows even
+    if the list changed while the search ran. While a search is active
+    rows are ordered by score.
+    """
+
+    def __init__(self, parent=None, key_func: Callable[[Dict[str, Any]], Hashable] = theme_key):
+        super().__init__(parent)
+        self._category = ""
+        self._scores: Optional[Dict[Hashable, float]] = None
+        self._key_func = key_func
+        # Фильтр пересчитывается только для изменившихся строк
+        self.setDynamicSortFilter(True)
+
+    def set_category(self, category: Optional[str]):
+        category = category or ""
+        if category != self._category:
+            self._category = category
+            self.invalidateFilter()
+
+    def set_search_result(self, scores: Optional[Dict[Hashable, float]]):
+        """Show only themes whose key is in ``scores``; None disables text search."""
+        if scores is None and self._scores is None:
+            return
+        self._scores = scores
+        self.invalidateFilter()
+        # -1 возвращает исходный порядок модели
+        self.sort(0 if self._scores is not None else -1, Qt.SortOrder.AscendingOrder)
+
+    def filterAcceptsRow(self, source_row, source_parent) -> bool:
+        theme = self.sourceModel().theme_at(source_row)
+        if theme is None:
+            return False
+
+        if self._category and \
+                theme.get(ID_FIELD) not in self.sourceModel().theme_index.category_ids(self._category):
+            return False
+
+        if self._scores is not None:
+            return self._key_func(theme) in self._scores
+        return True
+
+    def lessThan(self, left, right) -> bool:
+        if self._scores is None:
+            return left.row() < right.row()
+        model = self.sourceModel()
+        left_score = self._scores.get(self._key_func(model.theme_at(left.row())), 0.0)
+        right_score = self._scores.get(self._key_func(model.theme_at(right.row())), 0.0)
+        if left_score != right_score:
+            # Более релевантные шаблоны идут первыми
+            return left_score > right_score
+        return left.row() < right.row()
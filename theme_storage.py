@@ -0,0 +1,382 @@
+"""
+Theme storage for PromptGenie
+Snapshot file plus an append-only JSONL journal of theme mutations
+"""
+
+import json
+import logging
+import marshal
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from engine.fragments import FragmentTable, migrate_themes
+from theme_index import ID_FIELD, ThemeIndex, assign_theme_ids, new_theme_id
+from utils import atomic_write_bytes, atomic_write_json, match_file_mode
+
+logger = logging.getLogger(__name__)
+
+# Версия формата кэша снимка; другой номер — кэш игнорируется
+CACHE_FORMAT = 1
+
+
+class ThemeStore:
+    """Persists the theme list as a snapshot plus a mutation journal.
+
+    The snapshot is the regular ``{"themes": [...]}`` file. Every add, edit or
+    delete is appended to ``<snapshot>.journal.jsonl`` as one line and synced
+    to disk, so a single change never rewrites the library. Each journal
+    entry carries a sequence number; the snapshot records the last sequence
+    it contains (``journal_seq``), so entries already folded into the snapshot
+    are skipped on replay even if the process died during compaction.
+
+    Compaction rewrites the snapshot atomically (temp file + rename) on a
+    background thread once the journal grows past ``compact_threshold``
+    entries.
+
+    Prompts are stored with shared ``{{fragment}}`` placeholders; the
+    snapshot's ``fragments`` table maps them to text (see
+    :class:`engine.fragments.FragmentTable`). A snapshot without that table
+    is migrated on load: common fragments are extracted and the snapshot is
+    rewritten once.
+
+    The (mtime, size) signature of the snapshot is remembered after every
+    read and write, so :meth:`changed_on_disk` tells external edits apart
+    from the store's own compactions.
+
+    The snapshot stays indented JSON for hand editing; a ``marshal`` copy
+    of its contents (``<snapshot>.cache``), tagged with the signature it
+    was written for, is read instead while the signature still matches.
+    That roughly halves parsing, so startup beats a plain ``json.load``
+    of the library even with the journal replay and index build on top.
+
+    Every theme has a persistent ``id`` (UUID); themes loaded without one
+    get it on load and the snapshot is rewritten once. Edit and delete
+    entries name the theme by ID, and :attr:`index` (built over the list
+    returned by :meth:`load`) resolves it to a row without scanning; the
+    row index is only a fallback for older journals.
+    """
+
+    def __init__(self, path: Path, journal_path: Optional[Path] = None,
+                 compact_threshold: int = 200):
+        self.path = Path(path)
+        self.journal_path = Path(journal_path) if journal_path else \
+            self.path.with_name(self.path.stem + ".journal.jsonl")
+        self.cache_path = self.path.with_name(self.path.stem + ".cache")
+        self.compact_threshold = compact_threshold
+        self._seq = 0
+        self._snapshot_seq = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._compactor: Optional[threading.Thread] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self.fragments = FragmentTable()
+        self.index = ThemeIndex()
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Read the snapshot and replay the journal on top of it."""
+        themes: List[Dict[str, Any]] = []
+        self._snapshot_seq = 0
+        if self.path.exists():
+            data, self._signature, cached = self._read_data()
+            if not cached and 'fragments' in data:
+                # Снимок правили вручную или кэша ещё нет; миграция ниже сама пишет кэш
+                self._write_cache(data, self._signature)
+            themes = data.get('themes', [])
+            self._snapshot_seq = int(data.get('journal_seq', 0))
+            if 'fragments' in data:
+                self.fragments = FragmentTable(data['fragments'])
+            elif themes:
+                self.fragments = migrate_themes(themes)
+                self._write_in_background([dict(theme) for theme in themes], self._snapshot_seq,
+                                          truncate=False)
+
+        self._seq = self._snapshot_seq
+        self._pending = 0
+        self.index = ThemeIndex(themes)
+        if self.journal_path.exists():
+            applied = self._replay(themes)
+            if applied:
+                logger.info(f"Replayed {applied} journal entries from {self.journal_path}")
+        assigned = assign_theme_ids(themes)
+        if assigned:
+            # Одноразовая миграция: идентификаторы должны пережить перезапуск
+            logger.info(f"Assigned IDs to {assigned} themes in {self.path}")
+            self.index.reset(themes)
+            self._write_in_background([dict(theme) for theme in themes], self._seq)
+        return themes
+
+    def snapshot_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def changed_on_disk(self) -> bool:
+        """True if the snapshot was modified by someone other than this store."""
+        return self.snapshot_signature() != self._signature
+
+    def read_snapshot(self) -> Tuple[List[Dict[str, Any]], FragmentTable, int, Optional[Tuple[int, int]]]:
+        """Parse the snapshot without changing the store; safe off the GUI thread.
+
+        Returns the themes, their fragment table, ``journal_seq`` and the
+        file signature the data was read under.
+        """
+        data, signature, _ = self._read_data()
+        return (data.get('themes', []), FragmentTable(data.get('fragments')),
+                int(data.get('journal_seq', 0)), signature)
+
+    def read_current(self) -> Tuple[List[Dict[str, Any]], FragmentTable]:
+        """Snapshot with the pending journal replayed, without writing anything.
+
+        For read-only consumers (export, batch generation): unlike
+        :meth:`load` it never migrates, assigns IDs, compacts or repairs
+        the journal, and leaves the store's own state untouched.
+        """
+        themes: List[Dict[str, Any]] = []
+        fragments = FragmentTable()
+        snapshot_seq = 0
+        if self.path.exists():
+            themes, fragments, snapshot_seq, _ = self.read_snapshot()
+        if self.journal_path.exists():
+            index = ThemeIndex(themes)
+            entries, _, _ = self._read_journal()
+            for entry in entries:
+                if entry.get("seq", 0) > snapshot_seq:
+                    self._apply_entry(themes, entry, index)
+        return themes, fragments
+
+    def adopt_snapshot(self, themes: List[Dict[str, Any]], fragments: FragmentTable,
+                       seq: int, signature: Optional[Tuple[int, int]]) -> None:
+        """An external snapshot was merged into ``themes`` by the caller.
+
+        Unfolded journal entries address rows of the old snapshot, and
+        prompts in memory use this store's fragment table; in either case
+        the merged list is written back (in the background). Otherwise the
+        file already matches memory and only its signature is recorded.
+        """
+        with self._lock:
+            self._signature = signature
+            stale = (self._pending or self._seq != self._snapshot_seq
+                     or fragments.to_dict() != self.fragments.to_dict())
+            if not stale:
+                self._seq = self._snapshot_seq = max(self._seq, seq)
+                return
+        self.compact(themes)
+
+    def append(self, theme: Dict[str, Any]) -> None:
+        """Record a theme appended to the end of the list (it gets an ID if it has none)."""
+        theme.setdefault(ID_FIELD, new_theme_id())
+        self._write({"op": "add", "theme": theme})
+
+    def update(self, index: int, theme: Dict[str, Any]) -> None:
+        """Record new contents of the theme at ``index``."""
+        self._write({"op": "update", "id": theme.get(ID_FIELD), "index": index, "theme": theme})
+
+    def remove(self, index: int, theme: Optional[Dict[str, Any]] = None) -> None:
+        """Record deletion of the theme at ``index`` (``theme`` is the removed one)."""
+        self._write({"op": "delete", "id": (theme or {}).get(ID_FIELD), "index": index})
+
+    def needs_compaction(self) -> bool:
+        return self._pending >= self.compact_threshold
+
+    def compact(self, themes: List[Dict[str, Any]], wait: bool = False) -> None:
+        """Fold the journal into a fresh snapshot of ``themes``.
+
+        The list is copied on the calling thread; writing happens in the
+        background unless ``wait`` is set. With ``wait`` a failed write
+        raises; the background compactor only logs it.
+        """
+        with self._lock:
+            snapshot = [dict(theme) for theme in themes]
+            seq = self._seq
+
+        if self._compactor is not None and self._compactor.is_alive():
+            self._compactor.join()
+
+        if wait:
+            self._write_snapshot(snapshot, seq)
+            return
+        self._compactor = threading.Thread(
+            target=self._write_in_background, args=(snapshot, seq),
+            name="ThemeStoreCompactor", daemon=True
+        )
+        self._compactor.start()
+
+    def close(self, themes: List[Dict[str, Any]]) -> None:
+        """Compact synchronously if there are unfolded journal entries."""
+        if self._pending or self._seq != self._snapshot_seq:
+            self.compact(themes, wait=True)
+        elif self._compactor is not None:
+            self._compactor.join()
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._seq += 1
+            entry = {"seq": self._seq, **entry}
+            line = json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending += 1
+
+    def _write_snapshot(self, snapshot: List[Dict[str, Any]], seq: int,
+                        truncate: bool = True) -> None:
+        fragments = self.fragments
+        # Фрагменты пишутся первыми, чтобы потоковый импорт знал их заранее
+        data = {
+            "fragments": fragments.to_dict(),
+            "themes": [fragments.compress_theme(theme) for theme in snapshot],
+            "journal_seq": seq,
+        }
+        atomic_write_json(self.path, data, indent=2)
+        self._signature = self.snapshot_signature()
+        self._write_cache(data, self._signature)
+        if not truncate:
+            return
+        with self._lock:
+            self._snapshot_seq = seq
+            self._truncate_journal(seq)
+        logger.info(f"Saved {len(snapshot)} themes to {self.path}")
+
+    def _write_in_background(self, snapshot: List[Dict[str, Any]], seq: int,
+                             truncate: bool = True) -> None:
+        """:meth:`_write_snapshot` where nobody waits for the result: errors are only logged."""
+        try:
+            self._write_snapshot(snapshot, seq, truncate)
+        except Exception as e:
+            logger.error(f"Error compacting theme journal: {e}", exc_info=True)
+
+    def _read_data(self) -> Tuple[Dict[str, Any], Optional[Tuple[int, int]], bool]:
+        """Snapshot contents, their signature and whether they came from the cache."""
+        signature = self.snapshot_signature()
+        data = self._read_cache(signature)
+        if data is not None:
+            return data, signature, True
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f), signature, False
+
+    def _read_cache(self, signature: Optional[Tuple[int, int]]) -> Optional[Dict[str, Any]]:
+        if signature is None:
+            return None
+        try:
+            with open(self.cache_path, 'rb') as f:
+                # loads() по готовым байтам: load() читает файл мелкими кусками и в разы медленнее
+                cache = marshal.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable snapshot cache {self.cache_path}: {e}")
+            return None
+        if not isinstance(cache, dict) or cache.get("format") != CACHE_FORMAT \
+                or tuple(cache.get("signature") or ()) != signature:
+            return None
+        data = cache.get("data")
+        return data if isinstance(data, dict) else None
+
+    def _write_cache(self, data: Dict[str, Any], signature: Optional[Tuple[int, int]]) -> None:
+        # Кэш необязателен: ошибка записи не должна срывать сохранение
+        if signature is None:
+            return
+        try:
+            atomic_write_bytes(self.cache_path, marshal.dumps(
+                {"format": CACHE_FORMAT, "signature": signature, "data": data}))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not write snapshot cache {self.cache_path}: {e}")
+
+    def _truncate_journal(self, seq: int) -> None:
+        """Drop journal entries up to ``seq``, keeping anything written later."""
+        if not self.journal_path.exists():
+            self._pending = 0
+            return
+        keep = []
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    if json.loads(line).get("seq", 0) > seq:
+                        keep.append(line)
+                except json.JSONDecodeError:
+                    continue
+        if keep:
+            self._rewrite_journal(keep)
+        else:
+            os.remove(self.journal_path)
+        self._pending = len(keep)
+
+    def _rewrite_journal(self, lines: List[str]) -> None:
+        """Atomically replace the journal with ``lines``, keeping its file mode."""
+        tmp_path = self.journal_path.with_name(self.journal_path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8', newline='\n') as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        match_file_mode(tmp_path, self.journal_path)
+        os.replace(tmp_path, self.journal_path)
+
+    def _apply(self, themes: List[Dict[str, Any]], entry: Dict[str, Any]) -> bool:
+        """Apply one journal entry to ``themes``; False if it does not fit the list."""
+        return self._apply_entry(themes, entry, self.index)
+
+    @staticmethod
+    def _apply_entry(themes: List[Dict[str, Any]], entry: Dict[str, Any], index: ThemeIndex) -> bool:
+        op = entry.get("op")
+        if op == "add":
+            themes.append(entry["theme"])
+            index.add(entry["theme"], len(themes) - 1)
+            return True
+        row = index.row_of(entry["id"]) if entry.get("id") else entry.get("index", -1)
+        if not 0 <= row < len(themes):
+            return False
+        if op == "update":
+            old, themes[row] = themes[row], entry["theme"]
+            if old.get(ID_FIELD):
+                themes[row].setdefault(ID_FIELD, old[ID_FIELD])
+            index.replace(row, old, themes[row])
+        elif op == "delete":
+            index.remove(themes.pop(row), row)
+        else:
+            return False
+        return True
+
+    def _read_journal(self) -> Tuple[List[Dict[str, Any]], List[str], bool]:
+        """Parse the journal: entries, the intact lines and whether a line was damaged."""
+        entries = []
+        valid_lines = []
+        damaged = False
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Недописанная последняя строка после сбоя
+                    logger.warning(f"Skipping damaged journal line {line_no} in {self.journal_path}")
+                    damaged = True
+                    continue
+                valid_lines.append(line if line.endswith("\n") else line + "\n")
+        return entries, valid_lines, damaged
+
+    def _replay(self, themes: List[Dict[str, Any]]) -> int:
+        applied = 0
+        entries, valid_lines, damaged = self._read_journal()
+        for entry in entries:
+            seq = entry.get("seq", 0)
+            if seq <= self._snapshot_seq:
+                continue
+            self._seq = max(self._seq, seq)
+
+            if not self._apply(themes, entry):
+                logger.warning(f"Ignoring invalid journal entry {seq}: "
+                               f"{entry.get('op')} at {entry.get('index', -1)}")
+                continue
+            applied += 1
+
+        if damaged:
+            # Иначе следующая запись продолжила бы оборванную строку
+            self._rewrite_journal(valid_lines)
+        self._pending = applied
+        return applied
@@ -0,0 +1,166 @@
+"""
+Thumbnail service for PromptGenie
+Decodes and scales template images off the GUI thread with memory and disk caches
+"""
+
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from PyQt6.QtCore import QObject, QRunnable, QSize, Qt, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QImage, QImageReader, QPixmap
+
+logger = logging.getLogger(__name__)
+
+# (путь, mtime_ns, размер файла, ширина, высота)
+ThumbKey = Tuple[str, int, int, int, int]
+
+
+def file_digest(path: Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class _ThumbSignals(QObject):
+    finished = pyqtSignal(object, object)  # ThumbKey, QImage | None
+
+
+class _ThumbTask(QRunnable):
+    """Decodes one image at the target size, going through the disk cache."""
+
+    def __init__(self, service: "ThumbnailService", key: ThumbKey):
+        super().__init__()
+        self._service = service
+        self._key = key
+
+    def run(self):
+        try:
+            image = self._service._load_image(self._key)
+        except Exception as e:
+            logger.error(f"Ошибка при создании миниатюры {self._key[0]}: {e}", exc_info=True)
+            image = None
+        self._service._signals.finished.emit(self._key, image)
+
+
+class ThumbnailService(QObject):
+    """Asynchronous thumbnails for template images.
+
+    :meth:`request` returns a cached ``QPixmap`` right away or schedules a
+    worker and returns None; the result then arrives via
+    ``thumbnail_ready(path, size, pixmap)``. Workers decode with
+    ``QImageReader.setScaledSize`` so the full-resolution image is never
+    materialised, and store the result in ``cache_dir`` under
+    ``<sha1 of file>_<w>x<h>.png``. Pixmaps live in an LRU capped by bytes.
+    """
+    thumbnail_ready = pyqtSignal(str, QSize, QPixmap)
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 64 * 1024 * 1024,
+                 pool: Optional[QThreadPool] = None, parent=None):
+        super().__init__(parent)
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._pixmaps: "OrderedDict[ThumbKey, QPixmap]" = OrderedDict()
+        self._bytes = 0
+        self._in_flight = set()
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        if pool is None:
+            pool = QThreadPool(self)
+            pool.setMaxThreadCount(2)
+        self._pool = pool
+
+        self._signals = _ThumbSignals(self)
+        self._signals.finished.connect(self._on_finished)
+
+    def request(self, path: Path, size: QSize) -> Optional[QPixmap]:
+        """Return the thumbnail if cached, otherwise start loading it."""
+        key = self._key(path, size)
+        if key is None:
+            return None
+        pixmap = self._pixmaps.get(key)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(key)
+            self.hits += 1
+            return pixmap
+        self.misses += 1
+        if key not in self._in_flight:
+            self._in_flight.add(key)
+            self._pool.start(_ThumbTask(self, key))
+        return None
+
+    def clear(self) -> None:
+        self._pixmaps.clear()
+        self._bytes = 0
+
+    @staticmethod
+    def _key(path: Path, size: QSize) -> Optional[ThumbKey]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (str(path), st.st_mtime_ns, st.st_size,
+                max(1, size.width()), max(1, size.height()))
+
+    def _digest(self, key: ThumbKey) -> str:
+        # Хэш файла считается один раз на (путь, mtime, размер)
+        file_id = key[:3]
+        digest = self._digests.get(file_id)
+        if digest is None:
+            digest = self._digests[file_id] = file_digest(Path(key[0]))
+        return digest
+
+    def _load_image(self, key: ThumbKey) -> Optional[QImage]:
+        """Runs on a pool thread; QImage is safe to use off the GUI thread."""
+        path, _mtime, _size, width, height = key
+        cache_file = self.cache_dir / f"{self._digest(key)}_{width}x{height}.png"
+        if cache_file.exists():
+            image = QImage(str(cache_file))
+            if not image.isNull():
+                return image
+
+        reader = QImageReader(path)
+        reader.setAutoTransform(True)
+        source = reader.size()
+        if source.isValid():
+            target = source.scaled(width, height, Qt.AspectRatioMode.KeepAspectRatio)
+            if target.width() < source.width():
+                reader.setScaledSize(target)
+        image = reader.read()
+        if image.isNull():
+            logger.warning(f"Не удалось прочитать изображение {path}: {reader.errorString()}")
+            return None
+
+        tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+        if image.save(str(tmp_file), "PNG"):
+            os.replace(tmp_file, cache_file)
+        return image
+
+    def _on_finished(self, key: ThumbKey, image: Optional[QImage]):
+        self._in_flight.discard(key)
+        if image is None:
+            return
+        pixmap = QPixmap.fromImage(image)
+        self._store(key, pixmap)
+        self.thumbnail_ready.emit(key[0], QSize(key[3], key[4]), pixmap)
+
+    @staticmethod
+    def _cost(pixmap: QPixmap) -> int:
+        return pixmap.width() * pixmap.height() * max(1, pixmap.depth() // 8)
+
+    def _store(self, key: ThumbKey, pixmap: QPixmap) -> None:
+        old = self._pixmaps.pop(key, None)
+        if old is not None:
+            self._bytes -= self._cost(old)
+        self._pixmaps[key] = pixmap
+        self._bytes += self._cost(pixmap)
+        while self._bytes > self.max_bytes and len(self._pixmaps) > 1:
+            _key, evicted = self._pixmaps.popitem(last=False)
+            self._bytes -= self._cost(evicted)
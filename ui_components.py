@@ -1,147 +1,199 @@
 # ui_components.py — КРАСОТА КАЗАХСТАНА
+import html
+
 from PyQt6.QtWidgets import *
 from PyQt6.QtGui import QFont, QIcon, QPainter, QLinearGradient, QColor
 from PyQt6.QtCore import Qt, QSize, QPropertyAnimation, QEasingCurve, QTimer
 
+from animation_manager import AnimationManager
+from style_registry import StyleRegistry, darken, lighten
+
+
+# Шаблон подсказки ключевого слова; заполняется один раз на слово
+TOOLTIP_TEMPLATE = """
+<div style="
+        background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+            stop:0 #1e1e1e, stop:1 #0a0a0a);
+        border: 2px solid #007acc;
+        border-radius: 16px;
+        padding: 16px;
+        font-family: 'Segoe UI', sans-serif;
+        max-width: 460px;
+">
+    <div style="
+        font-size: 15pt;
+        font-weight: 700;
+        color: #00ddff;
+        text-shadow: 0 2px 4px rgba(0,0,0,0.5);
+        margin-bottom: 8px;
+    ">✦ {word}</div>
+
+    <div style="
+        font-style: italic;
+        color: #64b5f6;
+        font-size: 12pt;
+        margin: 8px 0;
+        opacity: 0.9;
+    ">➤ {trans}</div>
+
+    <div style="
+        background: rgba(0,122,204,0.15);
+        padding: 12px;
+        border-radius: 10px;
+        border-left: 4px solid #007acc;
+        color: #bbdefb;
+        font-size: 11pt;
+        line-height: 1.5;
+    ">
+        <b>Эффект:</b> {effect}
+    </div>
+
+    <div style="
+        margin-top: 12px;
+        font-size: 9pt;
+        color: #666;
+        text-align: right;
+    ">Kazakh AI Design 2025</div>
+</div>
+"""
+# Подсказка скрывается через это время после последнего наведения
+TOOLTIP_HIDE_MS = 15000
+
+
+def render_keyword_tooltip(word, trans, effect):
+    return TOOLTIP_TEMPLATE.format(word=html.escape(word), trans=html.escape(trans or ""),
+                                   effect=html.escape(effect or ""))
+
+
+class KeywordTooltips:
+    """Подсказки ключевых слов для всех TooltipCheckBox.
+
+    HTML строится лениво из KeywordIndex при первом наведении и кэшируется
+    по ID ключевого слова; set_index() при перезагрузке библиотеки
+    сбрасывает кэш. Один общий таймер скрытия перезапускается при каждом
+    показе, поэтому таймеры не копятся.
+    """
+    _instance = None
+
+    def __init__(self):
+        self._index = None
+        self._html = {}
+        self._font_set = False
+        self._hide_timer = None
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def instance(cls) -> "KeywordTooltips":
+        if cls._instance is None:
+            cls._instance = KeywordTooltips()
+        return cls._instance
+
+    def set_index(self, index):
+        """Новая библиотека ключевых слов: прежние ID недействительны."""
+        self._index = index
+        self._html.clear()
+
+    def html(self, keyword_id):
+        tip = self._html.get(keyword_id)
+        if tip is not None:
+            self.hits += 1
+            return tip
+        self.misses += 1
+        index = self._index
+        if index is None or keyword_id is None or not 0 <= keyword_id < len(index):
+            return ""
+        tip = self._html[keyword_id] = render_keyword_tooltip(
+            index.words[keyword_id], index.translations[keyword_id], index.effects[keyword_id]
+        )
+        return tip
+
+    def show(self, keyword_id, pos, widget):
+        tip = self.html(keyword_id)
+        if not tip:
+            return
+        if not self._font_set:
+            QToolTip.setFont(QFont('Segoe UI', 11))
+            self._font_set = True
+        if self._hide_timer is None:
+            self._hide_timer = QTimer()
+            self._hide_timer.setSingleShot(True)
+            self._hide_timer.timeout.connect(QToolTip.hideText)
+        QToolTip.showText(pos, tip, widget)
+        self._hide_timer.start(TOOLTIP_HIDE_MS)
+
+    def hide(self):
+        if self._hide_timer is not None:
+            self._hide_timer.stop()
+        QToolTip.hideText()
+
+    def stats(self):
+        return {"cached": len(self._html), "hits": self.hits, "misses": self.misses}
+
 
 class TooltipCheckBox(QCheckBox):
+    """Чекбокс ключевого слова. Стиль задаёт StyleRegistry, вариант — свойство wordType.
+
+    Хранит только ID ключевого слова; текст подсказки берёт KeywordTooltips.
+    """
     
-    def __init__(self, word, trans, effect, type_="positive"):
+    def __init__(self, word, keyword_id, type_="positive"):
         super().__init__(word)
-        self.trans = trans or ""
-        self.effect = effect or ""
-        self.type = type_
-        
-        # БАЗОВЫЙ СТИЛЬ
         self.setCursor(Qt.CursorShape.PointingHandCursor)
-        self.setStyleSheet("""
-            QCheckBox {
-                padding: 10px 12px;
-                font-size: 12pt;
-                font-weight: 500;
-                border-radius: 12px;
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
-                    stop:0 #2d2d2d, stop:1 #353535);
-                border: 1.5px solid #444;
-                color: #e0e0e0;
-                spacing: 12px;
-            }
-            QCheckBox:hover {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
-                    stop:0 #3a3a3a, stop:1 #444444);
-                border: 1.5px solid #007acc;
-                padding-top: 8px;
-                padding-bottom: 12px;
-            }
-            QCheckBox:checked {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
-                    stop:0 #007acc, stop:1 #005a99);
-                color: white;
-                font-weight: 600;
-            }
-        """)
-        
-        if type_ == "negative":
-            self.setStyleSheet(self.styleSheet().replace(
-                "color: #e0e0e0", "color: #ff6b6b"
-            ).replace(
-                "border: 1.5px solid #444", "border: 1.5px solid #ff4444"
-            ))
+        self.type = None
+        self.bind(word, keyword_id, type_)
+
+    def bind(self, word, keyword_id, type_="positive"):
+        """Переназначает слово, чтобы виджет можно было переиспользовать."""
+        self.setText(word)
+        self.keyword_id = keyword_id
+        if type_ != self.type:
+            self.type = type_
+            # Перерасчёт стиля по свойству без разбора QSS заново
+            StyleRegistry.instance().set_variant(self, "wordType", type_)
 
     def enterEvent(self, event):
-        word = self.text()
-        trans = self.trans
-        effect = self.effect
-
-        tip = f"""
-        <div style="
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #1e1e1e, stop:1 #0a0a0a);
-                border: 2px solid #007acc;
-                border-radius: 16px;
-                padding: 16px;
-                font-family: 'Segoe UI', sans-serif;
-                max-width: 460px;
-        ">
-            <div style="
-                font-size: 15pt;
-                font-weight: 700;
-                color: #00ddff;
-                text-shadow: 0 2px 4px rgba(0,0,0,0.5);
-                margin-bottom: 8px;
-            ">✦ {word}</div>
-            
-            <div style="
-                font-style: italic;
-                color: #64b5f6;
-                font-size: 12pt;
-                margin: 8px 0;
-                opacity: 0.9;
-            ">➤ {trans}</div>
-            
-            <div style="
-                background: rgba(0,122,204,0.15);
-                padding: 12px;
-                border-radius: 10px;
-                border-left: 4px solid #007acc;
-                color: #bbdefb;
-                font-size: 11pt;
-                line-height: 1.5;
-            ">
-                <b>Эффект:</b> {effect}
-            </div>
-            
-            <div style="
-                margin-top: 12px;
-                font-size: 9pt;
-                color: #666;
-                text-align: right;
-            ">Kazakh AI Design 2025</div>
-        </div>
-        """
-        
-        QToolTip.setFont(QFont('Segoe UI', 11))
-        pos = event.globalPosition().toPoint()
-        QToolTip.showText(pos, tip, self)
-        # Hide tooltip after 15 seconds
-        QTimer.singleShot(15000, lambda: QToolTip.hideText())
+        KeywordTooltips.instance().show(self.keyword_id, event.globalPosition().toPoint(), self)
+        super().enterEvent(event)
+
+
+class CheckBoxPool:
+    """Пул TooltipCheckBox, переиспользуемых при смене категории.
+
+    ``on_create`` вызывается один раз для каждого нового виджета (например,
+    для подключения сигналов), поэтому при повторном использовании
+    соединения не дублируются.
+    """
+
+    def __init__(self, on_create=None):
+        self._free = []
+        self._on_create = on_create
+
+    def acquire(self, word, keyword_id, type_="positive"):
+        if self._free:
+            cb = self._free.pop()
+            cb.bind(word, keyword_id, type_)
+            cb.show()
+        else:
+            cb = TooltipCheckBox(word, keyword_id, type_)
+            if self._on_create:
+                self._on_create(cb)
+        return cb
+
+    def release(self, cb):
+        cb.blockSignals(True)
+        cb.setChecked(False)
+        cb.blockSignals(False)
+        cb.hide()
+        self._free.append(cb)
+
+    def __len__(self):
+        return len(self._free)
 
 
 class StyledTabWidget(QTabWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.setStyleSheet("""
-            QTabWidget::pane {
-                background: #1e1e1e;
-                border: 2px solid #007acc;
-                border-radius: 16px;
-                margin: 8px;
-                padding: 10px;
-            }
-            QTabBar::tab {
-                padding: 16px 40px;
-                margin: 0 4px;
-                border-radius: 14px 14px 0 0;
-                font-weight: 600;
-                font-size: 13pt;
-                min-width: 160px;
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #2a2a2a, stop:1 #333333);
-                color: #aaaaaa;
-                border: 2px solid transparent;
-            }
-            QTabBar::tab:selected {
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                    stop:0 #007acc, stop:1 #005a99);
-                color: white;
-                border-bottom: none;
-                box-shadow: 0 4px 15px rgba(0,122,204,0.4);
-            }
-            QTabBar::tab:hover:!selected {
-                background: #3a3a3a;
-                color: #00ddff;
-            }
-        """)
 
 
 class GradientButton(QPushButton):
@@ -151,28 +203,8 @@ class GradientButton(QPushButton):
         self.color = color
         self.setCursor(Qt.CursorShape.PointingHandCursor)
         self.setFixedHeight(44)
-        self.setStyleSheet(f"""
-            QPushButton {{
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
-                    stop:0 {color}, stop:1 {self.darken(color)});
-                border: 2px solid {color};
-                border-radius: 22px;
-                color: white;
-                font-weight: 600;
-                font-size: 12pt;
-                padding: 0 30px;
-            }}
-            QPushButton:hover {{
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
-                    stop:0 {self.lighten(color)}, stop:1 {color});
-                padding-top: -3px;
-                padding-bottom: 3px;
-            }}
-            QPushButton:pressed {{
-                padding-top: 2px;
-                padding-bottom: -2px;
-            }}
-        """)
+        # Цвет выбирается вариантом из общего QSS, а не своим stylesheet
+        StyleRegistry.instance().set_variant(self, "accent", StyleRegistry.instance().accent(color))
         
         # Анимация при наведении
         self.anim = QPropertyAnimation(self, b"geometry")
@@ -180,29 +212,16 @@ class GradientButton(QPushButton):
         self.anim.setEasingCurve(QEasingCurve.Type.OutCubic)
 
     def darken(self, hex_color):
-        c = QColor(hex_color)
-        c.setHsv(c.hue(), c.saturation(), max(0, c.value() - 40))
-        return c.name()
+        return darken(hex_color)
 
     def lighten(self, hex_color):
-        c = QColor(hex_color)
-        c.setHsv(c.hue(), c.saturation(), min(255, c.value() + 50))
-        return c.name()
+        return lighten(hex_color)
 
 
 class GlassPanel(QFrame):
     """СТЕКЛЯННАЯ ПАНЕЛЬ — КАК В MACOS"""
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.setStyleSheet("""
-            QFrame {
-                background: rgba(30, 30, 30, 0.7);
-                border: 1px solid rgba(0, 122, 204, 0.3);
-                border-radius: 18px;
-                backdrop-filter: blur(12px);
-                -webkit-backdrop-filter: blur(12px);
-            }
-        """)
 
 
 class SearchBox(QLineEdit):
@@ -211,21 +230,7 @@ class SearchBox(QLineEdit):
         super().__init__()
         self.setPlaceholderText(placeholder)
         self.setFixedHeight(48)
-        self.setStyleSheet("""
-            QLineEdit {
-                padding: 0 50px;
-                font-size: 13pt;
-                border: 2px solid #444;
-                border-radius: 24px;
-                background: #2a2a2a;
-                color: #e0e0e0;
-            }
-            QLineEdit:focus {
-                border: 2px solid #007acc;
-                background: #333;
-                box-shadow: 0 0 20px rgba(0,122,204,0.3);
-            }
-        """)
+        self.setClearButtonEnabled(True)
         
         # Иконка поиска
         self.setTextMargins(40, 0, 0, 0)
@@ -238,16 +243,15 @@ class StatusLabel(QLabel):
     """СТАТУС-БАР С АНИМАЦИЕЙ"""
     def __init__(self):
         super().__init__("Готов к работе")
-        self.setStyleSheet("""
-            QLabel {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
-                    stop:0 #007acc, stop:1 #005a99);
-                color: white;
-                padding: 12px 20px;
-                border-radius: 0 0 16px 16px;
-                font-weight: 600;
-            }
-        """)
+        self.set_status("info")
+
+    def set_status(self, message_type="info"):
+        """Меняет цвет через свойство status (info/success/warning/error)."""
+        StyleRegistry.instance().set_variant(self, "status", message_type)
+
+    def set_message(self, message, message_type="info"):
+        self.setText(message)
+        self.set_status(message_type)
 
 
 class TemplateDescriptionEdit(QTextEdit):
@@ -255,22 +259,8 @@ class TemplateDescriptionEdit(QTextEdit):
     
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.setStyleSheet("""
-            QTextEdit {
-                background: #252526;
-                border: 1px solid #444;
-                border-radius: 4px;
-                padding: 10px;
-                min-height: 80px;
-                max-height: 120px;
-                color: #e0e0e0;
-                selection-background-color: #007acc;
-            }
-            QTextEdit:focus {
-                border: 1px solid #007acc;
-            }
-        """)
         self.setPlaceholderText("Введите описание шаблона...")
+        self.setAcceptRichText(False)
 
 
 class TemplatePreviewEdit(QTextEdit):
@@ -278,35 +268,30 @@ class TemplatePreviewEdit(QTextEdit):
     
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.setStyleSheet("""
-            QTextEdit {
-                background: #252526;
-                border: 1px solid #444;
-                border-radius: 4px;
-                padding: 10px;
-                color: #e0e0e0;
-                selection-background-color: #007acc;
-                font-family: 'Consolas', 'Courier New', monospace;
-                font-size: 12px;
-            }
-            QTextEdit:focus {
-                border: 1px solid #007acc;
-            }
-        """)
         self.setReadOnly(True)
         self.setPlaceholderText("Предпросмотр шаблона...")
+        self.setAcceptRichText(False)
         
-        # Пульсация
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.pulse)
-        self.timer.start(3000)
-        self.opacity = 1.0
-
-    def pulse(self):
-        anim = QPropertyAnimation(self, b"windowOpacity")
-        anim.setDuration(1000)
-        anim.setStartValue(1.0)
-        anim.setEndValue(0.7)
-        anim.setEasingCurve(QEasingCurve.Type.InOutQuad)
-        anim.start()
-        QTimer.singleShot(1000, lambda: self.setWindowOpacity(1.0))
\ No newline at end of file
+        # Пульсация — по требованию через общий AnimationManager
+        AnimationManager.instance().register_pulse(self)
+
+
+class DebugOverlay(QLabel):
+    """Отладочная строка в статус-баре: анимации, пробуждения таймера, стили."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+        self.refresh()
+
+    def refresh(self):
+        anim = AnimationManager.instance().stats()
+        style = StyleRegistry.instance().stats()
+        tips = KeywordTooltips.instance().stats()
+        self.setText(
+            f"anim {anim['active_animations']}/{anim['registered']} · "
+            f"wakeups {anim['wakeups']} · "
+            f"qss {style['parse_count']} · repolish {style['repolish_count']} · "
+            f"tips {tips['hits']}/{tips['hits'] + tips['misses']}"
+        )
@@ -1,8 +1,10 @@
 import os
 import json
 import logging
+import tempfile
+import time
 from pathlib import Path
-from typing import Any, Dict, Optional, Union
+from typing import Any, Callable, Dict, Optional, Union
 
 def resource_path(relative_path: str) -> str:
     """Get the absolute path to a resource."""
@@ -49,3 +51,117 @@ def safe_json_load(file_path: Union[str, Path], default: Any = None) -> Any:
     except Exception as e:
         logging.error(f"Error loading JSON from {file_path}: {e}")
         return default
+
+def _default_mode() -> int:
+    # umask читается только через установку; сразу возвращаем прежнее значение
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+def match_file_mode(tmp_path: Union[str, Path], target: Union[str, Path]) -> None:
+    """Give a ``mkstemp`` file (mode 0600) the mode ``target`` has or a new file would get.
+
+    Call before renaming ``tmp_path`` over ``target``, so a save does not
+    make a shared file private to its owner.
+    """
+    try:
+        mode = os.stat(target).st_mode & 0o7777
+    except OSError:
+        mode = _default_mode()
+    os.chmod(tmp_path, mode)
+
+def _atomic_write(file_path: Path, binary: bool, write: Callable[[Any], None]) -> None:
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{file_path.name}.", suffix=".tmp",
+                                    dir=str(file_path.parent))
+    try:
+        with (os.fdopen(fd, 'wb') if binary else os.fdopen(fd, 'w', encoding='utf-8')) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        match_file_mode(tmp_name, file_path)
+        os.replace(tmp_name, file_path)
+    except BaseException:
+        try:
+            os.remove(tmp_name)
+        except OSError:
+            pass
+        raise
+
+def atomic_write_json(file_path: Union[str, Path], data: Any, **dump_kwargs) -> None:
+    """Write JSON to a temporary file next to the target and rename it into place.
+
+    Readers never observe a partially written file: either the old or the new
+    content is visible, even if the process dies mid-write.
+    """
+    dump_kwargs.setdefault("ensure_ascii", False)
+    _atomic_write(Path(file_path), False, lambda f: json.dump(data, f, **dump_kwargs))
+
+def atomic_write_bytes(file_path: Union[str, Path], data: bytes) -> None:
+    """Binary counterpart of :func:`atomic_write_json`."""
+    _atomic_write(Path(file_path), True, lambda f: f.write(data))
+
+
+class FileLock:
+    """Advisory lock held through a lock file, shared between processes.
+
+    Uses ``fcntl.flock`` on POSIX and ``msvcrt.locking`` on Windows. Locks
+    taken through different FileLock objects exclude each other even
+    within one process. Not reentrant. Raises ``TimeoutError`` if the lock
+    is not obtained within ``timeout`` seconds.
+    """
+
+    def __init__(self, path: Union[str, Path], timeout: float = 10.0, poll: float = 0.05):
+        self.path = Path(path)
+        self.timeout = timeout
+        self.poll = poll
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> None:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                _lock_fd(fd)
+                self._fd = fd
+                return
+            except OSError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    raise TimeoutError(f"Lock {self.path} is held by another process")
+                time.sleep(self.poll)
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        try:
+            _unlock_fd(fd)
+        finally:
+            os.close(fd)
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock_fd(fd: int) -> None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+
+    def _unlock_fd(fd: int) -> None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_fd(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock_fd(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)